@@ -0,0 +1,232 @@
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend import database, models
+
+# Nombre maximal de suggestions renvoyées
+NB_SUGGESTIONS = 8
+
+# Les titres sont relus depuis la base à cet intervalle (secondes) : les modifications faites
+# par un autre worker finissent par être visibles
+INTERVALLE_RECONSTRUCTION = 600
+
+# Octets du texte suivant un début de mot utilisés pour trier l'index (au-delà, vérification à la lecture)
+LONGUEUR_CLE = 32
+
+# Nombre de débuts de mots dont les clés de tri sont calculées à la fois (mémoire de construction)
+TAILLE_BLOC_TRI = 65_536
+
+NON_ALPHANUMERIQUE = re.compile(r"[^a-z0-9]+")
+
+
+# Titre normalisé : minuscules, sans accents, ponctuation remplacée par des espaces
+def normaliser(texte):
+    texte = unicodedata.normalize("NFKD", str(texte or "")).encode("ascii", "ignore").decode("ascii")
+    return NON_ALPHANUMERIQUE.sub(" ", texte.lower()).strip()
+
+
+# Clés d'un titre : le titre normalisé à partir de chacun de ses mots ("harry potter" -> "harry potter", "potter")
+def cles_titre(titre):
+    mots = normaliser(titre).split()
+    return [" ".join(mots[i:]) for i in range(len(mots))]
+
+
+class IndexPrefixes:
+    """Index des titres pour l'autocomplétion : positions des mots triées + recherche dichotomique.
+
+    Les titres normalisés sont concaténés dans un seul tampon d'octets (un titre par
+    ligne). Chaque entrée de l'index est la position d'un début de mot dans ce tampon ;
+    les entrées sont triées selon le texte qui suit (jusqu'à la fin du titre), ce qui
+    équivaut à trier les suffixes des titres sans les stocker : la mémoire est linéaire
+    en la taille du catalogue. Une requête cherche par dichotomie la première entrée
+    >= préfixe, en lisant le tampon, puis lit les suivantes tant qu'elles commencent
+    par le préfixe : O(log n + k), sans accès à la base.
+
+    Les livres ajoutés ou modifiés depuis la dernière construction vont dans une petite
+    liste triée à part ; les livres retirés ou modifiés sont masqués dans l'index principal.
+    """
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.date_construction = None
+        self._modifications = None  # (Livre.id, titre ou None si retiré) reçus pendant une construction
+        self._charger(b"", np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), b"",
+                      np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def _charger(self, tampon, debuts, positions, originaux, debuts_originaux, ids):
+        self._tampon = tampon                      # titres normalisés, un par ligne (ASCII)
+        self._debuts = debuts                      # début de chaque titre dans le tampon
+        self._positions = positions                # débuts de mots, triés par texte suivant
+        self._originaux = originaux                # titres d'origine (UTF-8), concaténés
+        self._debuts_originaux = debuts_originaux  # bornes de chaque titre d'origine
+        self._ids = ids                            # Livre.id de chaque titre
+        self._ajouts = {}                          # Livre.id -> titre, ajoutés depuis la construction
+        self._cles_ajouts = []                     # clés (suffixe, Livre.id) triées des ajouts
+        self._retires = set()                      # Livre.id masqués dans l'index principal
+
+    # Les ajouts et retraits reçus pendant la lecture des titres sont rejoués après la bascule :
+    # la lecture a pu se faire avant leur commit
+    def construire(self, livres):
+        with self._verrou:
+            self._modifications = []
+        titres = {livre_id: titre or "" for livre_id, titre in livres}
+        ids = np.fromiter(titres.keys(), dtype=np.int64, count=len(titres))
+        normalises = [normaliser(titre).encode("ascii") for titre in titres.values()]
+        tampon = b"".join(titre + b"\n" for titre in normalises)
+        debuts = np.zeros(len(normalises), dtype=np.int64)
+        np.cumsum([len(titre) + 1 for titre in normalises[:-1]], out=debuts[1:])
+        originaux = [titre.encode() for titre in titres.values()]
+        debuts_originaux = np.zeros(len(originaux) + 1, dtype=np.int64)
+        np.cumsum([len(titre) for titre in originaux], out=debuts_originaux[1:])
+
+        positions = trier_suffixes(tampon)
+        with self._verrou:
+            self._charger(tampon, debuts, positions, b"".join(originaux), debuts_originaux, ids)
+            self.date_construction = time.monotonic()
+            modifications, self._modifications = self._modifications or [], None
+            for livre_id, titre in modifications:
+                if titre is None:
+                    self._retirer(livre_id)
+                else:
+                    self._ajouter(livre_id, titre)
+
+    def construire_depuis_base(self, db: Session):
+        self.construire(db.query(models.Livre.id, models.Livre.titre).yield_per(10_000))
+
+    def ajouter(self, livre_id, titre):
+        with self._verrou:
+            self._ajouter(livre_id, titre)
+            if self._modifications is not None:
+                self._modifications.append((livre_id, titre))
+
+    def retirer(self, livre_id):
+        with self._verrou:
+            self._retirer(livre_id)
+            if self._modifications is not None:
+                self._modifications.append((livre_id, None))
+
+    def _ajouter(self, livre_id, titre):
+        self._retirer(livre_id)
+        self._ajouts[livre_id] = titre
+        for cle in cles_titre(titre):
+            insort(self._cles_ajouts, (cle, livre_id))
+
+    def _retirer(self, livre_id):
+        self._retires.add(livre_id)
+        titre = self._ajouts.pop(livre_id, None)
+        if titre is None:
+            return
+        for cle in cles_titre(titre):
+            i = bisect_left(self._cles_ajouts, (cle, livre_id))
+            if i < len(self._cles_ajouts) and self._cles_ajouts[i] == (cle, livre_id):
+                del self._cles_ajouts[i]
+
+    # Texte du tampon d'une position jusqu'à la fin du titre, tronqué à `longueur` octets
+    def _suffixe(self, position, longueur=LONGUEUR_CLE):
+        fin = self._tampon.find(b"\n", position, position + longueur)
+        return self._tampon[position:fin if fin >= 0 else position + longueur]
+
+    # Livres dont un mot du titre commence par la saisie : liste de (id, titre)
+    def suggerer(self, saisie, limite=NB_SUGGESTIONS):
+        prefixe = normaliser(saisie)
+        if not prefixe:
+            return []
+        octets = prefixe.encode("ascii")
+        cle = octets[:LONGUEUR_CLE]
+        trouves = []
+        with self._verrou:
+            # Index principal : l'ordre des entrées est celui des LONGUEUR_CLE premiers octets,
+            # un préfixe plus long est vérifié sur le suffixe complet
+            i = bisect_left(self._positions, cle, key=self._suffixe)
+            ids_vus = set()
+            while i < len(self._positions) and len(ids_vus) < limite:
+                position = int(self._positions[i])
+                i += 1
+                if not self._suffixe(position).startswith(cle):
+                    break
+                suffixe = self._suffixe(position, len(self._tampon))
+                titre = int(np.searchsorted(self._debuts, position, side="right")) - 1
+                livre_id = int(self._ids[titre])
+                if livre_id in self._retires or not suffixe.startswith(octets) or livre_id in ids_vus:
+                    continue
+                ids_vus.add(livre_id)
+                debut, fin = self._debuts_originaux[titre], self._debuts_originaux[titre + 1]
+                trouves.append((suffixe.decode("ascii"), livre_id, self._originaux[debut:fin].decode()))
+
+            # Livres ajoutés depuis la construction
+            j = bisect_left(self._cles_ajouts, (prefixe,))
+            while j < len(self._cles_ajouts) and self._cles_ajouts[j][0].startswith(prefixe):
+                suffixe, livre_id = self._cles_ajouts[j]
+                trouves.append((suffixe, livre_id, self._ajouts[livre_id]))
+                j += 1
+
+        resultats = {}
+        for _, livre_id, titre in sorted(trouves, key=lambda trouve: trouve[:2]):
+            if len(resultats) == limite:
+                break
+            resultats.setdefault(livre_id, titre)
+        return list(resultats.items())
+
+    def perime(self):
+        return self.date_construction is None or time.monotonic() - self.date_construction > INTERVALLE_RECONSTRUCTION
+
+    # Empreinte mémoire approximative (tampons, tableaux, ajouts)
+    def statistiques(self):
+        with self._verrou:
+            octets = (
+                len(self._tampon) + len(self._originaux)
+                + sum(tableau.nbytes for tableau in (self._debuts, self._positions, self._debuts_originaux, self._ids))
+                + sum(sys.getsizeof(cle) for cle, _ in self._cles_ajouts)
+                + sum(sys.getsizeof(titre) for titre in self._ajouts.values())
+            )
+            nb_masques = int(np.isin(self._ids, list(self._retires)).sum()) if self._retires else 0
+            return {
+                "nb_livres": len(self._ids) - nb_masques + len(self._ajouts),
+                "nb_cles": len(self._positions) + len(self._cles_ajouts),
+                "memoire_octets": octets,
+            }
+
+
+# Débuts de mots d'un tampon de titres (un par ligne), triés selon les LONGUEUR_CLE octets qui
+# suivent jusqu'à la fin du titre ; les clés de tri sont calculées par blocs pour borner la mémoire
+def trier_suffixes(tampon, taille_bloc=TAILLE_BLOC_TRI):
+    octets = np.frombuffer(tampon, dtype=np.uint8)
+    separateur = (octets == ord(" ")) | (octets == ord("\n"))
+    precedent = np.concatenate([[True], separateur[:-1]])
+    positions = np.flatnonzero(~separateur & precedent)
+
+    cles = np.empty(len(positions), dtype=f"S{LONGUEUR_CLE}")
+    decalages = np.arange(LONGUEUR_CLE)
+    for debut in range(0, len(positions), taille_bloc):
+        bloc = positions[debut:debut + taille_bloc, np.newaxis] + decalages
+        valeurs = octets[np.minimum(bloc, len(octets) - 1)]
+        # Tout ce qui suit la fin du titre est mis à zéro (ignoré par la comparaison des S{n})
+        valeurs[np.cumsum(valeurs == ord("\n"), axis=1) > 0] = 0
+        cles[debut:debut + taille_bloc] = np.ascontiguousarray(valeurs).view(cles.dtype).ravel()
+    return positions[np.argsort(cles, kind="stable")]
+
+
+# Index partagé par les routes (construit au démarrage)
+index_titres = IndexPrefixes()
+_reconstruction = None
+
+# Relit les titres en arrière-plan si l'index est trop ancien ; la requête en cours n'attend pas
+def reconstruire_si_perime():
+    global _reconstruction
+    if index_titres.perime() and (_reconstruction is None or not _reconstruction.is_alive()):
+        _reconstruction = threading.Thread(target=_reconstruire, name="index-titres", daemon=True)
+        _reconstruction.start()
+
+def _reconstruire():
+    db = database.SessionLocal()
+    try:
+        index_titres.construire_depuis_base(db)
+    finally:
+        db.close()
@@ -0,0 +1,294 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from backend import crud, models
+from backend.config import CACHE_CATALOGUE_URL
+from backend.facettes import Filtres, compter_facettes
+from backend.pagination import Page, TAILLE_PAGE
+
+# Durée de vie (secondes) d'un livre et d'une page de liste en cache
+TTL_LIVRE = 300
+TTL_LISTE = 60
+
+# Nombre maximal d'entrées du cache local
+TAILLE_CACHE_CATALOGUE = 10_000
+
+# Nombre de verrous de chargement (une clé est associée à l'un d'eux par hachage)
+NB_VERROUS = 64
+
+PREFIXE = "booksmart:catalogue:"
+
+
+# --------------------------------------------
+# Backends : stockage des entrées
+#--------------------------------------------
+
+class BackendLocal:
+    """Stockage en mémoire du processus, LRU + TTL (par défaut, et pour les tests)."""
+
+    def __init__(self, taille_max=TAILLE_CACHE_CATALOGUE):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._compteurs = {}
+        self._verrou = threading.Lock()
+        self.evictions = 0
+
+    def get(self, cle):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            if entree[0] < time.monotonic():
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return entree[1]
+
+    def get_plusieurs(self, cles):
+        return [self.get(cle) for cle in cles]
+
+    def set(self, cle, valeur, ttl):
+        self.set_plusieurs({cle: valeur}, ttl)
+
+    def set_plusieurs(self, valeurs, ttl):
+        with self._verrou:
+            for cle, valeur in valeurs.items():
+                self._entrees[cle] = (time.monotonic() + ttl, valeur)
+                self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+                self.evictions += 1
+
+    def supprimer(self, *cles):
+        with self._verrou:
+            for cle in cles:
+                self._entrees.pop(cle, None)
+
+    def incrementer(self, cle):
+        with self._verrou:
+            self._compteurs[cle] = self._compteurs.get(cle, 0) + 1
+            return self._compteurs[cle]
+
+    def compteur(self, cle):
+        return self._compteurs.get(cle, 0)
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def statistiques(self):
+        return {"backend": "local", "taille": len(self._entrees), "taille_max": self.taille_max, "evictions": self.evictions}
+
+
+# Entrées en JSON (lignes de livres, facettes, pages) : une Page est rangée sous la clé "__page__"
+def serialiser(valeur):
+    return json.dumps(valeur, default=_encoder_page)
+
+def deserialiser(octets):
+    return json.loads(octets, object_hook=_decoder_page)
+
+def _encoder_page(valeur):
+    if isinstance(valeur, Page):
+        return {"__page__": [valeur.elements, valeur.suivant, valeur.taille, valeur.total]}
+    raise TypeError(f"{type(valeur).__name__} non sérialisable en JSON")
+
+def _decoder_page(objet):
+    return Page(*objet["__page__"]) if "__page__" in objet else objet
+
+
+class BackendRedis:
+    """Stockage partagé entre workers (redis, dépendance optionnelle) : les invalidations sont vues par tous."""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, cle):
+        valeur = self._client.get(cle)
+        return None if valeur is None else deserialiser(valeur)
+
+    # Un seul aller-retour (MGET) pour plusieurs clés
+    def get_plusieurs(self, cles):
+        if not cles:
+            return []
+        return [None if valeur is None else deserialiser(valeur) for valeur in self._client.mget(cles)]
+
+    def set(self, cle, valeur, ttl):
+        self._client.set(cle, serialiser(valeur), ex=ttl)
+
+    def set_plusieurs(self, valeurs, ttl):
+        pipeline = self._client.pipeline(transaction=False)
+        for cle, valeur in valeurs.items():
+            pipeline.set(cle, serialiser(valeur), ex=ttl)
+        pipeline.execute()
+
+    def supprimer(self, *cles):
+        if cles:
+            self._client.delete(*cles)
+
+    def incrementer(self, cle):
+        return self._client.incr(cle)
+
+    def compteur(self, cle):
+        return int(self._client.get(cle) or 0)
+
+    def vider(self):
+        for cle in self._client.scan_iter(f"{PREFIXE}*"):
+            self._client.delete(cle)
+
+    def statistiques(self):
+        return {"backend": "redis"}
+
+
+def backend_configure():
+    if CACHE_CATALOGUE_URL.startswith("redis://"):
+        return BackendRedis(CACHE_CATALOGUE_URL)
+    return BackendLocal()
+
+
+# --------------------------------------------
+# Cache en lecture (read-through)
+#--------------------------------------------
+
+class CacheCatalogue:
+    """Cache du catalogue : livres (par id) et pages de listes, lus en base au premier accès.
+
+    Les pages sont rangées sous une génération : toute modification d'un livre ou de son
+    stock supprime la ligne du livre et incrémente la génération, ce qui rend les pages
+    précédentes inaccessibles (elles expirent ensuite d'elles-mêmes). Dans un processus, un
+    seul chargement par clé a lieu à la fois : les requêtes concurrentes sur une clé absente
+    attendent le premier chargement au lieu d'interroger toutes la base (effet de meute).
+
+    Un chargement n'est rangé que si la génération n'a pas changé pendant sa durée : une
+    lecture commencée avant une invalidation ne peut pas remettre en cache une ligne périmée.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or BackendLocal()
+        self._verrous = [threading.Lock() for _ in range(NB_VERROUS)]
+        self._verrou_compteurs = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.attentes = 0
+        self.invalidations = 0
+
+    def lire(self, cle, charger, ttl):
+        valeur = self.backend.get(cle)
+        if valeur is not None:
+            self._compter("hits")
+            return valeur
+        with self._verrous[hash(cle) % NB_VERROUS]:
+            # Chargée par une autre requête pendant l'attente du verrou
+            valeur = self.backend.get(cle)
+            if valeur is not None:
+                self._compter("attentes")
+                return valeur
+            self._compter("misses")
+            generation = self.generation()
+            valeur = charger()
+            if valeur is not None and self.generation() == generation:
+                self.backend.set(cle, valeur, ttl)
+            return valeur
+
+    # Lecture de plusieurs clés en un aller-retour ; les absentes sont chargées ensemble par
+    # charger(cles_absentes), qui retourne {cle: valeur}
+    def lire_plusieurs(self, cles, charger, ttl):
+        valeurs = dict(zip(cles, self.backend.get_plusieurs(cles)))
+        absentes = [cle for cle, valeur in valeurs.items() if valeur is None]
+        self._compter("hits", len(valeurs) - len(absentes))
+        if absentes:
+            self._compter("misses", len(absentes))
+            generation = self.generation()
+            chargees = charger(absentes)
+            if self.generation() == generation:
+                self.backend.set_plusieurs(chargees, ttl)
+            valeurs.update(chargees)
+        return [valeurs.get(cle) for cle in cles]
+
+    def generation(self):
+        return self.backend.compteur(f"{PREFIXE}generation")
+
+    def cle_liste(self, *parties):
+        return f"{PREFIXE}liste:{self.generation()}:{parties!r}"
+
+    def cle_livre(self, livre_id):
+        return f"{PREFIXE}livre:{livre_id}"
+
+    # À appeler après le commit de toute modification d'un livre (ajout, modification, suppression, stock)
+    # La génération change avant la suppression : un chargement en cours ne range plus sa valeur,
+    # et une valeur rangée juste avant est supprimée
+    def invalider_livres(self, *livre_ids):
+        self.backend.incrementer(f"{PREFIXE}generation")
+        self.backend.supprimer(*(self.cle_livre(livre_id) for livre_id in livre_ids))
+        self._compter("invalidations")
+
+    def vider(self):
+        self.backend.incrementer(f"{PREFIXE}generation")
+        self.backend.vider()
+
+    def statistiques(self):
+        total = self.hits + self.misses + self.attentes
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "attentes": self.attentes,
+            "taux_hit": (self.hits + self.attentes) / total if total else 0.0,
+            "invalidations": self.invalidations,
+            "generation": self.generation(),
+            **self.backend.statistiques(),
+        }
+
+    def _compter(self, compteur, nb=1):
+        with self._verrou_compteurs:
+            setattr(self, compteur, getattr(self, compteur) + nb)
+
+
+# Cache partagé par les routes de consultation du catalogue
+cache_catalogue = CacheCatalogue(backend_configure())
+
+
+# --------------------------------------------
+# Lectures du catalogue via le cache
+#--------------------------------------------
+
+# Les entrées sont des dictionnaires de colonnes (sérialisables, indépendants de la session) ;
+# les templates y accèdent comme aux attributs d'un livre
+def ligne_livre(livre):
+    return {attribut.key: getattr(livre, attribut.key) for attribut in models.Livre.__mapper__.column_attrs}
+
+
+def get_livre(db: Session, livre_id: int):
+    def charger():
+        trouve = crud.get_livre(db, livre_id)
+        return ligne_livre(trouve) if trouve else None
+    return cache_catalogue.lire(cache_catalogue.cle_livre(livre_id), charger, TTL_LIVRE)
+
+
+# Livres dans l'ordre des ids ; ceux absents du cache sont lus en une seule requête
+def get_livres_par_ids(db: Session, ids):
+    ids_par_cle = {cache_catalogue.cle_livre(livre_id): livre_id for livre_id in ids}
+    def charger(cles):
+        livres = crud.get_livres_par_ids(db, [ids_par_cle[cle] for cle in cles])
+        return {cache_catalogue.cle_livre(livre.id): ligne_livre(livre) for livre in livres}
+    trouves = cache_catalogue.lire_plusieurs(list(ids_par_cle), charger, TTL_LIVRE)
+    return [trouve for trouve in trouves if trouve is not None]
+
+
+def get_livres(db: Session, search: str = "", apres: int = None, taille: int = TAILLE_PAGE, filtres: Filtres = None):
+    def charger():
+        page = crud.get_livres(db, search, apres, taille, filtres)
+        return Page([ligne_livre(element) for element in page.elements], page.suivant, page.taille, page.total)
+    filtres_url = filtres.query_string() if filtres is not None else ""
+    return cache_catalogue.lire(cache_catalogue.cle_liste("page", search, apres, taille, filtres_url), charger, TTL_LISTE)
+
+
+def get_facettes(db: Session, filtres: Filtres, search: str = ""):
+    return cache_catalogue.lire(
+        cache_catalogue.cle_liste("facettes", search, filtres.query_string()),
+        lambda: compter_facettes(db, filtres, search),
+        TTL_LISTE,
+    )
@@ -0,0 +1,80 @@
+import contextvars
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from backend.config import SEUIL_REQUETES_SQL
+
+# Nombre d'instructions SQL gardées par compteur (pour les messages de diagnostic)
+NB_INSTRUCTIONS_GARDEES = 50
+
+
+class CompteurRequetes:
+    """Instructions SQL exécutées pendant une requête HTTP (ou un bloc `compter_requetes`)."""
+
+    def __init__(self):
+        self.nb = 0
+        self.instructions = []
+
+    def ajouter(self, instruction):
+        self.nb += 1
+        if len(self.instructions) < NB_INSTRUCTIONS_GARDEES:
+            self.instructions.append(" ".join(instruction.split()))
+
+
+# Compteur de la requête en cours : suit la requête dans les tâches et les threads qu'elle lance
+_compteur_courant = contextvars.ContextVar("compteur_requetes_sql", default=None)
+
+
+def installer(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _compter(connexion, curseur, instruction, parametres, contexte, executemany):
+        compteur = _compteur_courant.get()
+        if compteur is not None:
+            compteur.ajouter(instruction)
+
+
+@contextmanager
+def compter_requetes():
+    compteur = CompteurRequetes()
+    jeton = _compteur_courant.set(compteur)
+    try:
+        yield compteur
+    finally:
+        _compteur_courant.reset(jeton)
+
+
+class MiddlewareCompteurSQL:
+    """Ajoute l'en-tête X-Requetes-SQL à chaque réponse et signale les routes au-delà du seuil
+    (typiquement une relation chargée paresseusement dans une boucle de template).
+
+    Middleware ASGI (et non BaseHTTPMiddleware) : le compteur reste actif pendant l'envoi du
+    corps. L'en-tête, envoyé avec le début de la réponse, ne compte que les instructions
+    exécutées jusque-là ; celles d'un corps produit en flux (StreamingResponse, ex.
+    /api/v1/livres/export) sont comptées dans le total vérifié à la fin du corps.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        compteur = CompteurRequetes()
+
+        async def envoyer(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Requetes-SQL"] = str(compteur.nb)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                if compteur.nb > SEUIL_REQUETES_SQL:
+                    print(f"[SQL] {scope['method']} {scope['path']} : {compteur.nb} requêtes (seuil {SEUIL_REQUETES_SQL})")
+
+        jeton = _compteur_courant.set(compteur)
+        try:
+            await self.app(scope, receive, envoyer)
+        finally:
+            _compteur_courant.reset(jeton)
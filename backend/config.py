@@ -6,6 +6,19 @@ load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 
-# Templates Jinja2
-templates = Jinja2Templates(directory="frontend/templates")
+# Registre des versions du modèle de recommandation (tableaux .npy, pointeur `courant`)
+MODELE_DIR = os.getenv("MODELE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "recommender", "modeles"))
+
+# Recommandation : recherche approchée (ANN) pour les gros catalogues, désactivée par défaut
+RECO_MODE_ANN = os.getenv("RECO_MODE_ANN", "0") == "1"
+RECO_ANN_SONDES = int(os.getenv("RECO_ANN_SONDES", "8"))
+
+# Cache du catalogue : en mémoire du processus par défaut, partagé entre workers si une URL redis:// est fournie
+CACHE_CATALOGUE_URL = os.getenv("CACHE_CATALOGUE_URL", "")
+
+# Nombre d'instructions SQL par requête HTTP au-delà duquel la route est signalée (détection des N+1)
+SEUIL_REQUETES_SQL = int(os.getenv("SEUIL_REQUETES_SQL", "20"))
+
+# Templates Jinja2 (chemin depuis la racine du dépôt : indépendant du répertoire courant)
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "templates"))
 
@@ -1,5 +1,8 @@
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
-from backend import models, schemas
+from backend import models, schemas, recherche
+from backend.pagination import TAILLE_PAGE, compter, paginer, paginer_classement
+from backend.facettes import Filtres
 from passlib.context import CryptContext
 from datetime import datetime
 from fastapi import Request, HTTPException, Depends
@@ -49,15 +52,51 @@ def get_adherent_by_email(db: Session, email: str):
 def get_adherent_by_name(db: Session, nom: str):
     return db.query(models.Adherent).filter(models.Adherent.nom == nom).first()
 
+# Préfixe insensible à la casse servi par les index sur lower(nom) / lower(email) :
+# LIKE 'abc%' sous Postgres (text_pattern_ops), intervalle ['abc', 'abd') sous SQLite
+def condition_prefixe(db: Session, colonne, prefixe: str):
+    cle = func.lower(colonne)
+    prefixe = prefixe.lower()
+    if db.get_bind().dialect.name == "sqlite":
+        return and_(cle >= prefixe, cle < prefixe[:-1] + chr(ord(prefixe[-1]) + 1))
+    motif = prefixe.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return cle.like(motif, escape="\\")
+
+# Récupérer une page d'adhérents, éventuellement filtrée par préfixe du nom ou de l'email
+def get_adherents(db: Session, recherche: str = "", apres: int = None, taille: int = TAILLE_PAGE):
+    recherche = (recherche or "").strip()
+    if not recherche:
+        return paginer(db.query(models.Adherent), models.Adherent.id, apres, taille, compter(db, models.Adherent))
+    requete = db.query(models.Adherent).filter(or_(
+        condition_prefixe(db, models.Adherent.nom, recherche),
+        condition_prefixe(db, models.Adherent.email, recherche),
+    ))
+    return paginer(requete, models.Adherent.id, apres, taille)
+
 # --------------------------------------------
 # livres
 #--------------------------------------------
 
-# Récupérer les livres avec recherche
-def get_livres(db: Session, search: str = ""):
+# Récupérer une page de livres, avec recherche et filtres (prix, note, disponibilité)
+def get_livres(db: Session, search: str = "", apres: int = None, taille: int = TAILLE_PAGE, filtres: Filtres = None):
     if search:
-        return db.query(models.Livre).filter(models.Livre.titre.ilike(f"%{search}%")).all()# renvoie les livres correspondant à la recherche
-    return db.query(models.Livre).all()# renvoie tous les livres
+        # Résultats classés par pertinence : le curseur est le nombre de résultats déjà affichés
+        decalage = apres or 0
+        resultats = recherche.rechercher_livres(db, search, taille + 1, decalage, filtres)
+        return paginer_classement(resultats, decalage, taille)
+    if filtres is not None and filtres.actifs():
+        # Total filtré fourni par les compteurs de facettes
+        return paginer(db.query(models.Livre).filter(*filtres.conditions()), models.Livre.id, apres, taille)
+    return paginer(db.query(models.Livre), models.Livre.id, apres, taille, compter(db, models.Livre))
+
+
+# Récupérer des livres par id en une seule requête, dans l'ordre des ids fournis
+def get_livres_par_ids(db: Session, ids):
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    livres = {livre.id: livre for livre in db.query(models.Livre).filter(models.Livre.id.in_(ids)).all()}
+    return [livres[i] for i in ids if i in livres]
 
 
 # Récupérer un livre par titre
@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 #from sqlalchemy.ext.declarative import declarative_base  A changer
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
 from dotenv import load_dotenv
 import os
 
@@ -22,4 +23,32 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# create_all ne modifie pas les tables existantes : ajoute les colonnes déclarées depuis leur création
+def ajouter_colonnes_manquantes(engine, metadata=Base.metadata):
+    inspecteur = inspect(engine)
+    with engine.begin() as connexion:
+        for table in metadata.sorted_tables:
+            if not inspecteur.has_table(table.name):
+                continue
+            existantes = {colonne["name"] for colonne in inspecteur.get_columns(table.name)}
+            for colonne in table.columns:
+                if colonne.name in existantes:
+                    continue
+                type_sql = colonne.type.compile(dialect=engine.dialect)
+                defaut = ""
+                if colonne.server_default is not None:
+                    valeur = colonne.server_default.arg
+                    defaut = f" DEFAULT '{valeur}'" if isinstance(valeur, str) else f" DEFAULT {valeur.text}"
+                connexion.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {colonne.name} {type_sql}{defaut}"))
+
+
+# De même pour les index déclarés sur des tables existantes (IF NOT EXISTS : l'introspection ne voit pas
+# les index sur expression, comme lower(nom), sous tous les dialectes)
+def creer_index_manquants(engine, metadata=Base.metadata):
+    with engine.begin() as connexion:
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                connexion.execute(CreateIndex(index, if_not_exists=True))
@@ -0,0 +1,259 @@
+from datetime import date, timedelta
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.orm import Session, joinedload
+
+from backend import models, statistiques
+from backend.pagination import TAILLE_PAGE, compter, invalider_comptages, paginer
+
+# Durée d'un emprunt
+DUREE_EMPRUNT = timedelta(days=14)
+
+# Filtres de la liste des emprunts
+STATUTS = ("en_cours", "en_retard", "rendus", "tous")
+
+# Messages affichés après une action (l'action redirige vers la page avec le code du message)
+MESSAGES = {
+    "emprunt_enregistre": "Emprunt enregistré avec succès !",
+    "retour_enregistre": "Retour enregistré avec succès !",
+    "reservation_confirmee": "Réservation confirmée et transformée en emprunt !",
+    "reservation_supprimee": "Réservation supprimée avec succès !",
+}
+ERREURS = {
+    "livre_indisponible": "Livre indisponible",
+    "adherent_introuvable": "Adhérent introuvable",
+    "emprunt_existant": "Cet adhérent a déjà emprunté ce livre et ne l’a pas encore rendu",
+    "emprunt_introuvable": "Emprunt introuvable ou déjà retourné",
+    "deja_retourne": "Emprunt déjà retourné",
+    "reservation_introuvable": "Réservation introuvable",
+}
+
+
+# --------------------------------------------
+# Lectures : listes filtrées, paginées, adhérent et livre chargés dans la même requête
+#--------------------------------------------
+
+def filtrer_emprunts(requete, statut="en_cours", id_adherent=None, id_livre=None):
+    if statut in ("en_cours", "en_retard"):
+        requete = requete.filter(models.Emprunt.date_retour_effectif.is_(None))
+    if statut == "en_retard":
+        requete = requete.filter(models.Emprunt.date_retour_prevue < date.today())
+    elif statut == "rendus":
+        requete = requete.filter(models.Emprunt.date_retour_effectif.isnot(None))
+    if id_adherent is not None:
+        requete = requete.filter(models.Emprunt.id_adherent == id_adherent)
+    if id_livre is not None:
+        requete = requete.filter(models.Emprunt.id_livre == id_livre)
+    return requete
+
+
+def page_emprunts(db: Session, statut="en_cours", id_adherent=None, id_livre=None, apres=None, taille=TAILLE_PAGE):
+    requete = db.query(models.Emprunt).options(joinedload(models.Emprunt.adherent), joinedload(models.Emprunt.livre))
+    return paginer(filtrer_emprunts(requete, statut, id_adherent, id_livre), models.Emprunt.id, apres, taille)
+
+
+def page_reservations(db: Session, id_adherent=None, id_livre=None, apres=None, taille=TAILLE_PAGE):
+    requete = db.query(models.Reservation).options(
+        joinedload(models.Reservation.adherent), joinedload(models.Reservation.livre)
+    ).filter(models.Reservation.statut == "en_attente")
+    if id_adherent is not None:
+        requete = requete.filter(models.Reservation.id_adherent == id_adherent)
+    if id_livre is not None:
+        requete = requete.filter(models.Reservation.id_livre == id_livre)
+    return paginer(requete, models.Reservation.id, apres, taille)
+
+
+# Nombre d'emprunts par statut (onglets de la page). Sans filtre : total mis en cache (comme les
+# totaux de pagination) et emprunts en cours lus dans les agrégats des échéances, sans parcourir
+# la table ; avec un filtre, une requête agrégée sur les index par adhérent / livre
+def compteurs(db: Session, id_adherent=None, id_livre=None):
+    if id_adherent is None and id_livre is None:
+        tous = compter(db, models.Emprunt)
+        en_cours, retards = statistiques.emprunts_en_cours(db)
+        return {"en_cours": en_cours, "en_retard": retards, "rendus": max(tous - en_cours, 0), "tous": tous}
+
+    actif = models.Emprunt.date_retour_effectif.is_(None)
+    en_retard = actif & (models.Emprunt.date_retour_prevue < date.today())
+    requete = db.query(
+        func.count(models.Emprunt.id),
+        func.coalesce(func.sum(case((actif, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((en_retard, 1), else_=0)), 0),
+    )
+    tous, en_cours, retards = filtrer_emprunts(requete, "tous", id_adherent, id_livre).one()
+    return {"en_cours": en_cours, "en_retard": retards, "rendus": tous - en_cours, "tous": tous}
+
+
+# --------------------------------------------
+# Actions : (objet modifié, code d'erreur) ; chacune lit et écrit un nombre constant de lignes
+#--------------------------------------------
+
+def creer_emprunt(db: Session, id_adherent: int, id_livre: int):
+    livre = db.get(models.Livre, id_livre)
+    if not livre or livre.stock <= 0:
+        return None, "livre_indisponible"
+    if db.get(models.Adherent, id_adherent) is None:
+        return None, "adherent_introuvable"
+
+    # Vérifier si l’adhérent a déjà emprunté ce livre et ne l’a pas encore rendu
+    existant = db.query(models.Emprunt.id).filter(
+        models.Emprunt.id_adherent == id_adherent,
+        models.Emprunt.id_livre == id_livre,
+        models.Emprunt.date_retour_effectif.is_(None),
+    ).first()
+    if existant:
+        return None, "emprunt_existant"
+
+    emprunt = models.Emprunt(
+        id_adherent=id_adherent,
+        id_livre=id_livre,
+        date_emprunt=date.today(),
+        date_retour_prevue=date.today() + DUREE_EMPRUNT,
+    )
+    db.add(emprunt)
+    livre.stock -= 1
+    db.commit()
+    return emprunt, None
+
+
+def enregistrer_retour(db: Session, emprunt_id: int):
+    emprunt = db.get(models.Emprunt, emprunt_id)
+    if not emprunt or emprunt.date_retour_effectif:
+        return None, "emprunt_introuvable"
+    emprunt.date_retour_effectif = date.today()
+    livre = db.get(models.Livre, emprunt.id_livre)
+    if livre is not None:
+        livre.stock += 1
+    db.commit()
+    return emprunt, None
+
+
+def confirmer_reservation(db: Session, reservation_id: int):
+    reservation = db.get(models.Reservation, reservation_id)
+    if not reservation:
+        return None, "reservation_introuvable"
+    livre = db.get(models.Livre, reservation.id_livre)
+    if not livre or livre.stock <= 0:
+        return None, "livre_indisponible"
+
+    emprunt = models.Emprunt(
+        id_adherent=reservation.id_adherent,
+        id_livre=reservation.id_livre,
+        date_emprunt=date.today(),
+        date_retour_prevue=date.today() + DUREE_EMPRUNT,
+    )
+    db.add(emprunt)
+    livre.stock -= 1
+    db.delete(reservation)
+    db.commit()
+    return emprunt, None
+
+
+def supprimer_reservation(db: Session, reservation_id: int):
+    reservation = db.get(models.Reservation, reservation_id)
+    if not reservation:
+        return None, "reservation_introuvable"
+    db.delete(reservation)
+    db.commit()
+    return reservation, None
+
+
+# --------------------------------------------
+# Actions par lot (banque de prêt) : une transaction, quelques instructions quel que soit le nombre d'éléments
+#--------------------------------------------
+
+# Ajoute `variations[id_livre]` au stock de chaque livre en un seul UPDATE (CASE sur l'id)
+def _modifier_stocks(db: Session, variations):
+    if not variations:
+        return
+    db.execute(
+        update(models.Livre)
+        .where(models.Livre.id.in_(variations))
+        .values(stock=models.Livre.stock + case(variations, value=models.Livre.id, else_=0))
+    )
+
+
+# Emprunts d'une liste de paires (adhérent, livre) : résultat par paire, dans l'ordre reçu
+def creer_emprunts_lot(db: Session, paires):
+    ids_livres = {id_livre for _, id_livre in paires}
+    ids_adherents = {id_adherent for id_adherent, _ in paires}
+
+    # Stocks verrouillés jusqu'au commit (Postgres) : deux lots simultanés ne prêtent pas le même exemplaire
+    stocks = dict(
+        db.query(models.Livre.id, models.Livre.stock).filter(models.Livre.id.in_(ids_livres)).with_for_update().all()
+    )
+    adherents = {ligne.id for ligne in db.query(models.Adherent.id).filter(models.Adherent.id.in_(ids_adherents))}
+    en_cours = set(
+        db.query(models.Emprunt.id_adherent, models.Emprunt.id_livre).filter(
+            models.Emprunt.id_livre.in_(ids_livres),
+            models.Emprunt.id_adherent.in_(ids_adherents),
+            models.Emprunt.date_retour_effectif.is_(None),
+        ).all()
+    )
+
+    resultats, nouveaux, variations = [], [], {}
+    for id_adherent, id_livre in paires:
+        resultat = {"id_adherent": id_adherent, "id_livre": id_livre, "emprunt_id": None}
+        if (id_adherent, id_livre) in en_cours:
+            resultat["statut"] = "emprunt_existant"
+        elif id_adherent not in adherents:
+            resultat["statut"] = "adherent_introuvable"
+        elif (stocks.get(id_livre) or 0) + variations.get(id_livre, 0) <= 0:
+            resultat["statut"] = "livre_indisponible"
+        else:
+            resultat["statut"] = "emprunte"
+            en_cours.add((id_adherent, id_livre))
+            variations[id_livre] = variations.get(id_livre, 0) - 1
+            nouveaux.append(resultat)
+        resultats.append(resultat)
+
+    if nouveaux:
+        # Un seul INSERT multi-lignes ; chaque paire est unique dans le lot, elle identifie l'id retourné
+        crees = db.execute(
+            insert(models.Emprunt).returning(models.Emprunt.id, models.Emprunt.id_adherent, models.Emprunt.id_livre),
+            [
+                {"id_adherent": r["id_adherent"], "id_livre": r["id_livre"], "date_emprunt": date.today(),
+                 "date_retour_prevue": date.today() + DUREE_EMPRUNT}
+                for r in nouveaux
+            ],
+        ).all()
+        ids = {(ligne.id_adherent, ligne.id_livre): ligne.id for ligne in crees}
+        for resultat in nouveaux:
+            resultat["emprunt_id"] = ids[(resultat["id_adherent"], resultat["id_livre"])]
+        _modifier_stocks(db, variations)
+    db.commit()
+    if nouveaux:
+        invalider_comptages("emprunts")  # INSERT hors unité de travail : pas d'invalidation au flush
+    return resultats
+
+
+# Retours d'une liste d'emprunts : résultat par emprunt, dans l'ordre reçu
+def enregistrer_retours_lot(db: Session, emprunt_ids):
+    emprunts = {
+        ligne.id: ligne for ligne in db.query(
+            models.Emprunt.id, models.Emprunt.id_livre, models.Emprunt.date_retour_effectif
+        ).filter(models.Emprunt.id.in_(set(emprunt_ids))).with_for_update()
+    }
+
+    resultats, a_retourner, variations = [], set(), {}
+    for emprunt_id in emprunt_ids:
+        emprunt = emprunts.get(emprunt_id)
+        resultat = {"emprunt_id": emprunt_id, "id_livre": emprunt.id_livre if emprunt else None}
+        if emprunt is None:
+            resultat["statut"] = "emprunt_introuvable"
+        elif emprunt.date_retour_effectif is not None or emprunt_id in a_retourner:
+            resultat["statut"] = "deja_retourne"
+        else:
+            resultat["statut"] = "retourne"
+            a_retourner.add(emprunt_id)
+            variations[emprunt.id_livre] = variations.get(emprunt.id_livre, 0) + 1
+        resultats.append(resultat)
+
+    if a_retourner:
+        db.execute(
+            update(models.Emprunt)
+            .where(models.Emprunt.id.in_(a_retourner), models.Emprunt.date_retour_effectif.is_(None))
+            .values(date_retour_effectif=date.today())
+        )
+        _modifier_stocks(db, variations)
+    db.commit()
+    return resultats
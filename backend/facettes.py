@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend import models, recherche
+
+# Bornes des tranches de prix affichées en facettes : [0, 20), [20, 30), ..., [50, +inf)
+BORNES_PRIX = [20, 30, 40, 50]
+
+# Notes possibles (étoiles)
+NOTES = [1, 2, 3, 4, 5]
+
+
+@dataclass
+class Filtres:
+    """Filtres du catalogue : prix (minimum inclus, maximum exclu), note minimale, livres en stock seulement."""
+    prix_min: Optional[float] = None
+    prix_max: Optional[float] = None
+    note_min: Optional[int] = None
+    en_stock: bool = False
+
+    def actifs(self):
+        return self.prix_min is not None or self.prix_max is not None or self.note_min is not None or self.en_stock
+
+    # Conditions SQLAlchemy, pour les requêtes ORM
+    def conditions(self):
+        conditions = []
+        if self.prix_min is not None:
+            conditions.append(models.Livre.prix >= self.prix_min)
+        if self.prix_max is not None:
+            conditions.append(models.Livre.prix < self.prix_max)
+        if self.note_min is not None:
+            conditions.append(models.Livre.rating >= self.note_min)
+        if self.en_stock:
+            conditions.append(models.Livre.stock > 0)
+        return conditions
+
+    # Conditions SQL (" AND ..." + paramètres), pour les requêtes textuelles de la recherche
+    def sql(self):
+        parametres = {}
+        clauses = self._clauses_prix(parametres)
+        if self.note_min is not None:
+            clauses.append("livres.rating >= :note_min")
+            parametres["note_min"] = self.note_min
+        if self.en_stock:
+            clauses.append("livres.stock > 0")
+        return "".join(f" AND {clause}" for clause in clauses), parametres
+
+    def _clauses_prix(self, parametres):
+        clauses = []
+        if self.prix_min is not None:
+            clauses.append("livres.prix >= :prix_min")
+            parametres["prix_min"] = self.prix_min
+        if self.prix_max is not None:
+            clauses.append("livres.prix < :prix_max")
+            parametres["prix_max"] = self.prix_max
+        return clauses
+
+    # Paramètres d'URL des filtres actifs (liens de pagination)
+    def query_string(self):
+        parametres = {"prix_min": self.prix_min, "prix_max": self.prix_max, "note_min": self.note_min}
+        parametres = {cle: valeur for cle, valeur in parametres.items() if valeur is not None}
+        if self.en_stock:
+            parametres["en_stock"] = "true"
+        return urlencode(parametres)
+
+
+def _libelle_tranche(i):
+    bas = BORNES_PRIX[i - 1] if i > 0 else 0
+    return f"{bas}+" if i == len(BORNES_PRIX) else f"{bas}-{BORNES_PRIX[i]}"
+
+
+# Compteurs des facettes en une seule requête agrégée : les livres (de la recherche éventuelle) sont
+# groupés par note, tranche de prix, disponibilité et appartenance à la plage de prix demandée.
+# Chaque facette est ensuite calculée sans son propre filtre, pour afficher ce que donnerait son changement.
+def compter_facettes(db: Session, filtres: Filtres, search: str = ""):
+    tranche = " ".join(f"WHEN livres.prix < {borne} THEN {i}" for i, borne in enumerate(BORNES_PRIX))
+    parametres = {}
+    clauses_prix = filtres._clauses_prix(parametres)
+    dans_prix = " AND ".join(clauses_prix) if clauses_prix else "1 = 1"
+    jointure, condition, recherche_vide = "", "1 = 1", False
+    if search:
+        jointure, condition, parametres_recherche = recherche.sql_recherche(db, search)
+        parametres.update(parametres_recherche)
+        # SQLite : saisie sans aucun mot, aucun résultat
+        recherche_vide = parametres_recherche.get("texte") == ""
+
+    groupes = []
+    if not recherche_vide:
+        groupes = db.execute(text(f"""
+            SELECT livres.rating, CASE {tranche} ELSE {len(BORNES_PRIX)} END,
+                   CASE WHEN livres.stock > 0 THEN 1 ELSE 0 END,
+                   CASE WHEN {dans_prix} THEN 1 ELSE 0 END,
+                   count(*)
+            FROM livres {jointure}
+            WHERE {condition}
+            GROUP BY 1, 2, 3, 4
+        """), parametres).all()
+
+    total = en_stock_total = 0
+    notes = dict.fromkeys(NOTES, 0)
+    tranches = [0] * (len(BORNES_PRIX) + 1)
+    for note, i, en_stock, dans_plage, nb in groupes:
+        note_ok = filtres.note_min is None or (note is not None and note >= filtres.note_min)
+        stock_ok = en_stock or not filtres.en_stock
+        if note_ok and stock_ok:
+            tranches[i] += nb
+            if dans_plage:
+                total += nb
+        if dans_plage and stock_ok:
+            for n in NOTES:
+                if note is not None and note >= n:
+                    notes[n] += nb
+        if dans_plage and note_ok and en_stock:
+            en_stock_total += nb
+
+    return {
+        "total": total,
+        "notes": [{"note_min": n, "nb": notes[n]} for n in reversed(NOTES)],
+        "prix": [
+            {"tranche": _libelle_tranche(i), "prix_min": BORNES_PRIX[i - 1] if i > 0 else 0,
+             "prix_max": BORNES_PRIX[i] if i < len(BORNES_PRIX) else None, "nb": nb}
+            for i, nb in enumerate(tranches)
+        ],
+        "en_stock": en_stock_total,
+    }
@@ -0,0 +1,184 @@
+import argparse
+import csv
+import io
+import os
+import time
+from typing import List
+
+import pandas as pd
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import text
+
+from backend import schemas
+
+# Nombre de lignes validées et chargées à la fois
+TAILLE_LOT_IMPORT = 5000
+
+# Colonnes importées (format de data/livres_nettoyes.csv, dans n'importe quel ordre)
+COLONNES = ("titre", "prix", "description", "image_url", "stock", "rating")
+
+# Nombre maximal de lignes rejetées détaillées dans le rapport
+NB_ERREURS_RAPPORT = 100
+
+FORMATS = ("csv", "jsonl", "json")
+
+_validateur_lot = TypeAdapter(List[schemas.LivreBase])
+
+
+# --------------------------------------------
+# Lecture et validation par lots
+#--------------------------------------------
+
+# Lots de lignes (DataFrames) lus au fil du fichier ; le JSON (tableau) est lu en entier puis découpé
+def lire_lots(fichier, format="csv", taille_lot=TAILLE_LOT_IMPORT):
+    if format == "csv":
+        return pd.read_csv(fichier, chunksize=taille_lot)
+    if format == "jsonl":
+        return pd.read_json(fichier, lines=True, chunksize=taille_lot)
+    if format == "json":
+        df = pd.read_json(fichier)
+        return (df.iloc[debut:debut + taille_lot] for debut in range(0, len(df), taille_lot))
+    raise ValueError(f"Format inconnu : {format} (attendu : {', '.join(FORMATS)})")
+
+
+def format_du_fichier(nom):
+    extension = os.path.splitext(nom or "")[1].lower().lstrip(".")
+    return {"ndjson": "jsonl"}.get(extension, extension) if extension in FORMATS + ("ndjson",) else "csv"
+
+
+# Enregistrements du lot : colonnes connues, valeurs manquantes omises (valeurs par défaut du schéma)
+def enregistrements(lot: pd.DataFrame):
+    lot = lot[[colonne for colonne in COLONNES if colonne in lot.columns]]
+    lot = lot.astype(object).where(pd.notna(lot), None)
+    return [{cle: valeur for cle, valeur in ligne.items() if valeur is not None} for ligne in lot.to_dict("records")]
+
+
+# Validation du lot en un appel ; en cas d'erreur, ligne par ligne pour séparer les lignes rejetées
+def valider_lot(lignes, premiere_ligne):
+    try:
+        return _validateur_lot.validate_python(lignes), []
+    except ValidationError:
+        pass
+    valides, erreurs = [], []
+    for numero, ligne in enumerate(lignes, start=premiere_ligne):
+        try:
+            valides.append(schemas.LivreBase(**ligne))
+        except ValidationError as erreur:
+            messages = "; ".join(f"{'.'.join(map(str, e['loc']))} : {e['msg']}" for e in erreur.errors())
+            erreurs.append({"ligne": numero, "erreur": messages})
+    return valides, erreurs
+
+
+# --------------------------------------------
+# Chargement : table temporaire (COPY sous Postgres, executemany ailleurs) puis upsert sur le titre
+#--------------------------------------------
+
+def _creer_table_import(connexion, dialecte):
+    rang = "rang BIGSERIAL" if dialecte == "postgresql" else "rang INTEGER PRIMARY KEY"
+    connexion.execute(text(f"""
+        CREATE TEMPORARY TABLE import_livres (
+            {rang}, titre VARCHAR(255) NOT NULL, prix FLOAT NOT NULL, description TEXT,
+            image_url TEXT, stock INTEGER NOT NULL, rating INTEGER
+        )
+    """))
+
+
+def _charger_lot(connexion, dialecte, livres):
+    if dialecte == "postgresql":
+        tampon = io.StringIO()
+        ecrivain = csv.writer(tampon)
+        for livre in livres:
+            ecrivain.writerow([getattr(livre, colonne) for colonne in COLONNES])
+        tampon.seek(0)
+        curseur = connexion.connection.cursor()
+        try:
+            curseur.copy_expert(f"COPY import_livres ({', '.join(COLONNES)}) FROM STDIN WITH (FORMAT csv)", tampon)
+        finally:
+            curseur.close()
+    else:
+        connexion.execute(
+            text(f"INSERT INTO import_livres ({', '.join(COLONNES)}) VALUES ({', '.join(':' + c for c in COLONNES)})"),
+            [livre.model_dump() for livre in livres],
+        )
+
+
+# Un titre déjà au catalogue met à jour le livre (version incrémentée), sinon le livre est inséré ;
+# pour un titre présent plusieurs fois dans le fichier, la dernière ligne l'emporte
+def _fusionner(connexion):
+    connexion.execute(text("DELETE FROM import_livres WHERE rang NOT IN (SELECT max(rang) FROM import_livres GROUP BY titre)"))
+    mises_a_jour = connexion.execute(text(
+        "SELECT count(*) FROM import_livres i WHERE EXISTS (SELECT 1 FROM livres l WHERE l.titre = i.titre)"
+    )).scalar()
+    connexion.execute(text("""
+        UPDATE livres SET prix = i.prix, description = i.description, image_url = i.image_url,
+                          stock = i.stock, rating = i.rating, version = livres.version + 1
+        FROM import_livres i WHERE livres.titre = i.titre
+    """))
+    inserees = connexion.execute(text(f"""
+        INSERT INTO livres ({', '.join(COLONNES)})
+        SELECT {', '.join(COLONNES)} FROM import_livres i
+        WHERE NOT EXISTS (SELECT 1 FROM livres l WHERE l.titre = i.titre)
+        ORDER BY rang
+    """)).rowcount
+    connexion.execute(text("DROP TABLE import_livres"))
+    return inserees, mises_a_jour
+
+
+# Importe des lots de lignes en une transaction ; retourne le rapport (compteurs, lignes rejetées, débit)
+def importer(engine, lots):
+    debut = time.perf_counter()
+    dialecte = engine.dialect.name
+    rapport = {"lignes_lues": 0, "lignes_valides": 0, "lignes_rejetees": 0, "erreurs": []}
+
+    with engine.begin() as connexion:
+        _creer_table_import(connexion, dialecte)
+        for lot in lots:
+            livres, erreurs = valider_lot(enregistrements(lot), rapport["lignes_lues"] + 1)
+            rapport["lignes_lues"] += len(lot)
+            rapport["lignes_valides"] += len(livres)
+            rapport["lignes_rejetees"] += len(erreurs)
+            rapport["erreurs"].extend(erreurs[:NB_ERREURS_RAPPORT - len(rapport["erreurs"])])
+            if livres:
+                _charger_lot(connexion, dialecte, livres)
+        rapport["livres_inseres"], rapport["livres_mis_a_jour"] = _fusionner(connexion)
+
+    duree = time.perf_counter() - debut
+    rapport["duree_s"] = round(duree, 3)
+    rapport["lignes_par_s"] = round(rapport["lignes_lues"] / duree) if duree else None
+    return rapport
+
+
+# --------------------------------------------
+# Ligne de commande : python -m backend.import_livres data/livres_nettoyes.csv
+#--------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Import en masse de livres (CSV, JSON Lines ou JSON).")
+    parser.add_argument("fichier")
+    parser.add_argument("--format", choices=FORMATS, help="déduit de l'extension par défaut")
+    parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT_IMPORT)
+    parser.add_argument("--sans-refit", action="store_true", help="ne pas reconstruire le modèle de recommandation")
+    args = parser.parse_args()
+
+    from backend.database import engine
+    from backend.recommender.recommender import entrainer_modele
+
+    rapport = importer(engine, lire_lots(args.fichier, args.format or format_du_fichier(args.fichier), args.taille_lot))
+    for erreur in rapport["erreurs"]:
+        print(f"Ligne {erreur['ligne']} rejetée : {erreur['erreur']}")
+    print(
+        f"{rapport['lignes_lues']} lignes lues en {rapport['duree_s']}s ({rapport['lignes_par_s']} lignes/s) : "
+        f"{rapport['livres_inseres']} livres ajoutés, {rapport['livres_mis_a_jour']} mis à jour, "
+        f"{rapport['lignes_rejetees']} lignes rejetées."
+    )
+
+    # Un seul refit pour tout l'import ; les workers en cours rechargent la nouvelle version du registre
+    if not args.sans_refit and (rapport["livres_inseres"] or rapport["livres_mis_a_jour"]):
+        debut = time.perf_counter()
+        modele = entrainer_modele(pd.read_sql_table("livres", con=engine))
+        modele.sauvegarder()
+        print(f"Modèle de recommandation reconstruit en {time.perf_counter() - debut:.2f}s (version {modele.version}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,12 +10,19 @@ from nltk.stem import PorterStemmer
 
 
 from backend.utils import clean_all
+from backend.import_livres import importer as importer_livres
 from backend.scraping.scrap_books_toscrape import BooksToScraper
-from backend.recommender.recommender import modele_recommandation, preprocess_text_func
-from backend.database import engine, Base
+from backend.recommender.recommender import preprocess_text_func
+from backend.recommender.service import service
+from backend.recommender.collaboratif import demarrer_construction
+from backend.autocompletion import index_titres
+from backend.database import engine, Base, ajouter_colonnes_manquantes, creer_index_manquants
+from backend.recherche import initialiser_recherche
+from backend.statistiques import initialiser_statistiques
 from backend import models
-from backend.routes import admin, livres, recommandations, reservations, stats, users
+from backend.routes import admin, api_v1, livres, recommandations, reservations, stats, users
 from backend.config import SECRET_KEY, templates
+from backend.compteur_sql import MiddlewareCompteurSQL, installer as installer_compteur_sql
 
 # Téléchargement des ressources NLTK et initialisation des outils de traitement
 nltk.download('punkt_tab', quiet=True)
@@ -27,9 +34,23 @@ app = FastAPI()
 # Ajouter le middleware de session
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 
+# Nombre d'instructions SQL par requête (en-tête X-Requetes-SQL), pour repérer les chargements N+1
+installer_compteur_sql(engine)
+app.add_middleware(MiddlewareCompteurSQL)
+
 
 # Création de la base de données et des tables si elles n'existent pas
 Base.metadata.create_all(bind=engine)
+ajouter_colonnes_manquantes(engine)
+
+# Index de recherche plein texte (tsvector + GIN + pg_trgm sous Postgres, FTS5 sous SQLite)
+initialiser_recherche(engine)
+
+# Index déclarés dans les modèles (facettes, emprunts actifs...), y compris sur une base existante
+creer_index_manquants(engine)
+
+# Agrégats des statistiques tenus à jour par triggers (calculés au premier démarrage)
+initialiser_statistiques(engine)
 
 # Servir les fichiers statiques
 #app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -56,21 +77,35 @@ if livre_count == 0:
     df_cleaned = clean_all(df)
     df_cleaned.to_csv(r'C:\Users\lenovo\Documents\BookSmart_Sara\data\livres_nettoyes.csv', index=False)
     
-    # Charger le modèle de recommandation
-    modele_recommandation(df_cleaned)
-    
-    # Insertion dans la base de données
-    df_cleaned.to_sql('livres', con=engine, if_exists='append', index=False)
+    # Insertion dans la base de données (COPY sous Postgres, validation par lots)
+    rapport = importer_livres(engine, [df_cleaned])
+    print(f"{rapport['livres_inseres']} livres insérés ({rapport['lignes_par_s']} lignes/s).")
     print("Insertion des livres terminée.")
 else:
     print(f"La table livres contient déjà {livre_count} livres. Scraping et insertion ignorés.")
 
+# Démarrage à chaud du modèle de recommandation : la version du registre correspondant au
+# catalogue est chargée (mmap), un refit n'a lieu que si le catalogue a changé
+service.instantane()
+
+# Modèle collaboratif (co-emprunts) construit en arrière-plan : les pages des livres n'attendent pas
+# la lecture de tout l'historique des emprunts
+demarrer_construction()
+
+# Index d'autocomplétion des titres, en mémoire
+with Session(engine) as session:
+    index_titres.construire_depuis_base(session)
+print(f"Index d'autocomplétion construit : {index_titres.statistiques()}")
+
 # Inclusion du routeur des utilisateurs
 app.include_router(users.router)
 
 #inclusion du routeur des livres
 app.include_router(livres.router)
 
+# Inclusion de l'API JSON versionnée du catalogue
+app.include_router(api_v1.router)
+
 # Inclusion du routeur des réservations
 app.include_router(reservations.router)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, Boolean, ForeignKey, TIMESTAMP,Float
+from sqlalchemy import Column, Integer, String, Text, Date, Boolean, ForeignKey, TIMESTAMP,Float, Index, func, text, literal_column
 from sqlalchemy.orm import relationship
 from backend.database import Base
 from datetime import datetime
@@ -14,6 +14,14 @@ class Adherent(Base):
     role = Column(String(50), default="adherent")
     date_inscription = Column(TIMESTAMP, default=datetime.now)
 
+    __table_args__ = (
+        # Recherche par préfixe du nom ou de l'email, insensible à la casse (text_pattern_ops : LIKE 'abc%' sous Postgres)
+        Index("ix_adherents_nom_lower", func.lower(nom).label("nom_lower"), postgresql_ops={"nom_lower": "text_pattern_ops"}),
+        Index("ix_adherents_email_lower", func.lower(email).label("email_lower"), postgresql_ops={"email_lower": "text_pattern_ops"}),
+        # Inscription : unicité du nom
+        Index("ix_adherents_nom", "nom"),
+    )
+
     emprunts = relationship("Emprunt", back_populates="adherent",cascade="all, delete-orphan")
     reservations = relationship("Reservation", back_populates="adherent",cascade="all, delete-orphan")
     historique = relationship("HistoriqueEmprunt", back_populates="adherent",cascade="all, delete-orphan")
@@ -30,6 +38,16 @@ class Livre(Base):
     image_url = Column(Text)
     stock = Column(Integer, default=1)
     rating = Column(Integer)
+    # Version de la ligne, incrémentée à chaque UPDATE (ETag des routes JSON)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("livres.version + 1"))
+
+    __table_args__ = (
+        # Filtres à facettes : index couvrant (note, prix, stock) et index partiel des livres en stock
+        Index("ix_livres_facettes", "rating", "prix", "stock"),
+        # Import en masse : upsert sur le titre
+        Index("ix_livres_titre", "titre"),
+        Index("ix_livres_en_stock_prix", "prix", postgresql_where=text("stock > 0"), sqlite_where=text("stock > 0")),
+    )
 
     emprunts = relationship("Emprunt", back_populates="livre",cascade="all, delete-orphan")
     reservations = relationship("Reservation", back_populates="livre",cascade="all, delete-orphan")
@@ -46,6 +64,16 @@ class Emprunt(Base):
     date_retour_prevue = Column(Date, nullable=False)
     date_retour_effectif = Column(Date, nullable=True)
 
+    __table_args__ = (
+        # Filtres de la page des emprunts : par adhérent, par livre, emprunts en cours / en retard (index partiel)
+        Index("ix_emprunts_adherent", "id_adherent"),
+        Index("ix_emprunts_livre", "id_livre"),
+        Index(
+            "ix_emprunts_actifs", "date_retour_prevue",
+            postgresql_where=text("date_retour_effectif IS NULL"), sqlite_where=text("date_retour_effectif IS NULL"),
+        ),
+    )
+
     adherent = relationship("Adherent", back_populates="emprunts")
     livre = relationship("Livre", back_populates="emprunts")
 
@@ -85,4 +113,40 @@ class Notification(Base):
     date = Column(TIMESTAMP, default=datetime.utcnow)
     lu = Column(Boolean, default=False)
 
-    adherent = relationship("Adherent", back_populates="notifications")
\ No newline at end of file
+    adherent = relationship("Adherent", back_populates="notifications")
+
+
+# --------------------------------------------
+# Agrégats des statistiques, tenus à jour par des triggers (backend/statistiques.py)
+#--------------------------------------------
+
+# Nombre d'emprunts (en cours et rendus) par livre
+class StatLivre(Base):
+    __tablename__ = "stats_livres"
+
+    id_livre = Column(Integer, primary_key=True)
+    nb_emprunts = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Top des livres empruntés : les premières entrées de l'index
+        Index("ix_stats_livres_nb_emprunts", "nb_emprunts"),
+    )
+
+
+# Nombre d'emprunts en cours par date de retour prévue (retards : somme des dates passées),
+# réparti en fragments (id de l'emprunt modulo NB_FRAGMENTS) : les emprunts du jour ne se bloquent pas sur une ligne
+class StatEcheance(Base):
+    __tablename__ = "stats_echeances"
+
+    date_retour_prevue = Column(Date, primary_key=True)
+    fragment = Column(Integer, primary_key=True, default=0)
+    nb_actifs = Column(Integer, nullable=False, default=0)
+
+
+# Compteurs du catalogue : "livres" et "livres_disponibles" (stock > 0), sommés sur les fragments (id du livre modulo NB_FRAGMENTS)
+class StatCatalogue(Base):
+    __tablename__ = "stats_catalogue"
+
+    cle = Column(String(50), primary_key=True)
+    fragment = Column(Integer, primary_key=True, default=0)
+    valeur = Column(Integer, nullable=False, default=0)
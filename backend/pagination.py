@@ -0,0 +1,76 @@
+import time
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+# Taille de page par défaut et taille maximale acceptée
+TAILLE_PAGE = 24
+TAILLE_PAGE_MAX = 100
+
+# Durée de vie (secondes) des totaux mis en cache ; invalidés aussi à chaque insertion/suppression
+TTL_COMPTAGE = 60
+
+
+@dataclass
+class Page:
+    """Une page de résultats et le curseur de la suivante (None sur la dernière page)."""
+    elements: list = field(default_factory=list)
+    suivant: Optional[int] = None
+    taille: int = TAILLE_PAGE
+    total: Optional[int] = None
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+
+def borner_taille(taille):
+    return max(1, min(taille or TAILLE_PAGE, TAILLE_PAGE_MAX))
+
+
+# Pagination par curseur : WHERE colonne > :apres ORDER BY colonne LIMIT :taille (+1 pour savoir s'il reste des lignes)
+def paginer(requete, colonne, apres=None, taille=TAILLE_PAGE, total=None):
+    taille = borner_taille(taille)
+    if apres is not None:
+        requete = requete.filter(colonne > apres)
+    elements = requete.order_by(colonne).limit(taille + 1).all()
+    suivant = getattr(elements[taille - 1], colonne.key) if len(elements) > taille else None
+    return Page(elements[:taille], suivant, taille, total)
+
+
+# Pagination par décalage, pour les résultats classés par pertinence (pas de clé monotone)
+def paginer_classement(resultats_plus_un, decalage, taille):
+    suivant = decalage + taille if len(resultats_plus_un) > taille else None
+    return Page(resultats_plus_un[:taille], suivant, taille)
+
+
+# --------------------------------------------
+# Totaux mis en cache
+#--------------------------------------------
+
+_comptages = {}
+
+def compter(db: Session, modele):
+    table = modele.__tablename__
+    entree = _comptages.get(table)
+    if entree is not None and entree[0] > time.monotonic():
+        return entree[1]
+    total = db.query(func.count(modele.id)).scalar()
+    _comptages[table] = (time.monotonic() + TTL_COMPTAGE, total)
+    return total
+
+def invalider_comptages(*tables):
+    for table in tables or list(_comptages):
+        _comptages.pop(table, None)
+
+# Toute insertion ou suppression invalide le total de sa table
+@event.listens_for(Session, "after_flush")
+def _invalider_apres_flush(session, contexte):
+    tables = {objet.__tablename__ for objet in chain(session.new, session.deleted) if hasattr(objet, "__tablename__")}
+    if tables:
+        invalider_comptages(*tables)
@@ -0,0 +1,137 @@
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend import models
+
+# Poids du titre par rapport à la description dans le classement
+POIDS_TITRE = 10.0
+POIDS_DESCRIPTION = 1.0
+
+# Seuil de similarité trigramme (pg_trgm) pour les titres approchants (fautes de frappe)
+SEUIL_TRIGRAMME = 0.3
+
+# Configuration linguistique Postgres (les descriptions du catalogue sont en anglais)
+CONFIG_TEXTE = "english"
+
+
+# --------------------------------------------
+# Index de recherche (créés au démarrage, idempotents)
+#--------------------------------------------
+
+# Postgres : colonne tsvector générée (titre poids A, description poids B), index GIN et trigrammes
+INDEX_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""ALTER TABLE livres ADD COLUMN IF NOT EXISTS recherche tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{CONFIG_TEXTE}', coalesce(titre, '')), 'A')
+        || setweight(to_tsvector('{CONFIG_TEXTE}', coalesce(description, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_livres_recherche ON livres USING GIN (recherche)",
+    "CREATE INDEX IF NOT EXISTS ix_livres_titre_trgm ON livres USING GIN (titre gin_trgm_ops)",
+]
+
+# SQLite : table FTS5 externe (contenu lu dans livres) synchronisée par triggers
+INDEX_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS livres_fts USING fts5(
+        titre, description, content='livres', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS livres_fts_insert AFTER INSERT ON livres BEGIN
+        INSERT INTO livres_fts(rowid, titre, description) VALUES (new.id, new.titre, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS livres_fts_delete AFTER DELETE ON livres BEGIN
+        INSERT INTO livres_fts(livres_fts, rowid, titre, description) VALUES ('delete', old.id, old.titre, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS livres_fts_update AFTER UPDATE OF titre, description ON livres BEGIN
+        INSERT INTO livres_fts(livres_fts, rowid, titre, description) VALUES ('delete', old.id, old.titre, old.description);
+        INSERT INTO livres_fts(rowid, titre, description) VALUES (new.id, new.titre, new.description);
+    END""",
+]
+
+
+def initialiser_recherche(engine):
+    with engine.begin() as connexion:
+        if engine.dialect.name == "postgresql":
+            for instruction in INDEX_POSTGRES:
+                connexion.execute(text(instruction))
+        elif engine.dialect.name == "sqlite":
+            existait = connexion.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'livres_fts'")
+            ).first() is not None
+            for instruction in INDEX_SQLITE:
+                connexion.execute(text(instruction))
+            # Livres insérés avant la création de l'index (base existante)
+            if not existait:
+                connexion.execute(text("INSERT INTO livres_fts(livres_fts) VALUES ('rebuild')"))
+
+
+# --------------------------------------------
+# Recherche
+#--------------------------------------------
+
+# Requête FTS5 : tous les mots requis, le dernier en préfixe (saisie en cours : "harry pot" -> "harry" "pot"*)
+def requete_fts(texte: str):
+    mots = [f'"{mot}"' for mot in re.findall(r"\w+", texte.lower())]
+    if mots:
+        mots[-1] += "*"
+    return " ".join(mots)
+
+
+# Fragments SQL de la recherche : (jointure après "FROM livres", condition WHERE, paramètres)
+def sql_recherche(db: Session, texte: str):
+    dialecte = db.get_bind().dialect.name
+    if dialecte == "postgresql":
+        # Seuil de l'opérateur % pour la transaction courante
+        db.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :seuil, true)"), {"seuil": str(SEUIL_TRIGRAMME)})
+        return (
+            f", websearch_to_tsquery('{CONFIG_TEXTE}', :texte) AS q",
+            "(livres.recherche @@ q OR livres.titre % :texte)",
+            {"texte": texte},
+        )
+    if dialecte == "sqlite":
+        return ("JOIN livres_fts ON livres_fts.rowid = livres.id", "livres_fts MATCH :texte", {"texte": requete_fts(texte)})
+    # Autres bases : pas d'index plein texte, recherche par sous-chaîne
+    return ("", "(lower(livres.titre) LIKE :motif OR lower(livres.description) LIKE :motif)", {"motif": f"%{texte.lower()}%"})
+
+
+# Livres correspondant à la recherche (et aux filtres éventuels), classés par pertinence (titre puis description)
+def rechercher_livres(db: Session, texte: str, limite: int = None, decalage: int = 0, filtres=None):
+    dialecte = db.get_bind().dialect.name
+    colonnes = ", ".join(f"livres.{colonne.name}" for colonne in models.Livre.__table__.columns)
+    et_filtres, parametres_filtres = filtres.sql() if filtres is not None else ("", {})
+
+    if dialecte not in ("postgresql", "sqlite"):
+        return rechercher_par_sous_chaine(db, texte, limite, decalage, filtres)
+
+    jointure, condition, parametres = sql_recherche(db, texte)
+    if not parametres["texte"]:
+        return []
+    if dialecte == "postgresql":
+        # Plein texte (GIN sur tsvector) ou titre approchant (GIN trigrammes), combinés dans le score
+        classement = "ts_rank_cd(livres.recherche, q) + similarity(livres.titre, :texte) DESC"
+    else:
+        classement = f"bm25(livres_fts, {POIDS_TITRE}, {POIDS_DESCRIPTION})"
+    requete = text(f"""
+        SELECT {colonnes} FROM livres {jointure}
+        WHERE {condition} {et_filtres}
+        ORDER BY {classement}, livres.id
+        LIMIT :limite OFFSET :decalage
+    """)
+    # Sans limite : LIMIT NULL sous Postgres, LIMIT -1 sous SQLite
+    if limite is None and dialecte == "sqlite":
+        limite = -1
+    parametres.update(parametres_filtres, limite=limite, decalage=decalage)
+
+    return db.query(models.Livre).from_statement(requete).params(**parametres).all()
+
+
+# Autres bases (pas d'index plein texte) : sous-chaîne du titre ou de la description, titres en premier
+def rechercher_par_sous_chaine(db: Session, texte: str, limite: int = None, decalage: int = 0, filtres=None):
+    motif = f"%{texte}%"
+    requete = db.query(models.Livre).filter(
+        models.Livre.titre.ilike(motif) | models.Livre.description.ilike(motif)
+    )
+    if filtres is not None:
+        requete = requete.filter(*filtres.conditions())
+    requete = requete.order_by(models.Livre.titre.ilike(motif).desc(), models.Livre.id).offset(decalage)
+    return requete.limit(limite).all() if limite is not None else requete.all()
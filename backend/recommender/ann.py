@@ -0,0 +1,72 @@
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+# Dimension de l'espace réduit (TruncatedSVD) utilisé pour partitionner le catalogue
+N_COMPOSANTES = 128
+
+# Nombre de partitions explorées par requête par défaut (compromis rappel / latence)
+N_SONDES = 8
+
+
+class IndexANN:
+    """Index approché : projection SVD des lignes TF-IDF puis partition grossière (k-means).
+
+    Chaque livre est rangé dans la liste de son centroïde le plus proche. Une requête
+    n'explore que les `n_sondes` listes dont les centroïdes sont les plus proches ;
+    les candidats sont ensuite re-classés exactement sur la matrice TF-IDF. Plus
+    `n_sondes` est grand, meilleur est le rappel et plus la requête est lente.
+    """
+
+    # Tableaux sauvegardés avec le modèle (ouverts en mmap)
+    TABLEAUX = ("ann_composantes", "ann_centroides", "ann_ordre", "ann_debuts")
+
+    def __init__(self, composantes, centroides, ordre, debuts, n_sondes=N_SONDES):
+        self.composantes = composantes  # (d, V) : projection SVD
+        self.centroides = centroides    # (nb_listes, d), normalisés
+        self.ordre = ordre              # lignes triées par liste
+        self.debuts = debuts            # début de chaque liste dans `ordre` (nb_listes + 1)
+        self.n_sondes = n_sondes
+
+    @classmethod
+    def construire(cls, tfidf_matrix, n_composantes=N_COMPOSANTES, nb_listes=None, graine=0):
+        n, nb_termes = tfidf_matrix.shape
+        nb_listes = nb_listes or max(1, int(np.sqrt(n)))
+
+        svd = TruncatedSVD(n_components=max(1, min(n_composantes, nb_termes - 1, n - 1)), random_state=graine)
+        reduits = normalize(svd.fit_transform(tfidf_matrix)).astype(np.float32)
+
+        kmeans = MiniBatchKMeans(n_clusters=min(nb_listes, n), random_state=graine, n_init=3, batch_size=4096)
+        etiquettes = kmeans.fit_predict(reduits)
+
+        ordre = np.argsort(etiquettes, kind="stable").astype(np.int32)
+        debuts = np.searchsorted(etiquettes[ordre], np.arange(kmeans.n_clusters + 1)).astype(np.int64)
+        return cls(
+            svd.components_.astype(np.float32),
+            normalize(kmeans.cluster_centers_).astype(np.float32),
+            ordre,
+            debuts,
+        )
+
+    # Listes sondées pour un bloc de vecteurs TF-IDF (m x V) : (m, n_sondes), une seule projection
+    def listes_sondees(self, vecteurs, n_sondes=None):
+        n_sondes = min(n_sondes or self.n_sondes, len(self.centroides))
+        projection = normalize(np.asarray(vecteurs @ self.composantes.T))
+        scores = projection @ self.centroides.T
+        return np.argpartition(scores, -n_sondes, axis=1)[:, -n_sondes:]
+
+    # Lignes d'une liste
+    def liste(self, l):
+        return self.ordre[self.debuts[l]:self.debuts[l + 1]]
+
+    # Lignes candidates pour un vecteur TF-IDF (1 x V) : contenu des n_sondes listes les plus proches
+    def candidats(self, vecteur, n_sondes=None):
+        return np.concatenate([self.liste(l) for l in self.listes_sondees(vecteur, n_sondes)[0]])
+
+    def tableaux(self):
+        return dict(zip(self.TABLEAUX, (self.composantes, self.centroides, self.ordre, self.debuts)))
+
+    @classmethod
+    def depuis_tableaux(cls, tableaux, n_sondes=N_SONDES):
+        return cls(*(tableaux[nom] for nom in cls.TABLEAUX), n_sondes=n_sondes)
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Nombre maximal de requêtes gardées en cache et durée de vie d'une entrée (secondes)
+TAILLE_CACHE_RESULTATS = 10_000
+TTL_CACHE_RESULTATS = 3600
+
+
+class CacheResultats:
+    """Cache LRU/TTL des résultats de recommandation.
+
+    La clé est le texte prétraité ; le cache est associé à une version du modèle et
+    se vide dès qu'une version différente est demandée (modèle reconstruit ou mis à
+    jour), de sorte qu'aucun résultat périmé n'est servi.
+    """
+
+    def __init__(self, taille_max=TAILLE_CACHE_RESULTATS, ttl=TTL_CACHE_RESULTATS):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._version = None
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, texte, version):
+        with self._verrou:
+            self._verifier_version(version)
+            entree = self._entrees.get(texte)
+            if entree is None or entree[0] < time.monotonic():
+                if entree is not None:
+                    del self._entrees[texte]
+                self.misses += 1
+                return None
+            self._entrees.move_to_end(texte)
+            self.hits += 1
+            return entree[1]
+
+    def set(self, texte, version, resultat):
+        with self._verrou:
+            self._verifier_version(version)
+            self._entrees[texte] = (time.monotonic() + self.ttl, resultat)
+            self._entrees.move_to_end(texte)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+                self.evictions += 1
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def statistiques(self):
+        total = self.hits + self.misses
+        return {
+            "taille": len(self._entrees),
+            "taille_max": self.taille_max,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taux_hit": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "version": self._version,
+        }
+
+    def _verifier_version(self, version):
+        if version != self._version:
+            if self._entrees:
+                self.invalidations += 1
+            self._entrees.clear()
+            self._version = version
+
+
+# Cache partagé par la route de recommandation par description
+cache_resultats = CacheResultats()
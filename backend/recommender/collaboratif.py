@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import func
+
+from backend import database, models
+from backend.recommender.recommender import top_k
+
+# Nombre de co-emprunts en attente au-delà duquel ils sont fusionnés dans la matrice creuse
+SEUIL_FUSION = 100_000
+
+# Nombre d'adhérents traités par bloc lors de la construction (borne la mémoire de B.T @ B)
+TAILLE_BLOC_ADHERENTS = 200_000
+
+# Intervalle (secondes) entre deux lectures des emprunts enregistrés par les autres workers
+INTERVALLE_RAFRAICHISSEMENT = 5
+
+# Nombre d'ids relus sous le filigrane à chaque rafraîchissement : un emprunt dont la transaction
+# se termine après celle d'un id supérieur n'est pas manqué (la relecture est sans effet)
+CHEVAUCHEMENT_EMPRUNTS = 1000
+
+# Poids du score de contenu (TF-IDF) dans le score hybride ; le reste va au filtrage collaboratif
+POIDS_CONTENU = 0.7
+
+
+class ModeleCollaboratif:
+    """Matrice item-item des co-emprunts ("les adhérents qui ont emprunté ce livre ont aussi emprunté...").
+
+    Les lignes et colonnes sont indexées directement par Livre.id (et les lignes de la
+    matrice d'emprunts par Adherent.id). Un nouvel emprunt n'ajoute que les paires
+    (livre, livres déjà empruntés par l'adhérent) dans un dictionnaire de deltas, fusionné
+    dans la matrice creuse par lots : le coût d'un emprunt est O(historique de l'adhérent).
+
+    Chaque worker a sa propre matrice : les emprunts enregistrés ailleurs sont relus
+    périodiquement dans les tables emprunts et historique_emprunts, au-delà du plus grand
+    id déjà lu de chacune (filigranes). Un retour ne fait que renseigner date_retour_effectif :
+    un emprunt rendu avant le rafraîchissement est donc lu comme les autres.
+    """
+
+    def __init__(self, emprunts, co_emprunts):
+        self.emprunts = sp.csr_matrix(emprunts, dtype=np.float32)
+        self.co_emprunts = sp.csr_matrix(co_emprunts, dtype=np.float32)
+        self.nb_emprunteurs = np.asarray(self.emprunts.sum(axis=0)).ravel()
+        self.nouveaux_emprunts = defaultdict(set)
+        self.deltas = defaultdict(lambda: defaultdict(int))
+        self.nb_deltas = 0
+        self.dernier_emprunt_id = 0
+        self.dernier_historique_id = 0
+        self._verrou = threading.Lock()
+
+    @classmethod
+    def construire(cls, id_adherents, id_livres, taille_bloc=TAILLE_BLOC_ADHERENTS):
+        id_adherents = np.asarray(id_adherents, dtype=np.int64)
+        id_livres = np.asarray(id_livres, dtype=np.int64)
+        nb_adherents = int(id_adherents.max()) + 1 if len(id_adherents) else 0
+        nb_livres = int(id_livres.max()) + 1 if len(id_livres) else 0
+
+        # Matrice binaire adhérents x livres (un livre emprunté plusieurs fois compte une fois)
+        emprunts = sp.csr_matrix(
+            (np.ones(len(id_adherents), dtype=np.float32), (id_adherents, id_livres)),
+            shape=(nb_adherents, nb_livres),
+        )
+        emprunts.sum_duplicates()
+        emprunts.data[:] = 1
+
+        # Co-emprunts = B.T @ B, accumulé par blocs d'adhérents
+        co_emprunts = sp.csr_matrix((nb_livres, nb_livres), dtype=np.float32)
+        for debut in range(0, nb_adherents, taille_bloc):
+            bloc = emprunts[debut:debut + taille_bloc]
+            co_emprunts = co_emprunts + (bloc.T @ bloc).tocsr()
+        co_emprunts.setdiag(0)
+        co_emprunts.eliminate_zeros()
+        return cls(emprunts, co_emprunts)
+
+    # Construction depuis les tables emprunts et historique_emprunts
+    @classmethod
+    def depuis_base(cls, db):
+        dernier_emprunt_id = db.query(func.max(models.Emprunt.id)).scalar() or 0
+        dernier_historique_id = db.query(func.max(models.HistoriqueEmprunt.id)).scalar() or 0
+        lignes = (
+            db.query(models.Emprunt.id_adherent, models.Emprunt.id_livre)
+            .union_all(db.query(models.HistoriqueEmprunt.id_adherent, models.HistoriqueEmprunt.id_livre))
+            .all()
+        )
+        lignes = [(a, l) for a, l in lignes if a is not None and l is not None]
+        id_adherents = np.fromiter((a for a, _ in lignes), dtype=np.int64, count=len(lignes))
+        id_livres = np.fromiter((l for _, l in lignes), dtype=np.int64, count=len(lignes))
+        modele = cls.construire(id_adherents, id_livres)
+        modele.dernier_emprunt_id = dernier_emprunt_id
+        modele.dernier_historique_id = dernier_historique_id
+        return modele
+
+    # Intègre les emprunts enregistrés depuis les filigranes (par n'importe quel worker)
+    def rafraichir(self, db):
+        nb_lignes = 0
+        for table, filigrane in ((models.Emprunt, "dernier_emprunt_id"), (models.HistoriqueEmprunt, "dernier_historique_id")):
+            lignes = (
+                db.query(table.id, table.id_adherent, table.id_livre)
+                .filter(table.id > getattr(self, filigrane) - CHEVAUCHEMENT_EMPRUNTS)
+                .order_by(table.id)
+                .all()
+            )
+            for _, id_adherent, id_livre in lignes:
+                if id_adherent is not None and id_livre is not None:
+                    self.enregistrer_emprunt(id_adherent, id_livre)
+            if lignes:
+                setattr(self, filigrane, max(getattr(self, filigrane), lignes[-1].id))
+            nb_lignes += len(lignes)
+        return nb_lignes
+
+    # Livres déjà empruntés par un adhérent
+    def livres_adherent(self, id_adherent):
+        livres = set()
+        if id_adherent < self.emprunts.shape[0]:
+            debut, fin = self.emprunts.indptr[id_adherent], self.emprunts.indptr[id_adherent + 1]
+            livres.update(self.emprunts.indices[debut:fin].tolist())
+        livres.update(self.nouveaux_emprunts.get(id_adherent, ()))
+        return livres
+
+    # Mise à jour incrémentale lors d'un nouvel emprunt
+    def enregistrer_emprunt(self, id_adherent, id_livre):
+        with self._verrou:
+            deja_empruntes = self.livres_adherent(id_adherent)
+            if id_livre in deja_empruntes:
+                return
+            for autre in deja_empruntes:
+                self.deltas[id_livre][autre] += 1
+                self.deltas[autre][id_livre] += 1
+            self.nb_deltas += 2 * len(deja_empruntes)
+            self.nouveaux_emprunts[id_adherent].add(id_livre)
+
+            if id_livre >= len(self.nb_emprunteurs):
+                self.nb_emprunteurs = np.concatenate(
+                    [self.nb_emprunteurs, np.zeros(id_livre + 1 - len(self.nb_emprunteurs), dtype=self.nb_emprunteurs.dtype)]
+                )
+            self.nb_emprunteurs[id_livre] += 1
+
+            if self.nb_deltas >= SEUIL_FUSION:
+                self.fusionner()
+
+    # Fusion des deltas dans les matrices creuses (O(nnz), amorti sur SEUIL_FUSION paires)
+    def fusionner(self):
+        nb_livres = max(self.co_emprunts.shape[0], len(self.nb_emprunteurs))
+        lignes, colonnes, valeurs = [], [], []
+        for livre, autres in self.deltas.items():
+            for autre, nb in autres.items():
+                lignes.append(livre)
+                colonnes.append(autre)
+                valeurs.append(nb)
+        delta = sp.csr_matrix((np.asarray(valeurs, dtype=np.float32), (lignes, colonnes)), shape=(nb_livres, nb_livres))
+        co_emprunts = self.co_emprunts.copy()
+        co_emprunts.resize((nb_livres, nb_livres))
+        self.co_emprunts = (co_emprunts + delta).tocsr()
+
+        adherents = [a for a, livres in self.nouveaux_emprunts.items() for _ in livres]
+        livres = [l for livres_a in self.nouveaux_emprunts.values() for l in livres_a]
+        nb_adherents = max(self.emprunts.shape[0], max(adherents, default=-1) + 1)
+        nouveaux = sp.csr_matrix(
+            (np.ones(len(adherents), dtype=np.float32), (adherents, livres)), shape=(nb_adherents, nb_livres)
+        )
+        emprunts = self.emprunts.copy()
+        emprunts.resize((nb_adherents, nb_livres))
+        self.emprunts = (emprunts + nouveaux).tocsr()
+
+        self.deltas = defaultdict(lambda: defaultdict(int))
+        self.nouveaux_emprunts = defaultdict(set)
+        self.nb_deltas = 0
+
+    # Scores collaboratifs (co-emprunts normalisés, cosinus) des seuls livres co-empruntés avec un livre :
+    # (ids, scores) lus dans la ligne creuse et les deltas, O(nombre de co-emprunts du livre)
+    def scores_livre(self, id_livre):
+        indices = np.zeros(0, dtype=np.int64)
+        valeurs = np.zeros(0, dtype=np.float32)
+        if id_livre < self.co_emprunts.shape[0]:
+            debut, fin = self.co_emprunts.indptr[id_livre], self.co_emprunts.indptr[id_livre + 1]
+            indices = self.co_emprunts.indices[debut:fin].astype(np.int64)
+            valeurs = self.co_emprunts.data[debut:fin]
+        deltas = self.deltas.get(id_livre)
+        if deltas:
+            indices = np.concatenate([indices, np.fromiter(deltas.keys(), dtype=np.int64, count=len(deltas))])
+            valeurs = np.concatenate([valeurs, np.fromiter(deltas.values(), dtype=np.float32, count=len(deltas))])
+            indices, inverse = np.unique(indices, return_inverse=True)
+            valeurs = np.bincount(inverse, weights=valeurs).astype(np.float32)
+
+        if id_livre >= len(self.nb_emprunteurs) or not self.nb_emprunteurs[id_livre]:
+            return indices, valeurs
+        normes = np.sqrt(self.nb_emprunteurs[indices] * self.nb_emprunteurs[id_livre])
+        return indices, np.divide(valeurs, normes, out=np.zeros_like(valeurs), where=normes > 0)
+
+    # Livres les plus co-empruntés avec un livre : liste de (Livre.id, score)
+    def similaires(self, id_livre, k=10):
+        with self._verrou:
+            indices, scores = self.scores_livre(id_livre)
+        positifs = scores > 0
+        indices, scores = indices[positifs], scores[positifs]
+        if not len(scores):
+            return []
+        top, valeurs = top_k(scores[np.newaxis, :], k)
+        return [(int(indices[i]), float(v)) for i, v in zip(top[0], valeurs[0])]
+
+
+# Score hybride : POIDS_CONTENU x similarité TF-IDF + (1 - POIDS_CONTENU) x score collaboratif
+def melanger(voisins_contenu, voisins_collaboratifs, k, poids_contenu=POIDS_CONTENU):
+    scores = defaultdict(float)
+    for livre_id, score in voisins_contenu:
+        scores[livre_id] += poids_contenu * score
+    for livre_id, score in voisins_collaboratifs:
+        scores[livre_id] += (1 - poids_contenu) * score
+    return [livre_id for livre_id, _ in sorted(scores.items(), key=lambda x: -x[1])[:k]]
+
+
+# Modèle collaboratif partagé, construit en arrière-plan depuis l'historique (lancé au démarrage),
+# puis rafraîchi au plus toutes les INTERVALLE_RAFRAICHISSEMENT secondes
+_modele_collaboratif = None
+_construction = None
+_verrou_construction = threading.Lock()
+_executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modele-collaboratif")
+_prochain_rafraichissement = 0.0
+
+# Lance la construction si elle n'est ni faite ni en cours (ou si elle a échoué) ; retourne son Future
+def demarrer_construction():
+    global _construction
+    with _verrou_construction:
+        if _construction is None or (_construction.done() and _construction.exception() is not None):
+            _construction = _executeur.submit(_construire)
+        return _construction
+
+# Modèle partagé, ou None tant qu'il est en construction (les routes se contentent alors des voisins de contenu)
+def modele_collaboratif():
+    global _prochain_rafraichissement
+    if _modele_collaboratif is None:
+        demarrer_construction()
+        return None
+    if time.monotonic() >= _prochain_rafraichissement:
+        _prochain_rafraichissement = time.monotonic() + INTERVALLE_RAFRAICHISSEMENT
+        _executeur.submit(_rafraichir, _modele_collaboratif)
+    return _modele_collaboratif
+
+def _construire():
+    global _modele_collaboratif, _prochain_rafraichissement
+    db = database.SessionLocal()
+    try:
+        modele = ModeleCollaboratif.depuis_base(db)
+    finally:
+        db.close()
+    _prochain_rafraichissement = time.monotonic() + INTERVALLE_RAFRAICHISSEMENT
+    _modele_collaboratif = modele
+    return modele
+
+def _rafraichir(modele):
+    db = database.SessionLocal()
+    try:
+        modele.rafraichir(db)
+    finally:
+        db.close()
+
+# Répercute un emprunt enregistré dans ce worker (les autres le liront au prochain rafraîchissement) ;
+# sans modèle chargé, il sera lu depuis la base à la construction
+def notifier_emprunt(id_adherent, id_livre):
+    if _modele_collaboratif is not None:
+        _modele_collaboratif.enregistrer_emprunt(id_adherent, id_livre)
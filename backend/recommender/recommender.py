@@ -1,57 +1,779 @@
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import joblib
+import bisect
+import copy
+import json
+import os
 import re
+import shutil
+from datetime import datetime
 from nltk.tokenize import word_tokenize
 import nltk
 from nltk.stem import PorterStemmer
 import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from backend.config import MODELE_DIR, RECO_MODE_ANN, RECO_ANN_SONDES
+from backend.recommender.ann import IndexANN
 
 # Téléchargement des ressources NLTK et initialisation des outils de traitement
 nltk.download('punkt_tab', quiet=True)
 stemmer = PorterStemmer()
 
+# Nombre de voisins conservés par livre
+K_VOISINS = 20
+
+# Budget mémoire (en octets) d'un bloc de similarités denses pendant le calcul des voisins
+MEMOIRE_BLOC = 64 * 1024 * 1024
+
+# Seuils de dérive au-delà desquels une mise à jour incrémentale déclenche un refit complet
+SEUIL_CHANGEMENTS = 500          # nombre de livres ajoutés/modifiés/supprimés depuis le dernier refit
+SEUIL_HORS_VOCABULAIRE = 0.2     # part des tokens des livres modifiés absents du vocabulaire
+
+# Nombre de versions du modèle conservées sur disque (les workers peuvent encore mapper l'ancienne)
+VERSIONS_CONSERVEES = 2
+
+# Tableaux bruts composant un modèle sauvegardé, ouverts en mmap au chargement
+TABLEAUX_MODELE = (
+    "tfidf_data", "tfidf_indices", "tfidf_indptr",
+    "tfidf_colonnes_data", "tfidf_colonnes_indices", "tfidf_colonnes_indptr",
+    "voisins_indices", "voisins_scores",
+    "ids", "ids_tries", "ordre_ids",
+    "vocabulaire", "idf", "empreintes",
+)
+
+# Ponctuation retirée des tokens (motif compilé une seule fois)
+PONCTUATION = re.compile(f'[{re.escape(string.punctuation)}]')
+
+# Caractère autre que lettre, chiffre ou espace : le texte doit passer par word_tokenize
+CARACTERE_SPECIAL = re.compile(r'[^\w\s]|_')
+
+# Taille des caches de stems et de mots prétraités
+TAILLE_CACHE = 200_000
+
+# Nombre minimal de textes pour justifier le prétraitement multi-processus
+SEUIL_MULTIPROCESS = 20_000
+
+
+@lru_cache(maxsize=TAILLE_CACHE)
+def stem(token):
+    return stemmer.stem(token)
+
+# Tokens prétraités d'un texte : tokenisation, suppression ponctuation, stemming
+def tokens_pretraites(text):
+    tokens = (PONCTUATION.sub('', token) for token in word_tokenize(text))
+    return tuple(stem(token) for token in tokens if token)
+
+# Un mot sans ponctuation se tokenise toujours de la même façon : résultat mis en cache
+@lru_cache(maxsize=TAILLE_CACHE)
+def mot_pretraite(mot):
+    return tokens_pretraites(mot)
+
 def preprocess_text_func(text):
+    text_1 = str(text).lower()
 
-        text_1=str(text)
-        text_1=text_1.lower()
+    # Sans ponctuation, word_tokenize ne coupe qu'aux espaces (et à l'intérieur de
+    # contractions comme "cannot") : on traite chaque mot séparément, via le cache
+    if not CARACTERE_SPECIAL.search(text_1):
+        return ' '.join(token for mot in text_1.split() for token in mot_pretraite(mot))
 
-        # Tokenisation (décompose le texte en tokens)
-        tokens = word_tokenize(text_1)
-    
-        # Supprimer la ponctuation et les caractères spéciaux
-        tokens = [re.sub(f'[{re.escape(string.punctuation)}]', '', token) for token in tokens]
-        tokens = [token for token in tokens if token]  # supprimer les tokens vides après suppression ponctuation
-    
-        # Appliquer le stemming
-        stemmed_tokens = [stemmer.stem(token) for token in tokens]
+    return ' '.join(tokens_pretraites(text_1))
 
-        #Join tolkens
-        processed_text_str = ' '.join(stemmed_tokens)
-    
-        return processed_text_str
+# Prétraitement d'un lot de textes, en plusieurs processus pour les gros corpus
+def preprocess_texts(textes, n_jobs=1):
+    textes = list(textes)
+    if n_jobs == 1 or len(textes) < SEUIL_MULTIPROCESS:
+        return [preprocess_text_func(texte) for texte in textes]
 
-# Fonction qui genère les modèles de recommendations
-def modele_recommandation(df):
+    n_jobs = n_jobs if n_jobs > 0 else os.cpu_count()
+    with ProcessPoolExecutor(max_workers=n_jobs) as executeur:
+        return list(executeur.map(preprocess_text_func, textes, chunksize=max(1, len(textes) // (n_jobs * 4))))
+
+# Top k par ligne d'une matrice dense de scores, trié par score décroissant
+def top_k(scores, k):
+    k = min(k, scores.shape[1])
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    ordre = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, ordre, axis=1), np.take_along_axis(top_scores, ordre, axis=1)
+
+# Calcul des k plus proches voisins de chaque livre, bloc par bloc
+def construire_voisins(tfidf_matrix, k=K_VOISINS, memoire_bloc=MEMOIRE_BLOC):
+    """Retourne (indices, scores) de forme (n, k) triés par similarité décroissante.
+
+    Les lignes TF-IDF étant normalisées (L2), le produit scalaire est la similarité
+    cosinus. On ne matérialise jamais la matrice n x n : seul un bloc de lignes est
+    densifié à la fois. Par ligne du bloc : n scores float32 et les n indices int64
+    renvoyés par argpartition, soit 12 n octets ; le bloc est dimensionné pour que
+    l'ensemble tienne dans memoire_bloc.
+    """
+    matrice = sp.csr_matrix(tfidf_matrix, dtype=np.float32)
+    n = matrice.shape[0]
+    k = min(k, max(n - 1, 0))
+
+    indices = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    transposee = matrice.T.tocsr()
+    taille_bloc = max(1, memoire_bloc // ((4 + 8) * n))
+
+    for debut in range(0, n, taille_bloc):
+        fin = min(debut + taille_bloc, n)
+        bloc = (matrice[debut:fin] @ transposee).toarray()
+
+        # Exclure le livre lui-même de ses voisins
+        lignes = np.arange(fin - debut)
+        bloc[lignes, lignes + debut] = -1
+
+        # Top k sans trier toute la ligne
+        indices[debut:fin], scores[debut:fin] = top_k(bloc, k)
+
+    return indices, scores
+
+
+class TableauPartage:
+    """Tableau numpy à capacité doublée, partagé par les versions successives du modèle.
+
+    Une version ne lit que le préfixe [:n] qu'elle connaît ; un ajout n'écrit qu'au-delà
+    de n, si bien que les données d'une version publiée ne changent jamais. Si une autre
+    version a déjà écrit au-delà de n (copie abandonnée), l'ajout repart d'une copie du préfixe.
+    """
+
+    def __init__(self, dtype, capacite=64):
+        self.valeurs = np.zeros(capacite, dtype=dtype)
+        self.longueur = 0
+
+    # Ajoute des éléments après les n premiers ; retourne le tableau (éventuellement réalloué) qui les contient
+    def ajouter(self, n, elements):
+        elements = np.asarray(elements, dtype=self.valeurs.dtype)
+        fin = n + len(elements)
+        tableau = self
+        if self.longueur != n or fin > len(self.valeurs):
+            capacite = len(self.valeurs) if fin <= len(self.valeurs) else max(2 * len(self.valeurs), fin)
+            tableau = TableauPartage(self.valeurs.dtype, capacite)
+            tableau.valeurs[:n] = self.valeurs[:n]
+        tableau.valeurs[n:fin] = elements
+        tableau.longueur = fin
+        return tableau
+
+
+class Surcharges:
+    """Valeurs par clé entière (ligne ou Livre.id), en journal partagé par les versions du modèle.
+
+    Une version connaît les n premières entrées ; la valeur d'une clé est sa dernière
+    entrée parmi elles. Comme pour TableauPartage, un ajout n'écrit qu'au-delà de n.
+    """
+
+    def __init__(self, entrees=()):
+        self.cles = TableauPartage(np.int64)
+        self.valeurs = []
+        self.positions = {}  # clé -> positions croissantes de ses entrées
+        for cle, valeur in entrees:
+            self._ecrire(cle, valeur)
+
+    def lire(self, n, cle, defaut=None):
+        positions = self.positions.get(cle, ())
+        i = bisect.bisect_left(positions, n)
+        return self.valeurs[positions[i - 1]] if i else defaut
+
+    # Clés des n premières entrées, dans l'ordre d'écriture
+    def cles_jusqua(self, n):
+        return self.cles.valeurs[:n]
+
+    # Ajoute une entrée après les n premières ; retourne les surcharges qui la contiennent
+    def ajouter(self, n, cle, valeur):
+        surcharges = self
+        if len(self.valeurs) != n:
+            surcharges = Surcharges(zip(self.cles.valeurs[:n].tolist(), self.valeurs[:n]))
+        surcharges._ecrire(cle, valeur)
+        return surcharges
+
+    def _ecrire(self, cle, valeur):
+        position = len(self.valeurs)
+        self.cles = self.cles.ajouter(position, [cle])
+        self.valeurs.append(valeur)
+        self.positions.setdefault(cle, []).append(position)
+
+
+class ModeleRecommandation:
+    """Modèle TF-IDF et table des voisins, mis à jour de façon incrémentale entre deux refits.
+
+    Les lignes de tfidf_matrix correspondent aux livres de `ids`. Les livres ajoutés
+    depuis le dernier refit sont empilés dans une petite matrice `ajouts` transformée
+    avec le vocabulaire existant ; une modification invalide l'ancienne ligne
+    (tombstone) et en ajoute une nouvelle.
+
+    Les modifications sont des deltas en ajout seul : les opérations sont ajoutées au
+    journal de la version (modifications.jsonl) et les structures en mémoire
+    (TableauPartage, Surcharges) sont partagées entre versions publiées, chacune n'en
+    lisant que son préfixe. Le coût d'une opération ne dépend ni de la taille du
+    catalogue ni du nombre de modifications en attente, hormis le calcul des similarités
+    avec les livres déjà ajoutés (au plus SEUIL_CHANGEMENTS lignes).
+
+    Les voisins d'un nouveau livre sont cherchés parmi les livres partageant un de ses
+    termes (listes inversées `colonnes`, ou partitions de l'index ANN). Le nouveau livre
+    est inséré en retour dans la liste de chacun de ses k voisins dont il dépasse le
+    dernier score. Asymétrie restante jusqu'au prochain refit : un livre dont le nouveau
+    livre devrait entrer dans la liste mais qui n'est pas lui-même dans ses k voisins
+    ne le voit pas.
+    """
+
+    def __init__(self, vectorizer, tfidf_matrix, ids, voisins, version_base=None, ordre_ids=None, ids_tries=None,
+                 index_ann=None, empreintes=None, colonnes=None, duree_construction=0.0):
+        self.vectorizer = vectorizer
+        self.index_ann = index_ann
+        self.tfidf_matrix = sp.csr_matrix(tfidf_matrix)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.empreintes = np.zeros(len(self.ids), dtype=np.uint64) if empreintes is None else empreintes
+        self.voisins = voisins
+        self.version_base = version_base or datetime.now().strftime("%Y%m%d%H%M%S%f")
+        self.duree_construction = duree_construction  # durée (s) du refit qui a produit la base
+
+        # Listes inversées (une colonne par terme) pour chercher les voisins d'un livre ajouté
+        self.colonnes = sp.csc_matrix(self.tfidf_matrix) if colonnes is None else colonnes
+
+        # Recherche id -> ligne par dichotomie sur les ids triés (pas de dict Python à construire)
+        self.ordre_ids = np.argsort(self.ids, kind="stable") if ordre_ids is None else ordre_ids
+        self.ids_tries = self.ids[self.ordre_ids] if ids_tries is None else ids_tries
+        self.initialiser_modifications()
+
+    # Version du modèle : refit d'origine + nombre de changements incrémentaux appliqués
+    @property
+    def version(self):
+        return f"{self.version_base}.{self.nb_changements}"
+
+    # Nom du dossier de la version de base dans le registre
+    @property
+    def nom(self):
+        return f"modele-{self.version_base}"
+
+    # Empreinte du catalogue représenté (livres actifs), comparable à empreinte_catalogue()
+    @property
+    def empreinte(self):
+        empreintes = np.concatenate([self.empreintes, self.empreintes_ajouts])
+        actives = np.ones(len(empreintes), dtype=bool)
+        actives[self.supprimees] = False
+        return format_empreinte(int(actives.sum()), empreintes[actives])
+
+    # Etat vide des modifications depuis le dernier refit
+    def initialiser_modifications(self):
+        self._ajouts_data = TableauPartage(np.float64)
+        self._ajouts_indices = TableauPartage(np.int32)
+        self._ajouts_indptr = TableauPartage(np.int32).ajouter(0, [0])
+        self._ids_ajouts = TableauPartage(np.int64)
+        self._empreintes_ajouts = TableauPartage(np.uint64)
+        self.nb_ajouts = 0
+        self.nnz_ajouts = 0
+
+        self._supprimees = Surcharges()      # ligne -> True
+        self._positions_ajouts = Surcharges()  # Livre.id -> ligne ajoutée active (None une fois invalidée)
+        self._voisins_modifies = Surcharges()  # ligne -> (indices, scores) remplaçant sa ligne de `voisins`
+        self.nb_supprimees = 0
+        self.nb_positions_ajouts = 0
+        self.nb_voisins_modifies = 0
+
+        self.nb_changements = 0
+        self.nb_tokens = 0
+        self.nb_hors_vocabulaire = 0
+
+        self.position_journal = 0  # octets du journal déjà appliqués
+        self.en_attente = ()       # opérations appliquées mais pas encore écrites au journal
+        self._vues_ajouts()
+
+    def _vues_ajouts(self):
+        self.ajouts = sp.csr_matrix(
+            (
+                self._ajouts_data.valeurs[:self.nnz_ajouts],
+                self._ajouts_indices.valeurs[:self.nnz_ajouts],
+                self._ajouts_indptr.valeurs[:self.nb_ajouts + 1],
+            ),
+            shape=(self.nb_ajouts, self.tfidf_matrix.shape[1]),
+            copy=False,
+        )
+        self.ids_ajouts = self._ids_ajouts.valeurs[:self.nb_ajouts]
+        self.empreintes_ajouts = self._empreintes_ajouts.valeurs[:self.nb_ajouts]
+
+    # Copie à modifier puis publier : les structures partagées ne sont pas copiées
+    def copie(self):
+        modele = copy.copy(self)
+        modele.en_attente = ()
+        return modele
+
+    @property
+    def nb_lignes(self):
+        return len(self.ids) + self.nb_ajouts
+
+    # Lignes supprimées (tombstones) depuis le dernier refit
+    @property
+    def supprimees(self):
+        return self._supprimees.cles_jusqua(self.nb_supprimees)
+
+    def est_supprimee(self, ligne):
+        return self._supprimees.lire(self.nb_supprimees, ligne, False)
+
+    # Ligne active d'un livre, ou None s'il n'est pas dans le modèle
+    def ligne(self, livre_id):
+        livre_id = int(livre_id)
+        if livre_id in self._positions_ajouts.positions:
+            ligne = self._positions_ajouts.lire(self.nb_positions_ajouts, livre_id)
+            if ligne is not None:
+                return ligne
+        i = np.searchsorted(self.ids_tries, livre_id)
+        if i == len(self.ids_tries) or self.ids_tries[i] != livre_id:
+            return None
+        ligne = int(self.ordre_ids[i])
+        if self.est_supprimee(ligne):
+            return None
+        return ligne
+
+    # Identifiants Livre.id correspondant à des lignes du modèle
+    def ids_lignes(self, lignes):
+        lignes = np.asarray(lignes)
+        n = len(self.ids)
+        ids = np.empty(lignes.shape, dtype=np.int64)
+        base = lignes < n
+        ids[base] = self.ids[lignes[base]]
+        ids[~base] = self.ids_ajouts[lignes[~base] - n]
+        return ids
+
+    # Liste (indices, scores) des voisins d'une ligne : table précalculée ou version modifiée depuis le refit
+    def voisins_ligne(self, ligne):
+        voisins = self._voisins_modifies.lire(self.nb_voisins_modifies, ligne)
+        if voisins is None:
+            return self.voisins[0][ligne], self.voisins[1][ligne]
+        return voisins
+
+    # Livres les plus proches d'un livre, lus dans la table des voisins précalculée : O(k)
+    def voisins_de(self, livre_id, k=K_VOISINS):
+        return [voisin for voisin, _ in self.voisins_scores_de(livre_id, k)]
+
+    # Idem avec les similarités : liste de (Livre.id, score)
+    def voisins_scores_de(self, livre_id, k=K_VOISINS):
+        ligne = self.ligne(livre_id)
+        if ligne is None:
+            return []
+        indices, scores = self.voisins_ligne(ligne)
+        gardes = [(int(i), float(score)) for i, score in zip(indices, scores) if score > 0 and not self.est_supprimee(int(i))][:k]
+        ids = self.ids_lignes([i for i, _ in gardes]).tolist()
+        return list(zip(ids, [score for _, score in gardes]))
+
+    # Similarités (requêtes x lignes) ; les lignes supprimées valent -1
+    def similarites(self, vecteurs):
+        # matrice @ vecteurs.T évite de convertir (donc copier) la matrice partagée en CSC
+        scores = (self.tfidf_matrix @ vecteurs.T).T.toarray()
+        if self.ajouts.shape[0]:
+            scores = np.hstack([scores, (self.ajouts @ vecteurs.T).T.toarray()])
+        if self.nb_supprimees:
+            scores[:, self.supprimees] = -1
+        return scores
+
+    # Vecteurs TF-IDF (une ligne chacun) de lignes du modèle, ajouts compris
+    def vecteurs_lignes(self, lignes):
+        n = len(self.ids)
+        if not len(lignes):
+            return sp.csr_matrix((0, self.tfidf_matrix.shape[1]))
+        return sp.vstack([self.tfidf_matrix[l] if l < n else self.ajouts[l - n] for l in lignes], format="csr")
+
+    # Top k lignes actives par requête : liste de (lignes, scores), recherche exacte ou approchée (ANN)
+    def rechercher(self, vecteurs, k, n_sondes=None, memoire_bloc=MEMOIRE_BLOC):
+        # Un seul produit creux par bloc de requêtes ; la taille du bloc borne la matrice dense des scores
+        # (float64) et les indices int64 d'argpartition : 16 octets par ligne du modèle et par requête
+        resultats = []
+        taille_bloc = max(1, memoire_bloc // ((8 + 8) * max(self.nb_lignes, 1)))
+        for debut in range(0, vecteurs.shape[0], taille_bloc):
+            bloc = vecteurs[debut:debut + taille_bloc]
+            if self.index_ann is not None:
+                resultats.extend(self._rechercher_ann_bloc(bloc, k, n_sondes))
+                continue
+            lignes, scores = top_k(self.similarites(bloc), k)
+            resultats.extend((l[s > -1], s[s > -1]) for l, s in zip(lignes, scores))
+        return resultats
+
+    # Bloc de requêtes en mode ANN : une projection pour tout le bloc et un produit creux sur l'union
+    # des listes sondées, puis chaque requête ne garde que les lignes de ses propres listes
+    def _rechercher_ann_bloc(self, vecteurs, k, n_sondes=None):
+        sondees = self.index_ann.listes_sondees(vecteurs, n_sondes)
+        listes = np.unique(sondees)
+        contenus = [self.index_ann.liste(l) for l in listes]
+        etiquettes = np.repeat(listes, [len(c) for c in contenus])
+        candidats = np.concatenate(contenus).astype(np.int64)
+        scores = (self.tfidf_matrix[candidats] @ vecteurs.T).toarray()
+        resultats = []
+        for j in range(vecteurs.shape[0]):
+            garder = np.isin(etiquettes, sondees[j])
+            resultats.append(self._meilleurs_candidats(vecteurs[j], candidats[garder], scores[garder, j], k))
+        return resultats
+
+    # Candidats des partitions les plus proches, re-classés exactement ; les ajouts sont toujours examinés
+    def rechercher_ann(self, vecteur, k, n_sondes=None):
+        candidats = self.index_ann.candidats(vecteur, n_sondes)
+        scores = (self.tfidf_matrix[candidats] @ vecteur.T).toarray().ravel()
+        return self._meilleurs_candidats(vecteur, candidats, scores, k)
+
+    # Lignes de la base partageant au moins un terme avec un vecteur, et leur similarité :
+    # seules les listes inversées des termes du vecteur sont parcourues
+    def candidats_termes(self, vecteur):
+        debuts = self.colonnes.indptr[vecteur.indices]
+        fins = self.colonnes.indptr[vecteur.indices + 1]
+        if not len(debuts):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        lignes = np.concatenate([self.colonnes.indices[d:f] for d, f in zip(debuts, fins)])
+        poids = np.concatenate([self.colonnes.data[d:f] * p for d, f, p in zip(debuts, fins, vecteur.data)])
+        candidats, inverse = np.unique(lignes, return_inverse=True)
+        return candidats.astype(np.int64), np.bincount(inverse, weights=poids, minlength=len(candidats))
+
+    # Top k parmi des candidats de la base et les lignes ajoutées, lignes supprimées exclues
+    def _meilleurs_candidats(self, vecteur, candidats, scores, k):
+        if self.ajouts.shape[0]:
+            candidats = np.concatenate([candidats, len(self.ids) + np.arange(self.ajouts.shape[0])])
+            scores = np.concatenate([scores, (self.ajouts @ vecteur.T).toarray().ravel()])
+        if self.nb_supprimees:
+            scores[np.isin(candidats, self.supprimees)] = -1
+        if not len(candidats):
+            return candidats, scores
+        top, top_scores = top_k(scores[np.newaxis, :], k)
+        garder = top_scores[0] > -1
+        return candidats[top[0][garder]], top_scores[0][garder]
+
+    # Ajouter un livre : transformation avec le vocabulaire existant, O(1 document)
+    def ajouter(self, livre_id, description):
+        self.enregistrer({"operation": "ajouter", "livre_id": int(livre_id), "description": description})
+
+    # Modifier la description d'un livre : tombstone de l'ancienne ligne + ajout
+    def modifier(self, livre_id, description):
+        self.ajouter(livre_id, description)
+
+    # Supprimer un livre : la ligne est conservée mais marquée supprimée
+    def supprimer(self, livre_id):
+        self.enregistrer({"operation": "supprimer", "livre_id": int(livre_id)})
+
+    # Applique une opération et la met en attente d'écriture au journal
+    def enregistrer(self, operation):
+        self.appliquer_operation(operation)
+        self.en_attente = (*self.en_attente, operation)
+
+    # Applique une opération du journal (sans l'y écrire)
+    def appliquer_operation(self, operation):
+        if operation["operation"] == "ajouter":
+            self._ajouter(operation["livre_id"], operation["description"])
+        elif self.invalider(operation["livre_id"]):
+            self.nb_changements += 1
+
+    def _ajouter(self, livre_id, description):
+        self.invalider(livre_id)
+
+        texte = preprocess_text_func(description)
+        vecteur = self.vectorizer.transform([texte])
+        self.suivre_derive(texte)
+
+        # Voisins du nouveau livre parmi les lignes actives, puis insertion en retour dans leurs listes
+        ligne = self.nb_lignes
+        k = self.voisins[0].shape[1]
+        indices_voisins = np.zeros(k, dtype=np.int32)
+        scores_voisins = np.zeros(k, dtype=np.float32)
+        if k:
+            if self.index_ann is not None:
+                candidats = self.index_ann.candidats(vecteur)
+                scores = (self.tfidf_matrix[candidats] @ vecteur.T).toarray().ravel()
+            else:
+                candidats, scores = self.candidats_termes(vecteur)
+            lignes, scores = self._meilleurs_candidats(vecteur, candidats, scores, k)
+            garder = scores > 0
+            lignes, scores = lignes[garder], scores[garder]
+            indices_voisins[:len(lignes)] = lignes
+            scores_voisins[:len(lignes)] = scores
+            for voisin, score in zip(lignes.tolist(), scores.tolist()):
+                self.inserer_voisin(voisin, ligne, score)
+        self._modifier_voisins(ligne, (indices_voisins, scores_voisins))
+
+        self._ajouts_data = self._ajouts_data.ajouter(self.nnz_ajouts, vecteur.data)
+        self._ajouts_indices = self._ajouts_indices.ajouter(self.nnz_ajouts, vecteur.indices)
+        self.nnz_ajouts += vecteur.nnz
+        self._ajouts_indptr = self._ajouts_indptr.ajouter(self.nb_ajouts + 1, [self.nnz_ajouts])
+        self._ids_ajouts = self._ids_ajouts.ajouter(self.nb_ajouts, [livre_id])
+        self._empreintes_ajouts = self._empreintes_ajouts.ajouter(
+            self.nb_ajouts, empreintes_lignes([livre_id], [description])
+        )
+        self.nb_ajouts += 1
+        self._vues_ajouts()
+
+        self._positions_ajouts = self._positions_ajouts.ajouter(self.nb_positions_ajouts, int(livre_id), ligne)
+        self.nb_positions_ajouts += 1
+        self.nb_changements += 1
+
+    # Insère une ligne dans la liste des voisins d'une autre si son score dépasse le dernier gardé
+    def inserer_voisin(self, ligne, voisin, score):
+        indices, scores = self.voisins_ligne(ligne)
+        if score <= scores[-1]:
+            return
+        position = int(np.searchsorted(-scores, -score, side="right"))
+        self._modifier_voisins(ligne, (
+            np.insert(indices, position, voisin)[:-1].astype(np.int32),
+            np.insert(scores, position, score)[:-1].astype(np.float32),
+        ))
+
+    def _modifier_voisins(self, ligne, voisins):
+        self._voisins_modifies = self._voisins_modifies.ajouter(self.nb_voisins_modifies, ligne, voisins)
+        self.nb_voisins_modifies += 1
+
+    def invalider(self, livre_id):
+        ligne = self.ligne(livre_id)
+        if ligne is None:
+            return False
+        self._supprimees = self._supprimees.ajouter(self.nb_supprimees, ligne, True)
+        self.nb_supprimees += 1
+        if ligne >= len(self.ids):
+            self._positions_ajouts = self._positions_ajouts.ajouter(self.nb_positions_ajouts, int(livre_id), None)
+            self.nb_positions_ajouts += 1
+        return True
+
+    # Comptage des tokens hors vocabulaire des documents modifiés
+    def suivre_derive(self, texte):
+        tokens = self.vectorizer.build_analyzer()(texte)
+        self.nb_tokens += len(tokens)
+        self.nb_hors_vocabulaire += sum(1 for token in tokens if token not in self.vectorizer.vocabulary_)
+
+    def taux_hors_vocabulaire(self):
+        return self.nb_hors_vocabulaire / self.nb_tokens if self.nb_tokens else 0.0
+
+    # Vrai si la dérive depuis le dernier refit justifie un refit complet
+    def necessite_refit(self):
+        return (
+            self.nb_changements >= SEUIL_CHANGEMENTS
+            or self.taux_hors_vocabulaire() >= SEUIL_HORS_VOCABULAIRE
+        )
+
+    # Sauvegarde dans un nouveau dossier de tableaux .npy, puis bascule du pointeur `courant`
+    def sauvegarder(self):
+        dossier = os.path.join(MODELE_DIR, self.nom)
+        os.makedirs(dossier, exist_ok=True)
+
+        tableaux = {
+            "tfidf_data": self.tfidf_matrix.data,
+            "tfidf_indices": self.tfidf_matrix.indices,
+            "tfidf_indptr": self.tfidf_matrix.indptr,
+            "tfidf_colonnes_data": self.colonnes.data,
+            "tfidf_colonnes_indices": self.colonnes.indices,
+            "tfidf_colonnes_indptr": self.colonnes.indptr,
+            "voisins_indices": self.voisins[0],
+            "voisins_scores": self.voisins[1],
+            "ids": self.ids,
+            "ids_tries": self.ids_tries,
+            "ordre_ids": self.ordre_ids,
+            "empreintes": self.empreintes,
+            "vocabulaire": self.vectorizer.get_feature_names_out().astype(str),
+            "idf": self.vectorizer.idf_,
+        }
+        if self.index_ann is not None:
+            tableaux.update(self.index_ann.tableaux())
+        for nom_tableau, tableau in tableaux.items():
+            np.save(os.path.join(dossier, f"{nom_tableau}.npy"), np.ascontiguousarray(tableau))
+
+        parametres = {
+            "version_base": self.version_base,
+            "forme": list(self.tfidf_matrix.shape),
+            "duree_construction": self.duree_construction,
+            "vectorizer": {
+                cle: valeur for cle, valeur in self.vectorizer.get_params().items()
+                if cle != "vocabulary" and isinstance(valeur, (str, int, float, bool, tuple, type(None)))
+            },
+        }
+        with open(os.path.join(dossier, "parametres.json"), "w") as f:
+            json.dump(parametres, f)
+
+        # Les fichiers d'une version ne sont jamais réécrits : les workers qui les mappent restent cohérents
+        basculer_version(self.nom)
+        supprimer_anciennes_versions()
+
+    # Ecrit les opérations en attente à la fin du journal ; retourne la position où elles commencent
+    def sauvegarder_modifications(self):
+        debut, self.position_journal = ecrire_journal(self.version_base, self.en_attente)
+        self.en_attente = ()
+        return debut
+
+    # Applique les opérations écrites au journal depuis la dernière lecture (par n'importe quel worker)
+    def rattraper(self):
+        operations, self.position_journal = lire_journal(self.version_base, self.position_journal)
+        for operation in operations:
+            self.appliquer_operation(operation)
+        return len(operations)
+
+    # Chargement de la version courante : tableaux en mmap, partagés via le cache de pages
+    @classmethod
+    def charger(cls, nom=None):
+        dossier = os.path.join(MODELE_DIR, nom or version_courante())
+        with open(os.path.join(dossier, "parametres.json")) as f:
+            parametres = json.load(f)
+        tableaux = {
+            nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r")
+            for nom in TABLEAUX_MODELE
+        }
+        index_ann = None
+        if os.path.exists(os.path.join(dossier, "ann_ordre.npy")):
+            index_ann = IndexANN.depuis_tableaux({
+                nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r")
+                for nom in IndexANN.TABLEAUX
+            }, n_sondes=RECO_ANN_SONDES)
+
+        forme = tuple(parametres["forme"])
+        tfidf_matrix = sp.csr_matrix(
+            (tableaux["tfidf_data"], tableaux["tfidf_indices"], tableaux["tfidf_indptr"]),
+            shape=forme,
+            copy=False,
+        )
+        colonnes = sp.csc_matrix(
+            (tableaux["tfidf_colonnes_data"], tableaux["tfidf_colonnes_indices"], tableaux["tfidf_colonnes_indptr"]),
+            shape=forme,
+            copy=False,
+        )
+        modele = cls(
+            vectorizer_depuis_vocabulaire(parametres["vectorizer"], tableaux["vocabulaire"], tableaux["idf"]),
+            tfidf_matrix,
+            tableaux["ids"],
+            (tableaux["voisins_indices"], tableaux["voisins_scores"]),
+            version_base=parametres["version_base"],
+            ordre_ids=tableaux["ordre_ids"],
+            ids_tries=tableaux["ids_tries"],
+            index_ann=index_ann,
+            empreintes=tableaux["empreintes"],
+            colonnes=colonnes,
+            duree_construction=parametres.get("duree_construction", 0.0),
+        )
+
+        # Les modifications depuis le refit sont rejouées depuis le journal de la version
+        modele.rattraper()
+        return modele
+
+
+# Journal des modifications d'une version : une opération JSON par ligne, en ajout seul
+def chemin_journal(version_base):
+    return os.path.join(MODELE_DIR, f"modele-{version_base}", "modifications.jsonl")
+
+# Ajoute des opérations au journal en une seule écriture O_APPEND ; retourne les positions (début, fin)
+def ecrire_journal(version_base, operations):
+    donnees = "".join(json.dumps(operation) + "\n" for operation in operations).encode()
+    fd = os.open(chemin_journal(version_base), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if os.write(fd, donnees) != len(donnees):
+            raise OSError("écriture partielle du journal des modifications")
+        fin = os.lseek(fd, 0, os.SEEK_CUR)
+    finally:
+        os.close(fd)
+    return fin - len(donnees), fin
+
+# Opérations complètes du journal à partir d'une position, et position atteinte ;
+# une dernière ligne sans fin de ligne est en cours d'écriture et sera relue plus tard
+def lire_journal(version_base, position=0):
+    try:
+        with open(chemin_journal(version_base), "rb") as f:
+            f.seek(position)
+            donnees = f.read()
+    except FileNotFoundError:
+        return [], position
+    complet = donnees[:donnees.rfind(b"\n") + 1]
+    return [json.loads(ligne) for ligne in complet.splitlines()], position + len(complet)
+
+# Taille du journal d'une version (0 s'il n'existe pas encore)
+def taille_journal(version_base):
+    try:
+        return os.stat(chemin_journal(version_base)).st_size
+    except FileNotFoundError:
+        return 0
+
+
+# Reconstruit un TfidfVectorizer ajusté à partir de son vocabulaire et de ses idf, sans pickle
+def vectorizer_depuis_vocabulaire(parametres, vocabulaire, idf):
+    parametres = {cle: tuple(v) if isinstance(v, list) else v for cle, v in parametres.items()}
+    vectorizer = TfidfVectorizer(
+        **parametres,
+        vocabulary={terme: i for i, terme in enumerate(vocabulaire.tolist())},
+    )
+    vectorizer.idf_ = np.asarray(idf)
+    return vectorizer
+
+# Nom du dossier de la version servie (pointeur `courant`)
+def version_courante():
+    with open(os.path.join(MODELE_DIR, "courant")) as f:
+        return f.read().strip()
+
+# Bascule atomique du pointeur `courant` vers une version
+def basculer_version(nom):
+    chemin_tmp = os.path.join(MODELE_DIR, "courant.tmp")
+    with open(chemin_tmp, "w") as f:
+        f.write(nom)
+    os.replace(chemin_tmp, os.path.join(MODELE_DIR, "courant"))
+
+# Versions présentes dans le registre, de la plus récente à la plus ancienne
+def versions_disponibles():
+    if not os.path.isdir(MODELE_DIR):
+        return []
+    return sorted((nom for nom in os.listdir(MODELE_DIR) if nom.startswith("modele-")), reverse=True)
+
+# Supprime les dossiers de versions au-delà des VERSIONS_CONSERVEES plus récentes
+def supprimer_anciennes_versions():
+    dossiers = sorted(nom for nom in os.listdir(MODELE_DIR) if nom.startswith("modele-"))
+    for nom in dossiers[:-VERSIONS_CONSERVEES]:
+        shutil.rmtree(os.path.join(MODELE_DIR, nom), ignore_errors=True)
+
+
+# Empreinte (uint64) de chaque livre : hash de (id, description)
+def empreintes_lignes(ids, descriptions):
+    lignes = pd.DataFrame({
+        "id": np.asarray(ids, dtype=np.int64),
+        "description": pd.Series(list(descriptions), dtype=object).fillna("").astype(str).to_numpy(),
+    })
+    return pd.util.hash_pandas_object(lignes, index=False).to_numpy()
+
+# Nombre de livres + somme (modulo 2**64) des empreintes : indépendante de l'ordre des lignes,
+# elle se met à jour par ajout/retrait d'une ligne
+def format_empreinte(nb_livres, empreintes):
+    return f"{nb_livres}-{int(np.sum(empreintes, dtype=np.uint64)):016x}"
+
+# Empreinte du catalogue (table livres) : un modèle dont l'empreinte est identique est à jour
+def empreinte_catalogue(df):
+    ids = df['id'].to_numpy() if 'id' in df.columns else np.arange(len(df))
+    return format_empreinte(len(df), empreintes_lignes(ids, df['description']))
+
+
+# Entraînement du modèle TF-IDF et de la table des voisins (sans sauvegarde)
+def entrainer_modele(df, n_jobs=1, ann=RECO_MODE_ANN):
+    debut = time.perf_counter()
 
     # Extraire la colonne 'description' pour le traitement
     descriptions = df['description']
     
-    descriptions_clean=descriptions.apply(preprocess_text_func)
+    descriptions_clean = preprocess_texts(descriptions, n_jobs=n_jobs)
 
     # TF-IDF Vectorizer
     vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
     tfidf_matrix = vectorizer.fit_transform(descriptions_clean)
 
-    # Calcul de la matrice de similarité cosinus
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    # Table des plus proches voisins (creuse, au lieu de la matrice cosinus n x n)
+    voisins = construire_voisins(tfidf_matrix)
+
+    # Correspondance ligne -> Livre.id, et empreinte de chaque livre
+    ids = df['id'].to_numpy() if 'id' in df.columns else np.arange(len(df))
+    empreintes = empreintes_lignes(ids, descriptions)
+
+    # Index approché optionnel pour les gros catalogues
+    index_ann = IndexANN.construire(tfidf_matrix) if ann else None
 
-    # Sauvegarder le modèle vectorizer et la matrice de similarité
-    joblib.dump(vectorizer, r'C:\Users\lenovo\Documents\BookSmart_Sara\backend\recommender\tfidf_vectorizer.joblib')
-    joblib.dump(cosine_sim, r'C:\Users\lenovo\Documents\BookSmart_Sara\backend\recommender\cosine_similarity_matrix.joblib')
-    joblib.dump(tfidf_matrix, r'C:\Users\lenovo\Documents\BookSmart_Sara\backend\recommender\tfidf_matrix.joblib')
+    return ModeleRecommandation(
+        vectorizer, tfidf_matrix, ids, voisins, index_ann=index_ann, empreintes=empreintes,
+        duree_construction=time.perf_counter() - debut,
+    )
+
+# Fonction qui genère les modèles de recommendations
+def modele_recommandation(df):
+    modele = entrainer_modele(df)
 
+    # Sauvegarder le modèle vectorizer, la matrice TF-IDF, la table des voisins et les ids
+    modele.sauvegarder()
 
-    print("Modèle et matrice sauvegardés avec succès.")
+    print("Modèle et table des voisins sauvegardés avec succès.")
+    return modele
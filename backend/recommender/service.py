@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+
+from backend import database
+from backend.recommender.recommender import (
+    ModeleRecommandation, basculer_version, ecrire_journal, empreinte_catalogue, entrainer_modele, lire_journal,
+    taille_journal, version_courante, versions_disponibles,
+)
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) entre deux vérifications du registre (pointeur `courant`, taille du journal)
+INTERVALLE_VERIFICATION = 5
+
+
+@dataclass(frozen=True)
+class Instantane:
+    """Version publiée du modèle ; jamais modifiée une fois publiée."""
+    modele: ModeleRecommandation
+    version: str
+    duree_construction: float  # durée (s) du dernier refit complet ayant produit la base
+    date_publication: datetime
+
+
+class ServiceRecommandation:
+    """Détient le modèle de recommandation servi par les routes.
+
+    Les lectures se contentent de lire l'attribut `_instantane` (affectation atomique),
+    sans verrou. Les écritures (mises à jour incrémentales, refits) construisent un
+    nouveau modèle puis publient un nouvel instantané sous un verrou d'écriture. Les
+    refits complets tournent dans un thread dédié pour ne pas bloquer les requêtes.
+
+    Les workers partagent le registre : chaque opération est ajoutée au journal de la
+    version courante, et chaque worker rejoue périodiquement la fin du journal (ou
+    charge la nouvelle version après un refit). Toutes les opérations sont ainsi
+    appliquées dans l'ordre du journal, quel que soit le worker qui les a reçues.
+    """
+
+    def __init__(self, charger_catalogue, intervalle_verification=INTERVALLE_VERIFICATION):
+        self._charger_catalogue = charger_catalogue
+        self._intervalle_verification = intervalle_verification
+        self._instantane = None
+        self._verrou = threading.Lock()
+        self._executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reconstruction-modele")
+        # Vérifications du registre à part : un refit long ne les retarde pas
+        self._executeur_verification = ThreadPoolExecutor(max_workers=1, thread_name_prefix="verification-modele")
+        self._reconstruction = None
+        self._reconstruction_demandee = False
+        self._prochaine_verification = 0.0
+
+    # Instantané courant (chargé depuis le disque au premier appel)
+    def instantane(self):
+        instantane = self._instantane
+        if instantane is None:
+            with self._verrou:
+                if self._instantane is None:
+                    self._publier(self._charger_ou_construire())
+            instantane = self._instantane
+        elif time.monotonic() >= self._prochaine_verification:
+            self._prochaine_verification = time.monotonic() + self._intervalle_verification
+            self._executeur_verification.submit(self._recharger_si_modifie)
+        return instantane
+
+    def modele(self):
+        return self.instantane().modele
+
+    # Mise à jour incrémentale : copie du modèle courant, application, ajout au journal, publication
+    def appliquer(self, operation):
+        self.instantane()
+        with self._verrou:
+            modele = self._ecrire(self._instantane.modele, operation)
+            self._publier(modele)
+        # Pendant un refit, l'opération est rejouée sur le nouveau modèle : pas de refit supplémentaire
+        if modele.necessite_refit() and not self.reconstruction_en_cours():
+            self.reconstruire()
+        return modele
+
+    # Lance un refit complet en arrière-plan ; retourne immédiatement
+    def reconstruire(self):
+        with self._verrou:
+            if self._reconstruction is not None and not self._reconstruction.done():
+                # Demande explicite (ex. import en masse, hors journal) : un nouveau refit suivra
+                self._reconstruction_demandee = True
+                return self._reconstruction
+            self._reconstruction = self._executeur.submit(self._reconstruire)
+            return self._reconstruction
+
+    def reconstruction_en_cours(self):
+        return self._reconstruction is not None and not self._reconstruction.done()
+
+    def etat(self):
+        instantane = self.instantane()
+        return {
+            "version": instantane.version,
+            "empreinte": instantane.modele.empreinte,
+            "duree_construction": instantane.duree_construction,
+            "date_publication": instantane.date_publication.isoformat(),
+            "nb_livres": instantane.modele.nb_lignes - len(instantane.modele.supprimees),
+            "nb_changements": instantane.modele.nb_changements,
+            "reconstruction_en_cours": self.reconstruction_en_cours(),
+        }
+
+    # Refit sur le catalogue lu en base ; les opérations écrites au journal de l'ancienne version
+    # depuis le début du refit (lecture du catalogue comprise) sont rejouées avant publication
+    def _reconstruire(self):
+        ancien = self.instantane().modele
+        position = taille_journal(ancien.version_base)
+        modele = entrainer_modele(self._charger_catalogue())
+
+        with self._verrou:
+            # Le pointeur bascule avant la relecture du journal : un autre worker qui écrit ensuite
+            # dans l'ancien journal voit la nouvelle version et y reporte son opération
+            modele.sauvegarder()
+            operations, _ = lire_journal(ancien.version_base, position)
+            if operations:
+                ecrire_journal(modele.version_base, operations)
+                modele.rattraper()
+            self._publier(modele)
+            relancer = self._reconstruction_demandee or modele.necessite_refit()
+            self._reconstruction_demandee = False
+
+        logger.info(
+            "Modèle de recommandation reconstruit en %.2fs (version %s, %d opération(s) rejouée(s)).",
+            modele.duree_construction, modele.version, len(operations),
+        )
+        if relancer:
+            self._reconstruction = self._executeur.submit(self._reconstruire)
+        return modele
+
+    # Premier chargement : version la plus récente du registre dont l'empreinte correspond
+    # au catalogue ; à défaut, un refit est fait une fois (bloquant)
+    def _charger_ou_construire(self):
+        catalogue = self._charger_catalogue()
+        empreinte = empreinte_catalogue(catalogue)
+        for nom in versions_disponibles():
+            try:
+                modele = ModeleRecommandation.charger(nom)
+            except (FileNotFoundError, KeyError, ValueError):
+                continue  # version incomplète ou d'un format antérieur
+            if modele.empreinte == empreinte:
+                basculer_version(nom)
+                logger.info("Modèle de recommandation %s chargé (catalogue inchangé, pas de refit).", nom)
+                return modele
+
+        modele = entrainer_modele(catalogue)
+        modele.sauvegarder()
+        logger.info("Aucune version compatible avec le catalogue : modèle reconstruit en %.2fs.", modele.duree_construction)
+        return modele
+
+    # Applique une opération et l'ajoute au journal ; retourne le modèle à publier
+    def _ecrire(self, courant, operation):
+        while True:
+            modele = courant.copie()
+            operation(modele)
+            if modele.sauvegarder_modifications() != courant.position_journal:
+                # D'autres workers ont écrit au journal entre-temps : il est rejoué depuis la position
+                # connue (notre opération comprise) pour que tous appliquent le même ordre
+                modele = courant.copie()
+                modele.rattraper()
+            if version_courante() == modele.nom:
+                return modele
+            # Un autre worker a publié un refit : l'opération est reportée sur la nouvelle version
+            # (la rejouer deux fois est sans effet, ajouter et supprimer étant idempotents)
+            courant = ModeleRecommandation.charger()
+
+    # Recharge le modèle si un autre worker a publié un refit ou écrit au journal
+    def _recharger_si_modifie(self):
+        courant = self._instantane.modele
+        if version_courante() == courant.nom and taille_journal(courant.version_base) == courant.position_journal:
+            return
+        with self._verrou:
+            courant = self._instantane.modele
+            if version_courante() == courant.nom:
+                # Même base : seule la fin du journal est rejouée
+                modele = courant.copie()
+                if not modele.rattraper():
+                    return
+            else:
+                modele = ModeleRecommandation.charger()
+            self._publier(modele)
+
+    def _publier(self, modele):
+        self._instantane = Instantane(
+            modele=modele,
+            version=modele.version,
+            duree_construction=modele.duree_construction,
+            date_publication=datetime.now(),
+        )
+
+
+# Service partagé par les routes de recommandation et d'administration
+service = ServiceRecommandation(lambda: pd.read_sql_table('livres', con=database.engine))
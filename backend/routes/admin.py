@@ -1,12 +1,17 @@
-import pandas as pd
-from fastapi import APIRouter, Request, Depends, Form, Query
+from fastapi import APIRouter, Request, Depends, File, Form, Query, UploadFile
 from sqlalchemy.orm import Session
-from backend import crud, database, models,schemas
+from fastapi.responses import JSONResponse, RedirectResponse
+from backend import crud, database, emprunts, import_livres, models,schemas
 from backend.config import templates
 from pydantic import ValidationError
-from typing import Optional
-from datetime import date, timedelta
-from backend.recommender.recommender import modele_recommandation
+from typing import List, Optional
+from datetime import date
+from urllib.parse import urlencode
+from backend.recommender.service import service
+from backend.recommender.collaboratif import notifier_emprunt
+from backend.pagination import TAILLE_PAGE, TAILLE_PAGE_MAX, invalider_comptages
+from backend.autocompletion import index_titres
+from backend.cache import cache_catalogue
 
 
 
@@ -16,38 +21,66 @@ router = APIRouter(
     dependencies=[Depends(crud.admin_required)]
 )
 
-# Liste des adhérents
+# Messages affichés après une action sur un adhérent (l'action redirige vers la liste avec le code du message)
+MESSAGES_ADHERENTS = {
+    "adherent_ajoute": "Adhérent ajouté avec succès !",
+    "adherent_modifie": "Adhérent modifié avec succès !",
+    "adherent_suspendu": "Adhérent suspendu avec succès !",
+}
+ERREURS_ADHERENTS = {
+    "adherent_introuvable": "Adhérent non trouvé",
+    "email_existant": "Un adhérent avec cet email existe déjà.",
+}
+
+# Contextes des pages d'administration : une page de la liste (la première par défaut) et les messages
+def contexte_adherents(request, db, recherche="", apres=None, taille=TAILLE_PAGE, **messages):
+    page = crud.get_adherents(db, recherche, apres, taille)
+    return {"request": request, "adherents": page.elements, "page": page, "recherche": recherche,
+            "parametres_liste": urlencode({"recherche": recherche}) if recherche else "",
+            "chemin_liste": "/admin/gestion-adherents", **messages}
+
+def contexte_livres(request, db, search="", apres=None, taille=TAILLE_PAGE, **messages):
+    page = crud.get_livres(db, search, apres, taille)
+    return {"request": request, "livres": page.elements, "page": page,
+            "chemin_liste": "/admin/gestion-livres", "search": search, **messages}
+
+
+
+# Liste des adhérents, recherche par préfixe du nom ou de l'email
 @router.get("/gestion-adherents")
-async def gestion_adherents(request: Request, db: Session = Depends(database.get_db)):
-    adherents = db.query(models.Adherent).all()
-    return templates.TemplateResponse("admin/gestion-adherents.html", {"request": request, "adherents": adherents})
+async def gestion_adherents(
+    request: Request,
+    recherche: str = "",
+    apres: Optional[int] = None,
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    message: Optional[str] = None,
+    erreur: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    return templates.TemplateResponse(
+        "admin/gestion-adherents.html",
+        contexte_adherents(
+            request, db, recherche, apres, taille,
+            success=MESSAGES_ADHERENTS.get(message), error=ERREURS_ADHERENTS.get(erreur),
+        )
+    )
+
+# Après une action, retour à la liste (Post/Redirect/Get) avec la recherche en cours et le code du message
+def retour_page_adherents(recherche="", erreur=None, message=None):
+    parametres = {"recherche": recherche} if recherche else {}
+    parametres.update({"erreur": erreur} if erreur else {"message": message})
+    return RedirectResponse(url=f"/admin/gestion-adherents?{urlencode(parametres)}", status_code=303)
 
 
 # Suspendre un adhérent
 @router.post("/delete/{adherent_id}")
-async def suspendre_adherent(request:Request,adherent_id: int, db: Session = Depends(database.get_db)):
-    adherents = db.query(models.Adherent).all()
-    adherent = db.query(models.Adherent).filter(models.Adherent.id == adherent_id).first()
+async def suspendre_adherent(adherent_id: int, recherche: str = Form(""), db: Session = Depends(database.get_db)):
+    adherent = db.get(models.Adherent, adherent_id)
     if not adherent:
-        return templates.TemplateResponse(
-            "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "error": "Adhérent non trouvé"
-            }
-        )
+        return retour_page_adherents(recherche, "adherent_introuvable")
     db.delete(adherent)
     db.commit()
-    adherents = db.query(models.Adherent).all()
-    return templates.TemplateResponse(
-        "admin/gestion-adherents.html",
-        {
-            "request": request,
-            "adherents": adherents,
-            "success": "Adhérent suspendu avec succès !"
-        }
-    )
+    return retour_page_adherents(recherche, message="adherent_suspendu")
 
 # Modifier un adhérent (exemple : changer le nom ou l'email)
 @router.post("/modify/{adherent_id}")
@@ -56,46 +89,25 @@ async def modifier_adherent(
     adherent_id: int,
     nom: str = Form(...),
     email: str = Form(...),
+    recherche: str = Form(""),
     db: Session = Depends(database.get_db)
 ):
-    adherents = db.query(models.Adherent).all()
-    adherent = db.query(models.Adherent).filter(models.Adherent.id == adherent_id).first()
+    adherent = db.get(models.Adherent, adherent_id)
     if not adherent:
-        return templates.TemplateResponse(
-            "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "error": "Adhérent non trouvé"
-            }
-        )
-    
+        return retour_page_adherents(recherche, "adherent_introuvable")
+
     try:
         # Validation Pydantic
         adherent_data = schemas.AdherentBase(nom=nom, email=email)
-        adherent.nom = adherent_data.nom
-        adherent.email = adherent_data.email
-        db.commit()
-        # Recharger la liste après modification
-        adherents = db.query(models.Adherent).all()
-        return templates.TemplateResponse(
-            "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "success": "Adhérent modifié avec succès !"
-            }
-        )
     except ValidationError as e:
-        errors = e.errors()
         return templates.TemplateResponse(
             "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "errors": errors
-            }
+            contexte_adherents(request, db, recherche, errors=e.errors())
         )
+    adherent.nom = adherent_data.nom
+    adherent.email = adherent_data.email
+    db.commit()
+    return retour_page_adherents(recherche, message="adherent_modifie")
 
 # Ajouter un adhérent
 @router.post("/adherents/add")
@@ -106,64 +118,34 @@ async def ajouter_adherent(
     password: str = Form(...),
     db: Session = Depends(database.get_db)
 ):
-    adherents = db.query(models.Adherent).all()
-
     # 1) Vérifier unicité de l'email
-    existing = crud.get_adherent_by_email(db, email)
-    if existing:
-        return templates.TemplateResponse(
-            "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "error": "Un adhérent avec cet email existe déjà."
-            }
-        )
+    if crud.get_adherent_by_email(db, email):
+        return retour_page_adherents(erreur="email_existant")
 
     try:
         #  Validation Pydantic pour nom/email
         data = schemas.AdherentBase(nom=nom, email=email)
-
-        #  Hash du mot de passe
-        hashed_password = crud.hash_password(password)
-
-        #  Création et insertion
-        nouvel_adherent = models.Adherent(
-            nom=data.nom,
-            email=data.email,
-            password=hashed_password,
-        )
-        db.add(nouvel_adherent)
-        db.commit()
-        db.refresh(nouvel_adherent)
-
-        # Recharger la liste
-        adherents = db.query(models.Adherent).all()
-        return templates.TemplateResponse(
-            "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "success": "Adhérent ajouté avec succès !"
-            }
-        )
-
     except ValidationError as e:
         return templates.TemplateResponse(
             "admin/gestion-adherents.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "errors": e.errors()
-            }
+            contexte_adherents(request, db, errors=e.errors())
         )
 
+    #  Création et insertion (mot de passe hashé)
+    db.add(models.Adherent(nom=data.nom, email=data.email, password=crud.hash_password(password)))
+    db.commit()
+
+    # Le nouvel adhérent est retrouvé par la recherche sur son email
+    return retour_page_adherents(data.email, message="adherent_ajoute")
+
 @router.get("/gestion-livres")
 async def gestion_livres(
     request: Request,
     db: Session = Depends(database.get_db),
     search: str = "",
-    id_livre: str = Query("")  # <- récupérer comme string
+    id_livre: str = Query(""),  # <- récupérer comme string
+    apres: Optional[int] = None,
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX)
 ):
     try:
         id_livre_int: Optional[int] = int(id_livre) if id_livre.strip() else None
@@ -172,19 +154,18 @@ async def gestion_livres(
 
     if id_livre_int is not None:
         livres = db.query(models.Livre).filter(models.Livre.id == id_livre_int).all()
+        contexte = {"request": request, "livres": livres, "search": search}
     else:
-        livres = crud.get_livres(db, search)
+        contexte = contexte_livres(request, db, search, apres, taille)
 
     error = None
-    if not livres:
+    if not contexte["livres"]:
         error = "Aucun livre trouvé pour votre recherche."
 
     return templates.TemplateResponse(
         "admin/gestion-livres.html",
         {
-            "request": request,
-            "livres": livres,
-            "search": search,
+            **contexte,
             "id_livre": id_livre,
             "error": error
         }
@@ -211,16 +192,9 @@ async def ajouter_livre(
             stock=stock
         )
     except ValidationError as e:
-        livres = crud.get_livres(db, "")
         return templates.TemplateResponse(
             "admin/gestion-livres.html",
-            {
-                "request": request,
-                "livres": livres,
-                "error": "Erreur de validation des données.",
-                "errors": e.errors(),
-                "success": None
-            }
+            contexte_livres(request, db, error="Erreur de validation des données.", errors=e.errors(), success=None)
         )
 
     # Création du livre après validation
@@ -228,21 +202,37 @@ async def ajouter_livre(
     db.add(livre)
     db.commit()
 
-    # Recalculer le modèle après modification
-    livres_df = pd.read_sql_table('livres', con=database.engine)
-    modele_recommandation(livres_df)
+    # Ajouter le livre au modèle sans refit complet (refit en arrière-plan si dérive)
+    service.appliquer(lambda modele: modele.ajouter(livre.id, livre.description))
+    index_titres.ajouter(livre.id, livre.titre)
+    cache_catalogue.invalider_livres(livre.id)
 
-    livres = crud.get_livres(db, "")
     return templates.TemplateResponse(
         "admin/gestion-livres.html",
-        {
-            "request": request,
-            "livres": livres,
-            "success": "Livre ajouté avec succès !",
-            "error": None
-        }
+        contexte_livres(request, db, success="Livre ajouté avec succès !", error=None)
     )
 
+# Import en masse (CSV, JSON Lines ou JSON) : un seul refit du modèle à la fin, rapport en JSON
+@router.post("/livres/import")
+def importer_livres(
+    fichier: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    taille_lot: int = Form(import_livres.TAILLE_LOT_IMPORT, ge=1),
+    db: Session = Depends(database.get_db)
+):
+    format = format or import_livres.format_du_fichier(fichier.filename)
+    if format not in import_livres.FORMATS:
+        return JSONResponse({"detail": f"Format inconnu : {format}"}, status_code=422)
+    rapport = import_livres.importer(database.engine, import_livres.lire_lots(fichier.file, format, taille_lot))
+
+    if rapport["livres_inseres"] or rapport["livres_mis_a_jour"]:
+        invalider_comptages("livres")
+        cache_catalogue.vider()
+        index_titres.construire_depuis_base(db)
+        service.reconstruire()
+        rapport["reconstruction_modele"] = "en cours"
+    return JSONResponse(rapport)
+
 @router.post("/livres/modify/{livre_id}")
 async def modifier_livre(
     request: Request,
@@ -255,11 +245,10 @@ async def modifier_livre(
     db: Session = Depends(database.get_db)
 ):
     livre = crud.get_livre(db, livre_id)
-    livres = crud.get_livres(db)
     if not livre:
         return templates.TemplateResponse(
             "admin/gestion-livres.html",
-            {"request": request, "livres": livres, "error": "Livre non trouvé"}
+            contexte_livres(request, db, error="Livre non trouvé")
         )
 
     if titre is not None:
@@ -275,289 +264,147 @@ async def modifier_livre(
 
     db.commit()
 
-    # Recalculer le modèle après modification
-    livres_df = pd.read_sql_table('livres', con=database.engine)
-    modele_recommandation(livres_df)
+    # Remplacer la ligne du livre dans le modèle si sa description a changé
+    if description is not None:
+        service.appliquer(lambda modele: modele.modifier(livre.id, livre.description))
+    if titre is not None:
+        index_titres.ajouter(livre.id, livre.titre)
+    cache_catalogue.invalider_livres(livre.id)
 
     # Renvoie le template avec un message de succès
     return templates.TemplateResponse(
         "admin/gestion-livres.html",
-        {"request": request, "livres": livres, "success": "Livre modifié avec succès !"}
+        contexte_livres(request, db, success="Livre modifié avec succès !")
     )
 
 @router.get("/livres/delete/{livre_id}")
 async def supprimer_livre(request: Request, livre_id: int, db: Session = Depends(database.get_db)):
-    livres = crud.get_livres(db)  # récupère la liste pour l'affichage
     livre = crud.get_livre(db, livre_id)
-    
+
     if not livre:
         return templates.TemplateResponse(
             "admin/gestion-livres.html",
-            {"request": request, "livres": livres, "error": "Livre non trouvé"}
+            contexte_livres(request, db, error="Livre non trouvé")
         )
 
     db.delete(livre)
     db.commit()
 
-    # Recalculer le modèle après modification
-    livres_df = pd.read_sql_table('livres', con=database.engine)
-    modele_recommandation(livres_df)
+    # Retirer le livre du modèle (tombstone)
+    service.appliquer(lambda modele: modele.supprimer(livre_id))
+    index_titres.retirer(livre_id)
+    cache_catalogue.invalider_livres(livre_id)
 
     return templates.TemplateResponse(
         "admin/gestion-livres.html",
-        {"request": request, "livres": crud.get_livres(db), "success": "Livre supprimé avec succès !"}
+        contexte_livres(request, db, success="Livre supprimé avec succès !")
     )
 
-# Page de gestion : emprunts + réservations
+# Page de gestion : emprunts (filtrés par statut) + réservations en attente, une page de chaque liste
 @router.get("/emprunts")
-async def page_emprunts(request: Request, db: Session = Depends(database.get_db)):
-    adherents = db.query(models.Adherent).all()
-    livres = db.query(models.Livre).all()
-    emprunts = db.query(models.Emprunt).all()
-    reservations = db.query(models.Reservation).all()
+async def page_emprunts(
+    request: Request,
+    statut: str = Query("en_cours", pattern="^(" + "|".join(emprunts.STATUTS) + ")$"),
+    id_adherent: Optional[int] = None,
+    id_livre: Optional[int] = None,
+    apres: Optional[int] = None,
+    apres_reservation: Optional[int] = None,
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    message: str = "",
+    erreur: str = "",
+    db: Session = Depends(database.get_db)
+):
+    compteurs = emprunts.compteurs(db, id_adherent, id_livre)
+    page = emprunts.page_emprunts(db, statut, id_adherent, id_livre, apres, taille)
+    page.total = compteurs[statut]
+    page_reservations = emprunts.page_reservations(db, id_adherent, id_livre, apres_reservation, taille)
+    filtres = {"statut": statut, "id_adherent": id_adherent, "id_livre": id_livre}
     return templates.TemplateResponse(
         "admin/emprunts.html",
         {
             "request": request,
-            "adherents": adherents,
-            "livres": livres,
-            "emprunts": emprunts,
-            "reservations": reservations,
+            "emprunts": page.elements, "page": page,
+            "reservations": page_reservations.elements, "page_reservations": page_reservations,
+            "compteurs": compteurs,
+            "statuts": emprunts.STATUTS, "statut": statut, "id_adherent": id_adherent, "id_livre": id_livre,
+            "aujourd_hui": date.today(), "chemin_liste": "/admin/emprunts",
+            "parametres_liste": urlencode({cle: valeur for cle, valeur in filtres.items() if valeur is not None}),
+            "success": emprunts.MESSAGES.get(message), "error": emprunts.ERREURS.get(erreur),
         }
     )
 
+# Après une action, retour à la page des emprunts (Post/Redirect/Get) avec le code du message
+def retour_page_emprunts(erreur=None, message=None):
+    parametres = {"erreur": erreur} if erreur else {"message": message}
+    return RedirectResponse(url=f"/admin/emprunts?{urlencode(parametres)}", status_code=303)
+
 # Route pour enregistrer un emprunt
 @router.post("/emprunts")
 async def enregistrer_emprunt(
-    request: Request,
     id_adherent: int = Form(...),
     id_livre: int = Form(...),
     db: Session = Depends(database.get_db)
 ):
-    adherents = db.query(models.Adherent).all()
-    livres = db.query(models.Livre).all()
-    emprunts = db.query(models.Emprunt).all()
-    reservations = db.query(models.Reservation).all()
-
-    livre = db.query(models.Livre).filter_by(id=id_livre).first()
-    if not livre or livre.stock <= 0:
-        return templates.TemplateResponse(
-            "admin/emprunts.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "livres": livres,
-                "emprunts": emprunts,
-                "reservations": reservations,
-                "error": "Livre indisponible"
-            }
-        )
-    
-    
-    # Vérifier si l’adhérent a déjà emprunté ce livre et ne l’a pas encore rendu
-    emprunt_existant = (
-        db.query(models.Emprunt)
-        .filter(
-            models.Emprunt.id_adherent == id_adherent,
-            models.Emprunt.id_livre == id_livre,
-            models.Emprunt.date_retour_effectif.is_(None)  # pas encore rendu
-        )
-        .first()
-    )
-    if emprunt_existant:
-        return templates.TemplateResponse(
-            "admin/emprunts.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "livres": livres,
-                "emprunts": emprunts,
-                "reservations": reservations,
-                "error": "Cet adhérent a déjà emprunté ce livre et ne l’a pas encore rendu"
-            }
-        )
-
-    emprunt = models.Emprunt(
-        id_adherent=id_adherent,
-        id_livre=id_livre,
-        date_emprunt=date.today(),
-        date_retour_prevue=date.today() + timedelta(days=14),
-    )
-    db.add(emprunt)
-    livre.stock -= 1
-    db.commit()
-
-    # Recharger les listes après ajout
-    emprunts = db.query(models.Emprunt).all()
-    livres = db.query(models.Livre).all()
+    emprunt, erreur = emprunts.creer_emprunt(db, id_adherent, id_livre)
+    if erreur:
+        return retour_page_emprunts(erreur)
 
-    return templates.TemplateResponse(
-        "admin/emprunts.html",
-        {
-            "request": request,
-            "adherents": adherents,
-            "livres": livres,
-            "emprunts": emprunts,
-            "reservations": reservations,
-            "success": "Emprunt enregistré avec succès !"
-        }
-    )
+    # Mise à jour incrémentale des co-emprunts
+    notifier_emprunt(id_adherent, id_livre)
+    cache_catalogue.invalider_livres(id_livre)
+    return retour_page_emprunts(message="emprunt_enregistre")
 
 # Route pour enregistrer un retour
 @router.post("/retours")
-async def enregistrer_retour(
-    request: Request,
-    emprunt_id: int = Form(...),
-    db: Session = Depends(database.get_db)
-):
-    adherents = db.query(models.Adherent).all()
-    livres = db.query(models.Livre).all()
-    emprunts = db.query(models.Emprunt).all()
-    reservations = db.query(models.Reservation).all()
-
-    from datetime import date
-    e = db.query(models.Emprunt).filter_by(id=emprunt_id).first()
-    if not e or e.date_retour_effectif:
-        return templates.TemplateResponse(
-            "admin/emprunts.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "livres": livres,
-                "emprunts": emprunts,
-                "reservations": reservations,
-                "error": "Emprunt introuvable ou déjà retourné"
-            }
-        )
-
-    e.date_retour_effectif = date.today()
-    livre = db.query(models.Livre).filter_by(id=e.id_livre).first()
-    livre.stock += 1
-    db.commit()
-
-    # Recharger les listes après action
-    emprunts = db.query(models.Emprunt).all()
-    livres = db.query(models.Livre).all()
-
-    return templates.TemplateResponse(
-        "admin/emprunts.html",
-        {
-            "request": request,
-            "adherents": adherents,
-            "livres": livres,
-            "emprunts": emprunts,
-            "reservations": reservations,
-            "success": "Retour enregistré avec succès !"
-        }
-    )
+async def enregistrer_retour(emprunt_id: int = Form(...), db: Session = Depends(database.get_db)):
+    emprunt, erreur = emprunts.enregistrer_retour(db, emprunt_id)
+    if erreur:
+        return retour_page_emprunts(erreur)
+    cache_catalogue.invalider_livres(emprunt.id_livre)
+    return retour_page_emprunts(message="retour_enregistre")
 
 # Route pour confirmer une réservation
 @router.post("/reservations/{reservation_id}/confirmer")
-async def confirmer_reservation(request: Request, reservation_id: int, db: Session = Depends(database.get_db)):
-    adherents = db.query(models.Adherent).all()
-    livres = db.query(models.Livre).all()
-    emprunts = db.query(models.Emprunt).all()
-    reservations = db.query(models.Reservation).all()
-
-    reservation = db.query(models.Reservation).filter_by(id=reservation_id).first()
-    if not reservation:
-        return templates.TemplateResponse(
-            "admin/emprunts.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "livres": livres,
-                "emprunts": emprunts,
-                "reservations": reservations,
-                "error": "Réservation introuvable"
-            }
-        )
-
-    livre = db.query(models.Livre).filter_by(id=reservation.id_livre).first()
-    if not livre or livre.stock <= 0:
-        return templates.TemplateResponse(
-            "admin/emprunts.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "livres": livres,
-                "emprunts": emprunts,
-                "reservations": reservations,
-                "error": "Livre indisponible"
-            }
-        )
-
-    # créer emprunt
-    emprunt = models.Emprunt(
-        id_adherent=reservation.id_adherent,
-        id_livre=reservation.id_livre,
-        date_emprunt=date.today(),
-        date_retour_prevue=date.today() + timedelta(days=14),
-    )
-    db.add(emprunt)
-
-    # mettre à jour le stock
-    livre.stock -= 1
+async def confirmer_reservation(reservation_id: int, db: Session = Depends(database.get_db)):
+    emprunt, erreur = emprunts.confirmer_reservation(db, reservation_id)
+    if erreur:
+        return retour_page_emprunts(erreur)
 
-    # supprimer la réservation
-    db.delete(reservation)
-
-    db.commit()
-
-    # recharger les listes après action
-    emprunts = db.query(models.Emprunt).all()
-    livres = db.query(models.Livre).all()
-    reservations = db.query(models.Reservation).all()
-
-    return templates.TemplateResponse(
-        "admin/emprunts.html",
-        {
-            "request": request,
-            "adherents": adherents,
-            "livres": livres,
-            "emprunts": emprunts,
-            "reservations": reservations,
-            "success": "Réservation confirmée et transformée en emprunt !"
-        }
-    )
+    # Mise à jour incrémentale des co-emprunts
+    notifier_emprunt(emprunt.id_adherent, emprunt.id_livre)
+    cache_catalogue.invalider_livres(emprunt.id_livre)
+    return retour_page_emprunts(message="reservation_confirmee")
 
 # Route pour supprimer une reservation
 @router.post("/reservations/{reservation_id}/supprimer")
-async def supprimer_reservation(request: Request, reservation_id: int, db: Session = Depends(database.get_db)):
-    adherents = db.query(models.Adherent).all()
-    livres = db.query(models.Livre).all()
-    emprunts = db.query(models.Emprunt).all()
-    reservations = db.query(models.Reservation).all()
-
-    reservation = db.query(models.Reservation).filter_by(id=reservation_id).first()
-    if not reservation:
-        return templates.TemplateResponse(
-            "admin/emprunts.html",
-            {
-                "request": request,
-                "adherents": adherents,
-                "livres": livres,
-                "emprunts": emprunts,
-                "reservations": reservations,
-                "error": "Réservation introuvable"
-            }
-        )
-
-    db.delete(reservation)
-    db.commit()
-
-    # recharger les listes après suppression
-    emprunts = db.query(models.Emprunt).all()
-    reservations = db.query(models.Reservation).all()
-
-    return templates.TemplateResponse(
-        "admin/emprunts.html",
-        {
-            "request": request,
-            "adherents": adherents,
-            "livres": livres,
-            "emprunts": emprunts,
-            "reservations": reservations,
-            "success": "Réservation supprimée avec succès !"
-        }
-    )
+async def supprimer_reservation(reservation_id: int, db: Session = Depends(database.get_db)):
+    _, erreur = emprunts.supprimer_reservation(db, reservation_id)
+    return retour_page_emprunts(erreur, "reservation_supprimee")
+
+
+# Banque de prêt : emprunts par lot (paires adhérent/livre), une transaction pour tout le lot
+@router.post("/emprunts/lot", response_model=List[schemas.ResultatLotOut])
+async def enregistrer_emprunts_lot(demande: schemas.EmpruntsLotIn, db: Session = Depends(database.get_db)):
+    resultats = emprunts.creer_emprunts_lot(db, [(paire.id_adherent, paire.id_livre) for paire in demande.emprunts])
+    livres_modifies = set()
+    for resultat in resultats:
+        resultat["erreur"] = emprunts.ERREURS.get(resultat["statut"])
+        if resultat["emprunt_id"] is not None:
+            notifier_emprunt(resultat["id_adherent"], resultat["id_livre"])
+            livres_modifies.add(resultat["id_livre"])
+    if livres_modifies:
+        cache_catalogue.invalider_livres(*livres_modifies)
+    return resultats
+
+# Banque de prêt : retours par lot (ids d'emprunts)
+@router.post("/retours/lot", response_model=List[schemas.ResultatLotOut])
+async def enregistrer_retours_lot(demande: schemas.RetoursLotIn, db: Session = Depends(database.get_db)):
+    resultats = emprunts.enregistrer_retours_lot(db, demande.emprunt_ids)
+    livres_modifies = set()
+    for resultat in resultats:
+        resultat["erreur"] = emprunts.ERREURS.get(resultat["statut"])
+        if resultat["statut"] == "retourne":
+            livres_modifies.add(resultat["id_livre"])
+    if livres_modifies:
+        cache_catalogue.invalider_livres(*livres_modifies)
+    return resultats
@@ -0,0 +1,113 @@
+import hashlib
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend import crud, database, models, schemas
+from backend.facettes import Filtres
+from backend.pagination import TAILLE_PAGE, TAILLE_PAGE_MAX, paginer
+from backend.routes.livres import filtres_catalogue
+
+# Nombre de lignes lues à la fois par l'export en flux
+TAILLE_LOT_EXPORT = 1000
+
+# Champs JSON d'un livre (contrat de l'API v1)
+CHAMPS_LIVRE = tuple(schemas.LivreV1.model_fields)
+
+router = APIRouter(prefix="/api/v1", tags=["api v1"], default_response_class=ORJSONResponse)
+
+
+def livre_json(livre):
+    return {champ: getattr(livre, champ) for champ in CHAMPS_LIVRE}
+
+
+# ETag faible calculé à partir des (id, version) ou d'un agrégat ; les clients le renvoient dans If-None-Match
+def etag(*valeurs):
+    return f'W/"{hashlib.blake2b(repr(valeurs).encode(), digest_size=12).hexdigest()}"'
+
+def non_modifie(request: Request, valeur_etag: str):
+    demandes = request.headers.get("if-none-match")
+    if not demandes:
+        return False
+    return demandes.strip() == "*" or valeur_etag in {demande.strip() for demande in demandes.split(",")}
+
+def entetes_cache(valeur_etag: str):
+    # Le client garde la réponse mais la revalide à chaque fois (304 si rien n'a changé)
+    return {"ETag": valeur_etag, "Cache-Control": "no-cache"}
+
+
+# Une page du catalogue : l'ETag est calculé sur les (id, version) de la page avant de charger les lignes
+@router.get("/livres")
+def lister_livres(
+    request: Request,
+    apres: Optional[int] = None,
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    filtres: Filtres = Depends(filtres_catalogue),
+    db: Session = Depends(database.get_db)
+):
+    versions = paginer(
+        db.query(models.Livre.id, models.Livre.version).filter(*filtres.conditions()), models.Livre.id, apres, taille
+    )
+    valeur_etag = etag("livres", apres, taille, filtres.query_string(), [tuple(ligne) for ligne in versions])
+    if non_modifie(request, valeur_etag):
+        return Response(status_code=304, headers=entetes_cache(valeur_etag))
+
+    livres = crud.get_livres_par_ids(db, [ligne.id for ligne in versions])
+    return ORJSONResponse(
+        {"livres": [livre_json(livre) for livre in livres], "suivant": versions.suivant, "taille": versions.taille},
+        headers=entetes_cache(valeur_etag),
+    )
+
+
+# Tout le catalogue en flux (un tableau JSON écrit par lots), sans le charger en mémoire
+@router.get("/livres/export")
+def exporter_livres(request: Request, db: Session = Depends(database.get_db)):
+    # Nombre de lignes, somme des ids et des versions : change à chaque ajout, suppression ou modification
+    agregat = db.query(func.count(models.Livre.id), func.sum(models.Livre.id), func.sum(models.Livre.version)).one()
+    valeur_etag = etag("export", tuple(agregat))
+    if non_modifie(request, valeur_etag):
+        return Response(status_code=304, headers=entetes_cache(valeur_etag))
+
+    colonnes = [getattr(models.Livre, champ) for champ in CHAMPS_LIVRE]
+
+    def lignes():
+        # Session propre au flux : celle de la requête est fermée avant la fin de la réponse
+        with database.SessionLocal() as session:
+            yield b"["
+            premier = True
+            for ligne in session.query(*colonnes).order_by(models.Livre.id).yield_per(TAILLE_LOT_EXPORT):
+                yield (b"" if premier else b",") + orjson.dumps(dict(zip(CHAMPS_LIVRE, ligne)))
+                premier = False
+            yield b"]"
+
+    return StreamingResponse(lignes(), media_type="application/json", headers=entetes_cache(valeur_etag))
+
+
+# Détail d'un livre : seule la version est lue pour répondre 304
+@router.get("/livres/{livre_id}")
+def detail_livre(request: Request, livre_id: int, db: Session = Depends(database.get_db)):
+    version = db.query(models.Livre.version).filter(models.Livre.id == livre_id).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Livre introuvable")
+    valeur_etag = etag("livre", livre_id, version)
+    if non_modifie(request, valeur_etag):
+        return Response(status_code=304, headers=entetes_cache(valeur_etag))
+    return ORJSONResponse(livre_json(crud.get_livre(db, livre_id)), headers=entetes_cache(valeur_etag))
+
+
+# Disponibilité d'un livre (stock), même version que le détail : toute réservation ou retour la change
+@router.get("/livres/{livre_id}/disponibilite")
+def disponibilite_livre(request: Request, livre_id: int, db: Session = Depends(database.get_db)):
+    ligne = db.query(models.Livre.stock, models.Livre.version).filter(models.Livre.id == livre_id).first()
+    if ligne is None:
+        raise HTTPException(status_code=404, detail="Livre introuvable")
+    valeur_etag = etag("disponibilite", livre_id, ligne.version)
+    if non_modifie(request, valeur_etag):
+        return Response(status_code=304, headers=entetes_cache(valeur_etag))
+    stock = ligne.stock or 0
+    disponibilite = schemas.DisponibiliteOut(id=livre_id, stock=stock, disponible=stock > 0, version=ligne.version)
+    return ORJSONResponse(disponibilite.model_dump(), headers=entetes_cache(valeur_etag))
@@ -1,26 +1,83 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from backend import crud, database
+from dataclasses import replace
+from backend import cache, crud, database
 from backend.config import templates
+from backend.pagination import TAILLE_PAGE, TAILLE_PAGE_MAX
+from backend.facettes import Filtres
+from backend.autocompletion import NB_SUGGESTIONS, index_titres, reconstruire_si_perime
+from typing import Optional
 from backend import models, schemas
+from backend.recommender.recommender import K_VOISINS
+from backend.recommender.service import service
+from backend.recommender.collaboratif import POIDS_CONTENU, melanger, modele_collaboratif
+
+# Nombre de livres similaires affichés sur la page d'un livre
+NB_SIMILAIRES = 5
+
+# Livres similaires : voisins TF-IDF précalculés mélangés aux co-emprunts (voisins de contenu seuls
+# tant que le modèle collaboratif est en construction)
+def ids_similaires(livre_id, k, poids_contenu=POIDS_CONTENU):
+    contenu = service.modele().voisins_scores_de(livre_id, K_VOISINS)
+    collaboratif = modele_collaboratif() if poids_contenu < 1 else None
+    collaboratifs = collaboratif.similaires(livre_id, K_VOISINS) if collaboratif is not None else []
+    return melanger(contenu, collaboratifs, k, poids_contenu)
 
 router = APIRouter(prefix="/api", tags=["livres"])
 
-# Route pour récuperer tous les livres
+# Filtres du catalogue lus dans l'URL (prix_max exclu)
+def filtres_catalogue(
+    prix_min: Optional[float] = Query(None, ge=0),
+    prix_max: Optional[float] = Query(None, ge=0),
+    note_min: Optional[int] = Query(None, ge=1, le=5),
+    en_stock: bool = False
+):
+    return Filtres(prix_min, prix_max, note_min, en_stock)
+
+# Route pour récuperer tous les livres, avec recherche, filtres et compteurs des facettes
 @router.get("/livres")
-async def get_livres_route(request: Request, search: str = "", db: Session = Depends(database.get_db)):
-    livres = crud.get_livres(db, search)
+async def get_livres_route(
+    request: Request,
+    search: str = "",
+    apres: Optional[int] = None,
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    filtres: Filtres = Depends(filtres_catalogue),
+    db: Session = Depends(database.get_db)
+):
+    page = cache.get_livres(db, search, apres, taille, filtres)
+    facettes = cache.get_facettes(db, filtres, search)
+    if filtres.actifs() or search:
+        page = replace(page, total=facettes["total"])
     user = crud.get_current_user(request, db)
 
     return templates.TemplateResponse(
         "home.html",
-        {"request": request, "livres": livres, "search": search, "user": user}
+        {"request": request, "livres": page.elements, "page": page, "chemin_liste": "/api/livres",
+         "search": search, "user": user, "filtres": filtres, "facettes": facettes,
+         "parametres_liste": filtres.query_string()}
     )
 
+# Compteurs des facettes (JSON) pour une recherche et des filtres
+@router.get("/livres/facettes")
+def facettes_livres(search: str = "", filtres: Filtres = Depends(filtres_catalogue), db: Session = Depends(database.get_db)):
+    return JSONResponse(cache.get_facettes(db, filtres, search))
+
+# Autocomplétion des titres, servie par l'index en mémoire (aucune requête SQL)
+@router.get("/livres/suggest")
+def suggerer_titres(q: str = Query("", max_length=100), limite: int = Query(NB_SUGGESTIONS, ge=1, le=20)):
+    reconstruire_si_perime()
+    return JSONResponse([{"id": livre_id, "titre": titre} for livre_id, titre in index_titres.suggerer(q, limite)])
+
+# Taille et empreinte mémoire de l'index d'autocomplétion
+@router.get("/livres/suggest/index")
+def etat_index_titres():
+    return JSONResponse(index_titres.statistiques())
+
 # Route pour recuperer un livre avec son id
 @router.get("/livre/{livre_id}")
 async def livre_detail(request: Request, livre_id: int, db: Session = Depends(database.get_db)):
-    livre = crud.get_livre(db, livre_id)
+    livre = cache.get_livre(db, livre_id)
     if not livre:
         return templates.TemplateResponse(
             "home.html",
@@ -30,7 +87,23 @@ async def livre_detail(request: Request, livre_id: int, db: Session = Depends(da
     # Récupérer l'utilisateur connecté
     user = crud.get_current_user(request, db)
 
+    # Livres similaires (table des voisins précalculée + co-emprunts)
+    similaires = cache.get_livres_par_ids(db, ids_similaires(livre_id, NB_SIMILAIRES))
+
     return templates.TemplateResponse(
         "livre.html",
-        {"request": request, "livre": livre, "user": user}
-    )
\ No newline at end of file
+        {"request": request, "livre": livre, "user": user, "similaires": similaires}
+    )
+
+# Route pour récuperer les livres similaires à un livre ("more like this")
+@router.get("/livre/{livre_id}/similaires")
+async def livres_similaires(
+    livre_id: int,
+    k: int = Query(NB_SIMILAIRES, ge=1, le=K_VOISINS),
+    poids_contenu: float = Query(POIDS_CONTENU, ge=0, le=1),
+    db: Session = Depends(database.get_db)
+):
+    if not cache.get_livre(db, livre_id):
+        raise HTTPException(status_code=404, detail="Livre introuvable")
+    livres = crud.get_livres_par_ids(db, ids_similaires(livre_id, k, poids_contenu))
+    return JSONResponse([schemas.LivreOut.model_validate(livre).model_dump() for livre in livres])
\ No newline at end of file
@@ -1,21 +1,18 @@
 from fastapi import APIRouter, Request, Form, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from sqlalchemy.orm import Session
-from backend import database, models
+from typing import List
+from backend import database, models, crud, schemas
 from backend.config import templates
-import joblib
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from backend.recommender.recommender import preprocess_text_func
+import scipy.sparse as sp
+from backend.recommender.recommender import preprocess_text_func, preprocess_texts
+from backend.recommender.service import service
+from backend.recommender.cache import cache_resultats
 
 
 router = APIRouter(prefix="/api", tags=["recommandations"])
 
-# Charger le modèle TF-IDF et la matrice
-vectorizer = joblib.load(r"C:\Users\lenovo\Documents\BookSmart_Sara\backend\recommender\tfidf_vectorizer.joblib")
-cosine_sim = joblib.load(r"C:\Users\lenovo\Documents\BookSmart_Sara\backend\recommender\cosine_similarity_matrix.joblib")
-tfidf_matrix = joblib.load(r"C:\Users\lenovo\Documents\BookSmart_Sara\backend\recommender\tfidf_matrix.joblib")
-
 
 # Afficher le formulaire pour recommendation
 @router.get("/recommander-par-description")
@@ -33,22 +30,80 @@ async def recommander_par_description(
     description: str = Form(...),
     db: Session = Depends(database.get_db)
 ):
+    # Instantané courant du modèle (remplacé atomiquement après chaque reconstruction)
+    modele = service.modele()
+
     # Transformer la description saisie
     description=preprocess_text_func(description)
-    desc_vec = vectorizer.transform([description])
 
-    # Calculer la similarité avec tous les livres
-    similarities = cosine_similarity(desc_vec, tfidf_matrix).flatten()
+    # Résultat en cache pour ce texte et cette version du modèle ?
+    top_ids = cache_resultats.get(description, modele.version)
+    if top_ids is None:
+        desc_vec = modele.vectorizer.transform([description])
 
-    # Top 5 indices
-    top_idx = similarities.argsort()[::-1][:5]
+        # Top 5 lignes (hors livres supprimés) : scan exact, ou index ANN s'il est activé
+        top_lignes, _ = modele.rechercher(desc_vec, 5)[0]
+        top_ids = tuple(modele.ids_lignes(top_lignes).tolist())
+        cache_resultats.set(description, modele.version, top_ids)
 
-    # Récupérer les livres correspondants depuis la DB
-    livres = db.query(models.Livre).all()
-    suggestions = [livres[i] for i in top_idx]
+    # Récupérer uniquement les livres recommandés (une requête IN), dans l'ordre du classement
+    suggestions = crud.get_livres_par_ids(db, top_ids)
 
     return templates.TemplateResponse("recommandation-par-description.html", {
         "request": request,
         "suggestions": suggestions,
         "description": description
     })
+
+
+# Recommandations pour plusieurs descriptions et/ou livres en un seul passage :
+# un transform pour toutes les descriptions, un produit creux pour toutes les requêtes
+@router.post("/recommandations", response_model=List[schemas.RecommandationOut])
+def recommandations_par_lot(
+    demande: schemas.RecommandationsLotIn,
+    db: Session = Depends(database.get_db)
+):
+    if not demande.descriptions and not demande.livres:
+        return []
+    modele = service.modele()
+
+    vecteurs_descriptions = (
+        modele.vectorizer.transform(preprocess_texts(demande.descriptions))
+        if demande.descriptions else modele.vecteurs_lignes([])
+    )
+
+    # Livres de départ : leur ligne TF-IDF sert de requête (livres inconnus : aucune suggestion)
+    lignes_livres = {livre_id: modele.ligne(livre_id) for livre_id in demande.livres}
+    connus = [livre_id for livre_id in demande.livres if lignes_livres[livre_id] is not None]
+    vecteurs_livres = modele.vecteurs_lignes([lignes_livres[livre_id] for livre_id in connus])
+
+    # k + 1 pour pouvoir écarter le livre de départ de ses propres suggestions
+    resultats = modele.rechercher(sp.vstack([vecteurs_descriptions, vecteurs_livres], format="csr"), demande.k + 1)
+    top_ids = [modele.ids_lignes(lignes).tolist() for lignes, _ in resultats]
+    ids_descriptions = [ids[:demande.k] for ids in top_ids[:len(demande.descriptions)]]
+    ids_livres = dict(zip(connus, top_ids[len(demande.descriptions):]))
+    ids_livres = {
+        livre_id: [i for i in ids_livres.get(livre_id, []) if i != livre_id][:demande.k]
+        for livre_id in demande.livres
+    }
+
+    # Une seule requête IN pour tous les livres suggérés
+    tous_ids = {i for ids in ids_descriptions for i in ids} | {i for ids in ids_livres.values() for i in ids}
+    livres = {livre.id: livre for livre in crud.get_livres_par_ids(db, tous_ids)}
+
+    def suggestions(ids):
+        return [schemas.LivreOut.model_validate(livres[i]) for i in ids if i in livres]
+
+    return [
+        schemas.RecommandationOut(description=description, suggestions=suggestions(ids))
+        for description, ids in zip(demande.descriptions, ids_descriptions)
+    ] + [
+        schemas.RecommandationOut(livre_id=livre_id, suggestions=suggestions(ids_livres[livre_id]))
+        for livre_id in demande.livres
+    ]
+
+
+# Version et coût du modèle actuellement servi, compteurs du cache de résultats
+@router.get("/recommandations/modele")
+async def etat_modele():
+    return JSONResponse({**service.etat(), "cache": cache_resultats.statistiques()})
@@ -1,6 +1,7 @@
 from fastapi import Form, Depends, APIRouter, Request, HTTPException
 from sqlalchemy.orm import Session
 from backend import database, crud, models
+from backend.cache import cache_catalogue
 from backend.config import templates
 
 # Routeur pour les reservations
@@ -77,6 +78,7 @@ async def create_reservation(
     db.add(reservation)
     livre.stock -= 1
     db.commit()
+    cache_catalogue.invalider_livres(id_livre)
 
     return templates.TemplateResponse(
         "livre.html",
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response,Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Response,Request, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, date
-from backend import schemas, crud, database,models
+from typing import Optional
+from backend import schemas, crud, database,models, cache
 from backend.config import templates
+from backend.pagination import TAILLE_PAGE, TAILLE_PAGE_MAX
 
 # Routeur pour les utilisateurs
 router = APIRouter(
@@ -111,7 +113,12 @@ async def logout(request: Request):
     return RedirectResponse(url="/api/login?message=deconnecte", status_code=303)
 
 @router.get("/home")
-def home(request: Request, db: Session = Depends(database.get_db)):
+def home(
+    request: Request,
+    apres: Optional[int] = None,
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    db: Session = Depends(database.get_db)
+):
     # Récupérer l'ID de l'utilisateur depuis la session
     user_id = request.session.get("user_id")
     user = None
@@ -119,12 +126,12 @@ def home(request: Request, db: Session = Depends(database.get_db)):
     if user_id:
         user = db.query(models.Adherent).filter(models.Adherent.id == user_id).first()
 
-    # Récupérer tous les livres
-    livres = db.query(models.Livre).all()
+    # Récupérer une page de livres (curseur sur l'id), via le cache du catalogue
+    page = cache.get_livres(db, apres=apres, taille=taille)
 
     return templates.TemplateResponse(
         "home.html",
-        {"request": request, "livres": livres, "user": user}
+        {"request": request, "livres": page.elements, "page": page, "chemin_liste": "/api/home", "user": user}
     )
 
 # Route pour afficher le profil de l'adherent
@@ -134,8 +141,8 @@ async def profil(request: Request, db: Session = Depends(database.get_db)):
     if not user:
         return RedirectResponse(url="/api/login", status_code=303)
 
-    # Récupérer les emprunts liés à l'utilisateur
-    emprunts = db.query(models.Emprunt).filter_by(id_adherent=user.id).all()
+    # Récupérer les emprunts liés à l'utilisateur, avec leur livre (une seule requête, pas de chargement par emprunt)
+    emprunts = db.query(models.Emprunt).options(joinedload(models.Emprunt.livre)).filter_by(id_adherent=user.id).all()
     
     # Passer la date courante pour le calcul des retards
     now = date.today()
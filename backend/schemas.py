@@ -37,11 +37,38 @@ class LivreBase(BaseModel):
     
 class LivreOut(LivreBase):
     id: int
+    # Colonnes nullables en base
+    description: Optional[str] = ""
+    image_url: Optional[str] = ""
+    rating: Optional[int] = 0
 
     class Config:
         from_attributes=True
 
 
+# API JSON v1 : livre avec sa version (ETag) et disponibilité
+class LivreV1(LivreOut):
+    version: int = 1
+
+class DisponibiliteOut(BaseModel):
+    id: int
+    stock: int
+    disponible: bool
+    version: int = 1
+
+
+# Recommandations par lot (descriptions et/ou livres de départ)
+class RecommandationsLotIn(BaseModel):
+    descriptions: List[str] = Field(default_factory=list, max_length=100)
+    livres: List[int] = Field(default_factory=list, max_length=100)
+    k: int = Field(5, ge=1, le=50)
+
+class RecommandationOut(BaseModel):
+    description: Optional[str] = None
+    livre_id: Optional[int] = None
+    suggestions: List[LivreOut]
+
+
 # Réservation
 class ReservationBase(BaseModel):
     id_adherent: int
@@ -68,4 +95,22 @@ class EmpruntOut(EmpruntBase):
     date_retour_effectif: Optional[date]
 
     class Config:
-        from_attributes=True
\ No newline at end of file
+        from_attributes=True
+
+# Emprunts et retours par lot (banque de prêt) : un résultat par élément, dans l'ordre de la demande
+class PaireEmpruntIn(BaseModel):
+    id_adherent: int
+    id_livre: int
+
+class EmpruntsLotIn(BaseModel):
+    emprunts: List[PaireEmpruntIn] = Field(min_length=1, max_length=500)
+
+class RetoursLotIn(BaseModel):
+    emprunt_ids: List[int] = Field(min_length=1, max_length=500)
+
+class ResultatLotOut(BaseModel):
+    statut: str
+    emprunt_id: Optional[int] = None
+    id_adherent: Optional[int] = None
+    id_livre: Optional[int] = None
+    erreur: Optional[str] = None
@@ -0,0 +1,314 @@
+import argparse
+from datetime import date
+
+from sqlalchemy import case, func, inspect, text
+from sqlalchemy.orm import Session
+
+from backend import models
+
+# Nombre de livres du top des emprunts
+NB_TOP_LIVRES = 5
+
+# Nombre maximal d'écarts détaillés par la vérification
+NB_ECARTS_RAPPORT = 100
+
+# Fragments des compteurs partagés (catalogue, échéances) : sous Postgres, deux transactions ne se bloquent
+# sur la même ligne que si leurs ids tombent dans le même fragment ; la lecture somme les fragments
+NB_FRAGMENTS = 16
+
+# Verrou consultatif (Postgres) : les workers qui démarrent ensemble installent les triggers l'un après l'autre
+VERROU_INITIALISATION = 7_202_501
+
+# Agrégats et leur calcul depuis les tables sources : table -> (colonnes clé, colonne valeur, requête)
+AGREGATS = {
+    "stats_livres": (
+        "id_livre", "nb_emprunts",
+        "SELECT id_livre, count(*) FROM emprunts WHERE id_livre IS NOT NULL GROUP BY id_livre",
+    ),
+    "stats_echeances": (
+        "date_retour_prevue, fragment", "nb_actifs",
+        f"SELECT date_retour_prevue, id % {NB_FRAGMENTS}, count(*) FROM emprunts WHERE date_retour_effectif IS NULL "
+        f"GROUP BY date_retour_prevue, id % {NB_FRAGMENTS}",
+    ),
+    "stats_catalogue": (
+        "cle, fragment", "valeur",
+        f"SELECT 'livres', id % {NB_FRAGMENTS}, count(*) FROM livres GROUP BY id % {NB_FRAGMENTS} "
+        f"UNION ALL SELECT 'livres_disponibles', id % {NB_FRAGMENTS}, count(*) FROM livres "
+        f"WHERE coalesce(stock, 0) > 0 GROUP BY id % {NB_FRAGMENTS}",
+    ),
+}
+
+
+# --------------------------------------------
+# Triggers : les agrégats sont modifiés dans la transaction qui modifie les emprunts ou les stocks
+# (emprunts, retours, réservations, lots, admin, import en masse)
+#--------------------------------------------
+
+# Postgres : une fonction par table source (remplacée à chaque démarrage, sans toucher aux triggers)
+FONCTIONS_POSTGRES = [
+    f"""CREATE OR REPLACE FUNCTION stats_emprunts_maj() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id_livre IS DISTINCT FROM NEW.id_livre) THEN
+            UPDATE stats_livres SET nb_emprunts = nb_emprunts - 1 WHERE id_livre = OLD.id_livre;
+        END IF;
+        IF (TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND OLD.id_livre IS DISTINCT FROM NEW.id_livre))
+                AND NEW.id_livre IS NOT NULL THEN
+            INSERT INTO stats_livres (id_livre, nb_emprunts) VALUES (NEW.id_livre, 1)
+                ON CONFLICT (id_livre) DO UPDATE SET nb_emprunts = stats_livres.nb_emprunts + 1;
+        END IF;
+        IF TG_OP = 'UPDATE' AND OLD.date_retour_effectif IS NOT DISTINCT FROM NEW.date_retour_effectif
+                            AND OLD.date_retour_prevue = NEW.date_retour_prevue THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP <> 'INSERT' AND OLD.date_retour_effectif IS NULL THEN
+            UPDATE stats_echeances SET nb_actifs = nb_actifs - 1
+                WHERE date_retour_prevue = OLD.date_retour_prevue AND fragment = OLD.id % {NB_FRAGMENTS};
+            DELETE FROM stats_echeances
+                WHERE date_retour_prevue = OLD.date_retour_prevue AND fragment = OLD.id % {NB_FRAGMENTS} AND nb_actifs = 0;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NEW.date_retour_effectif IS NULL THEN
+            INSERT INTO stats_echeances (date_retour_prevue, fragment, nb_actifs)
+                VALUES (NEW.date_retour_prevue, NEW.id % {NB_FRAGMENTS}, 1)
+                ON CONFLICT (date_retour_prevue, fragment) DO UPDATE SET nb_actifs = stats_echeances.nb_actifs + 1;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    f"""CREATE OR REPLACE FUNCTION stats_livres_maj() RETURNS trigger AS $$
+    DECLARE
+        disponible_avant integer := 0;
+        disponible_apres integer := 0;
+        fragment_livre integer;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN fragment_livre := OLD.id % {NB_FRAGMENTS}; ELSE fragment_livre := NEW.id % {NB_FRAGMENTS}; END IF;
+        IF TG_OP <> 'INSERT' AND coalesce(OLD.stock, 0) > 0 THEN disponible_avant := 1; END IF;
+        IF TG_OP <> 'DELETE' AND coalesce(NEW.stock, 0) > 0 THEN disponible_apres := 1; END IF;
+        IF TG_OP <> 'UPDATE' THEN
+            INSERT INTO stats_catalogue (cle, fragment, valeur)
+                VALUES ('livres', fragment_livre, CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END)
+                ON CONFLICT (cle, fragment) DO UPDATE SET valeur = stats_catalogue.valeur + EXCLUDED.valeur;
+        END IF;
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM stats_livres WHERE id_livre = OLD.id;
+        END IF;
+        IF disponible_apres <> disponible_avant THEN
+            INSERT INTO stats_catalogue (cle, fragment, valeur)
+                VALUES ('livres_disponibles', fragment_livre, disponible_apres - disponible_avant)
+                ON CONFLICT (cle, fragment) DO UPDATE SET valeur = stats_catalogue.valeur + EXCLUDED.valeur;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+]
+
+# Postgres : triggers créés s'ils manquent (pg_trigger), jamais supprimés puis recréés au démarrage
+TRIGGERS_POSTGRES = {
+    "stats_emprunts": """CREATE TRIGGER stats_emprunts
+        AFTER INSERT OR DELETE OR UPDATE OF id_livre, date_retour_prevue, date_retour_effectif ON emprunts
+        FOR EACH ROW EXECUTE FUNCTION stats_emprunts_maj()""",
+    "stats_livres": """CREATE TRIGGER stats_livres AFTER INSERT OR DELETE OR UPDATE OF stock ON livres
+        FOR EACH ROW EXECUTE FUNCTION stats_livres_maj()""",
+}
+
+# SQLite : un trigger par opération, conditions dans les WHERE ; recréé seulement si sa définition a changé
+TRIGGERS_SQLITE = {
+    "stats_emprunts_insert": f"""CREATE TRIGGER stats_emprunts_insert AFTER INSERT ON emprunts BEGIN
+        INSERT INTO stats_livres (id_livre, nb_emprunts) SELECT new.id_livre, 1 WHERE new.id_livre IS NOT NULL
+            ON CONFLICT (id_livre) DO UPDATE SET nb_emprunts = nb_emprunts + 1;
+        INSERT INTO stats_echeances (date_retour_prevue, fragment, nb_actifs)
+            SELECT new.date_retour_prevue, new.id % {NB_FRAGMENTS}, 1 WHERE new.date_retour_effectif IS NULL
+            ON CONFLICT (date_retour_prevue, fragment) DO UPDATE SET nb_actifs = nb_actifs + 1;
+    END""",
+    "stats_emprunts_delete": f"""CREATE TRIGGER stats_emprunts_delete AFTER DELETE ON emprunts BEGIN
+        UPDATE stats_livres SET nb_emprunts = nb_emprunts - 1 WHERE id_livre = old.id_livre;
+        UPDATE stats_echeances SET nb_actifs = nb_actifs - 1
+            WHERE date_retour_prevue = old.date_retour_prevue AND fragment = old.id % {NB_FRAGMENTS}
+            AND old.date_retour_effectif IS NULL;
+        DELETE FROM stats_echeances
+            WHERE date_retour_prevue = old.date_retour_prevue AND fragment = old.id % {NB_FRAGMENTS} AND nb_actifs = 0;
+    END""",
+    "stats_emprunts_livre": """CREATE TRIGGER stats_emprunts_livre AFTER UPDATE OF id_livre ON emprunts
+        WHEN old.id_livre IS NOT new.id_livre BEGIN
+        UPDATE stats_livres SET nb_emprunts = nb_emprunts - 1 WHERE id_livre = old.id_livre;
+        INSERT INTO stats_livres (id_livre, nb_emprunts) SELECT new.id_livre, 1 WHERE new.id_livre IS NOT NULL
+            ON CONFLICT (id_livre) DO UPDATE SET nb_emprunts = nb_emprunts + 1;
+    END""",
+    "stats_emprunts_echeance": f"""CREATE TRIGGER stats_emprunts_echeance AFTER UPDATE OF date_retour_prevue, date_retour_effectif ON emprunts
+        WHEN old.date_retour_effectif IS NOT new.date_retour_effectif OR old.date_retour_prevue IS NOT new.date_retour_prevue BEGIN
+        UPDATE stats_echeances SET nb_actifs = nb_actifs - 1
+            WHERE date_retour_prevue = old.date_retour_prevue AND fragment = old.id % {NB_FRAGMENTS}
+            AND old.date_retour_effectif IS NULL;
+        DELETE FROM stats_echeances
+            WHERE date_retour_prevue = old.date_retour_prevue AND fragment = old.id % {NB_FRAGMENTS} AND nb_actifs = 0;
+        INSERT INTO stats_echeances (date_retour_prevue, fragment, nb_actifs)
+            SELECT new.date_retour_prevue, new.id % {NB_FRAGMENTS}, 1 WHERE new.date_retour_effectif IS NULL
+            ON CONFLICT (date_retour_prevue, fragment) DO UPDATE SET nb_actifs = nb_actifs + 1;
+    END""",
+    "stats_livres_insert": f"""CREATE TRIGGER stats_livres_insert AFTER INSERT ON livres BEGIN
+        INSERT INTO stats_catalogue (cle, fragment, valeur) VALUES ('livres', new.id % {NB_FRAGMENTS}, 1)
+            ON CONFLICT (cle, fragment) DO UPDATE SET valeur = valeur + 1;
+        INSERT INTO stats_catalogue (cle, fragment, valeur)
+            SELECT 'livres_disponibles', new.id % {NB_FRAGMENTS}, 1 WHERE coalesce(new.stock, 0) > 0
+            ON CONFLICT (cle, fragment) DO UPDATE SET valeur = valeur + 1;
+    END""",
+    "stats_livres_delete": f"""CREATE TRIGGER stats_livres_delete AFTER DELETE ON livres BEGIN
+        UPDATE stats_catalogue SET valeur = valeur - 1 WHERE fragment = old.id % {NB_FRAGMENTS}
+            AND (cle = 'livres' OR (cle = 'livres_disponibles' AND coalesce(old.stock, 0) > 0));
+        DELETE FROM stats_livres WHERE id_livre = old.id;
+    END""",
+    "stats_livres_stock": f"""CREATE TRIGGER stats_livres_stock AFTER UPDATE OF stock ON livres
+        WHEN (coalesce(old.stock, 0) > 0) <> (coalesce(new.stock, 0) > 0) BEGIN
+        INSERT INTO stats_catalogue (cle, fragment, valeur)
+            VALUES ('livres_disponibles', new.id % {NB_FRAGMENTS}, CASE WHEN coalesce(new.stock, 0) > 0 THEN 1 ELSE -1 END)
+            ON CONFLICT (cle, fragment) DO UPDATE SET valeur = valeur + excluded.valeur;
+    END""",
+}
+
+
+# Tables d'agrégats dont la clé primaire a changé (ajout des fragments) : recréées, puis recalculées
+def recreer_agregats_modifies(connexion):
+    inspecteur = inspect(connexion)
+    recreees = False
+    for modele in (models.StatLivre, models.StatEcheance, models.StatCatalogue):
+        table = modele.__table__
+        cle = set(inspecteur.get_pk_constraint(table.name)["constrained_columns"])
+        if cle != {colonne.name for colonne in table.primary_key.columns}:
+            table.drop(connexion)
+            table.create(connexion)
+            recreees = True
+    return recreees
+
+
+# Installe ce qui manque ou a changé, sans DDL sur les triggers déjà en place
+def installer_triggers(connexion):
+    if connexion.dialect.name == "postgresql":
+        for instruction in FONCTIONS_POSTGRES:
+            connexion.execute(text(instruction))
+        existants = set(connexion.execute(text(
+            "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgname = ANY(:noms)"
+        ), {"noms": list(TRIGGERS_POSTGRES)}).scalars())
+        for nom, instruction in TRIGGERS_POSTGRES.items():
+            if nom not in existants:
+                connexion.execute(text(instruction))
+    else:
+        existants = dict(connexion.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).all())
+        for nom, instruction in TRIGGERS_SQLITE.items():
+            if existants.get(nom) == instruction:
+                continue
+            if nom in existants:
+                connexion.execute(text(f"DROP TRIGGER {nom}"))
+            connexion.execute(text(instruction))
+
+
+# Installe les triggers ; sur une base sans agrégats (premier démarrage), les calcule.
+# Sous Postgres, tout se fait sous un verrou consultatif : un seul worker à la fois, les suivants n'ont rien à faire
+def initialiser_statistiques(engine):
+    if engine.dialect.name not in ("postgresql", "sqlite"):
+        return
+    with engine.begin() as connexion:
+        if engine.dialect.name == "postgresql":
+            connexion.execute(text("SELECT pg_advisory_xact_lock(:cle)"), {"cle": VERROU_INITIALISATION})
+        recreees = recreer_agregats_modifies(connexion)
+        installer_triggers(connexion)
+        if recreees or connexion.execute(text("SELECT count(*) FROM stats_catalogue")).scalar() == 0:
+            recalculer(connexion)
+
+
+# --------------------------------------------
+# Lecture : quelques lignes, quelle que soit la taille des tables
+#--------------------------------------------
+
+def lire_statistiques(db: Session):
+    top = (db.query(models.Livre.titre, models.StatLivre.nb_emprunts)
+             .join(models.Livre, models.Livre.id == models.StatLivre.id_livre)
+             .filter(models.StatLivre.nb_emprunts > 0)
+             .order_by(models.StatLivre.nb_emprunts.desc()).limit(NB_TOP_LIVRES).all())
+    compteurs = dict(db.query(models.StatCatalogue.cle, func.sum(models.StatCatalogue.valeur))
+                       .group_by(models.StatCatalogue.cle).all())
+    # Quelques lignes par date d'échéance encore ouverte (quelques semaines), pas une par emprunt
+    retards = db.query(func.coalesce(func.sum(models.StatEcheance.nb_actifs), 0)).filter(
+        models.StatEcheance.date_retour_prevue < date.today()
+    ).scalar()
+
+    total_livres = compteurs.get("livres", 0)
+    return {
+        "top": [{"titre": titre, "nb": nb} for titre, nb in top],
+        "taux_dispo": compteurs.get("livres_disponibles", 0) / total_livres if total_livres else 0,
+        "retards": retards,
+    }
+
+
+# Emprunts en cours et en retard (page des emprunts) : les fragments des dates d'échéance ouvertes
+def emprunts_en_cours(db: Session):
+    en_retard = models.StatEcheance.date_retour_prevue < date.today()
+    return db.query(
+        func.coalesce(func.sum(models.StatEcheance.nb_actifs), 0),
+        func.coalesce(func.sum(case((en_retard, models.StatEcheance.nb_actifs), else_=0)), 0),
+    ).one()
+
+
+# --------------------------------------------
+# Vérification et reconstruction depuis les tables sources (tâche périodique ou après une réparation)
+#--------------------------------------------
+
+# Écarts entre les agrégats et leur valeur recalculée (une ligne à 0 équivaut à une ligne absente)
+def verifier(connexion):
+    ecarts = []
+    for table, (cle, valeur, requete) in AGREGATS.items():
+        attendu = {tuple(ligne[:-1]): ligne[-1] for ligne in connexion.execute(text(requete)).all() if ligne[-1]}
+        trouve = {tuple(ligne[:-1]): ligne[-1]
+                  for ligne in connexion.execute(text(f"SELECT {cle}, {valeur} FROM {table}")).all() if ligne[-1]}
+        for k in attendu.keys() | trouve.keys():
+            if attendu.get(k, 0) != trouve.get(k, 0):
+                ecarts.append({"agregat": table, "cle": "/".join(map(str, k)),
+                               "attendu": attendu.get(k, 0), "trouve": trouve.get(k, 0)})
+    return ecarts
+
+
+# Recalcule tous les agrégats dans la transaction de la connexion (écritures sur les tables sources bloquées sous Postgres)
+def recalculer(connexion):
+    if connexion.dialect.name == "postgresql":
+        connexion.execute(text("LOCK TABLE livres, emprunts IN SHARE MODE"))
+    for table, (cle, valeur, requete) in AGREGATS.items():
+        connexion.execute(text(f"DELETE FROM {table}"))
+        connexion.execute(text(f"INSERT INTO {table} ({cle}, {valeur}) {requete}"))
+
+
+# Recalcule tous les agrégats en une transaction
+def reconstruire(engine):
+    with engine.begin() as connexion:
+        recalculer(connexion)
+
+
+# Vérifie les agrégats et les reconstruit s'ils ont dérivé ; retourne les écarts trouvés
+def verifier_et_reparer(engine):
+    # Postgres : agrégats et tables sources lus dans le même instantané
+    options = {"isolation_level": "REPEATABLE READ"} if engine.dialect.name == "postgresql" else {}
+    with engine.connect().execution_options(**options) as connexion:
+        ecarts = verifier(connexion)
+    if ecarts:
+        reconstruire(engine)
+    return ecarts
+
+
+# --------------------------------------------
+# Ligne de commande (tâche planifiée) : python -m backend.statistiques [--reconstruire]
+#--------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification des agrégats des statistiques.")
+    parser.add_argument("--reconstruire", action="store_true", help="reconstruire sans vérifier")
+    args = parser.parse_args()
+
+    from backend.database import engine
+
+    if args.reconstruire:
+        reconstruire(engine)
+        print("Agrégats des statistiques reconstruits.")
+        return
+    ecarts = verifier_et_reparer(engine)
+    for ecart in ecarts[:NB_ECARTS_RAPPORT]:
+        print(f"{ecart['agregat']}[{ecart['cle']}] : {ecart['trouve']} au lieu de {ecart['attendu']}")
+    print(f"{len(ecarts)} écart(s) ; agrégats reconstruits." if ecarts else "Agrégats cohérents.")
+
+
+if __name__ == "__main__":
+    main()
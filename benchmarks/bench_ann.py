@@ -0,0 +1,65 @@
+"""Benchmark de la recherche approchée (ANN) face au scan exact.
+
+Entraîne le modèle avec l'index ANN sur un corpus synthétique de `--nb-livres`
+livres, puis mesure, pour chaque valeur de n_sondes, le rappel@5 par rapport au
+top 5 exact et la latence par requête (description d'un livre du catalogue,
+perturbée).
+
+    python -m benchmarks.bench_ann --nb-livres 200000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend.recommender.recommender import entrainer_modele, preprocess_texts
+from benchmarks.corpus import corpus_synthetique
+
+
+def latence_ms(fonction):
+    debut = time.perf_counter()
+    resultat = fonction()
+    return resultat, (time.perf_counter() - debut) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-livres", type=int, default=200_000)
+    parser.add_argument("--nb-requetes", type=int, default=200)
+    parser.add_argument("--sondes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    df = corpus_synthetique(args.nb_livres)
+    debut = time.perf_counter()
+    modele = entrainer_modele(df, ann=True)
+    print(f"Corpus : {args.nb_livres} livres, modèle + index ANN en {time.perf_counter() - debut:.1f}s "
+          f"({len(modele.index_ann.centroides)} partitions)")
+
+    requetes = corpus_synthetique(args.nb_requetes, graine=1)["description"]
+    vecteurs = modele.vectorizer.transform(preprocess_texts(requetes))
+
+    # Référence : scan exact
+    exact, latences = [], []
+    index_ann, modele.index_ann = modele.index_ann, None
+    for i in range(vecteurs.shape[0]):
+        (lignes, _), duree = latence_ms(lambda: modele.rechercher(vecteurs[i], args.k)[0])
+        exact.append(set(lignes.tolist()))
+        latences.append(duree)
+    modele.index_ann = index_ann
+    print(f"{'exact':>10} : rappel@{args.k}=1.000  p50={np.percentile(latences, 50):7.2f}ms  "
+          f"p99={np.percentile(latences, 99):7.2f}ms")
+
+    for n_sondes in args.sondes:
+        trouves, latences = 0, []
+        for i in range(vecteurs.shape[0]):
+            (lignes, _), duree = latence_ms(lambda: modele.rechercher_ann(vecteurs[i], args.k, n_sondes))
+            trouves += len(exact[i] & set(lignes.tolist()))
+            latences.append(duree)
+        rappel = trouves / sum(len(e) for e in exact)
+        print(f"{f'sondes={n_sondes}':>10} : rappel@{args.k}={rappel:.3f}  p50={np.percentile(latences, 50):7.2f}ms  "
+              f"p99={np.percentile(latences, 99):7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
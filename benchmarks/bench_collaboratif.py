@@ -0,0 +1,67 @@
+"""Benchmark du moteur collaboratif (co-emprunts) sur un historique synthétique.
+
+Génère `--nb-emprunts` emprunts (popularité des livres en loi de puissance,
+adhérents uniformes), puis mesure la construction de la matrice de co-emprunts,
+le coût d'un emprunt incrémental et la latence d'une requête "livres similaires".
+
+    python -m benchmarks.bench_collaboratif --nb-emprunts 10000000
+"""
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from backend.recommender.collaboratif import ModeleCollaboratif
+
+
+def historique_synthetique(nb_emprunts, nb_adherents, nb_livres, graine=0):
+    rng = np.random.default_rng(graine)
+    popularite = 1.0 / np.arange(1, nb_livres + 1) ** 0.8
+    popularite /= popularite.sum()
+    id_adherents = rng.integers(1, nb_adherents + 1, size=nb_emprunts)
+    id_livres = rng.choice(np.arange(1, nb_livres + 1), size=nb_emprunts, p=popularite)
+    return id_adherents, id_livres
+
+
+def rss_max_mo():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-emprunts", type=int, default=10_000_000)
+    parser.add_argument("--nb-adherents", type=int, default=1_000_000)
+    parser.add_argument("--nb-livres", type=int, default=100_000)
+    parser.add_argument("--nb-requetes", type=int, default=1_000)
+    args = parser.parse_args()
+
+    id_adherents, id_livres = historique_synthetique(args.nb_emprunts, args.nb_adherents, args.nb_livres)
+    rss_depart = rss_max_mo()
+    print(f"Historique : {args.nb_emprunts} emprunts, {args.nb_adherents} adhérents, {args.nb_livres} livres")
+
+    debut = time.perf_counter()
+    modele = ModeleCollaboratif.construire(id_adherents, id_livres)
+    duree = time.perf_counter() - debut
+    print(f"Construction       : {duree:8.2f}s  nnz co-emprunts={modele.co_emprunts.nnz}  "
+          f"RSS max +{rss_max_mo() - rss_depart:.0f} Mo")
+
+    rng = np.random.default_rng(1)
+    nouveaux = historique_synthetique(args.nb_requetes * 10, args.nb_adherents, args.nb_livres, graine=2)
+    debut = time.perf_counter()
+    for id_adherent, id_livre in zip(*nouveaux):
+        modele.enregistrer_emprunt(int(id_adherent), int(id_livre))
+    duree = time.perf_counter() - debut
+    print(f"Emprunt incrémental: {duree / len(nouveaux[0]) * 1e6:8.1f}µs par emprunt")
+
+    latences = []
+    for id_livre in rng.integers(1, args.nb_livres + 1, size=args.nb_requetes):
+        debut = time.perf_counter()
+        modele.similaires(int(id_livre), 10)
+        latences.append(time.perf_counter() - debut)
+    latences = np.array(latences) * 1000
+    print(f"Similaires (k=10)  : p50={np.percentile(latences, 50):.2f}ms  p99={np.percentile(latences, 99):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark du prétraitement des descriptions (preprocess_text_func).
+
+Compare l'implémentation d'origine (word_tokenize + re.sub + stemming à chaque
+appel, appliquée ligne par ligne) au pipeline par lot avec caches, sur
+data/livres_nettoyes.csv répliqué `--facteur` fois, et vérifie que les sorties
+sont identiques.
+
+    python -m benchmarks.bench_pretraitement --facteur 100 --n-jobs 4
+"""
+import argparse
+import re
+import string
+import time
+
+import pandas as pd
+from nltk.tokenize import word_tokenize
+
+from backend.recommender import recommender
+
+
+# Implémentation d'origine, conservée comme référence
+def preprocess_text_reference(text):
+    text_1 = str(text).lower()
+    tokens = word_tokenize(text_1)
+    tokens = [re.sub(f'[{re.escape(string.punctuation)}]', '', token) for token in tokens]
+    tokens = [token for token in tokens if token]
+    stemmed_tokens = [recommender.stemmer.stem(token) for token in tokens]
+    return ' '.join(stemmed_tokens)
+
+
+def chronometrer(fonction, *args, **kwargs):
+    debut = time.perf_counter()
+    resultat = fonction(*args, **kwargs)
+    return resultat, time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default="data/livres_nettoyes.csv")
+    parser.add_argument("--facteur", type=int, default=100)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    descriptions = pd.read_csv(args.csv)["description"]
+    corpus = pd.concat([descriptions] * args.facteur, ignore_index=True)
+    print(f"Corpus : {len(corpus)} descriptions ({args.facteur} x {args.csv})")
+
+    reference, duree_reference = chronometrer(corpus.apply, preprocess_text_reference)
+    print(f"{'Référence (Series.apply)':<32}: {duree_reference:8.2f}s")
+
+    recommender.stem.cache_clear()
+    recommender.mot_pretraite.cache_clear()
+    resultats, duree_lot = chronometrer(recommender.preprocess_texts, corpus)
+    print(f"{'Lot + caches':<32}: {duree_lot:8.2f}s  (x{duree_reference / duree_lot:.1f})")
+    assert resultats == reference.tolist(), "Sortie différente de l'implémentation d'origine"
+
+    if args.n_jobs != 1:
+        resultats, duree_mp = chronometrer(recommender.preprocess_texts, corpus, n_jobs=args.n_jobs)
+        print(f"{f'Lot + caches, {args.n_jobs} processus':<32}: {duree_mp:8.2f}s  (x{duree_reference / duree_mp:.1f})")
+        assert resultats == reference.tolist(), "Sortie différente de l'implémentation d'origine"
+
+    print(f"Cache mots  : {recommender.mot_pretraite.cache_info()}")
+    print(f"Cache stems : {recommender.stem.cache_info()}")
+    print("Sorties identiques à l'implémentation d'origine.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Suite de benchmarks du moteur de recommandation sur des catalogues synthétiques.
+
+Pour chaque taille de catalogue (corpus généré à partir de data/livres_nettoyes.csv),
+mesure le prétraitement, l'entraînement (TF-IDF + table des voisins), la mémoire
+maximale, la taille des fichiers du modèle, le chargement et la latence p50/p99
+d'une recommandation par description (prétraitement + transform + top 5). Chaque
+taille tourne dans un processus neuf pour que la mémoire maximale lui soit propre.
+Les résultats sont écrits en JSON (avec le commit courant) pour comparer les
+versions entre elles :
+
+    python -m benchmarks.bench_recommandation --tailles 1000 10000 100000 1000000
+    python -m benchmarks.bench_recommandation --comparer benchmarks/resultats/recommandation-<commit>.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Champs comparés entre deux exécutions (plus petit = meilleur)
+MESURES = (
+    "pretraitement_s", "entrainement_s", "rss_max_mo", "taille_modele_mo",
+    "chargement_s", "latence_p50_ms", "latence_p99_ms",
+)
+
+
+def rss_max_mo():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def taille_dossier_mo(dossier):
+    return sum(
+        os.path.getsize(os.path.join(racine, nom)) for racine, _, noms in os.walk(dossier) for nom in noms
+    ) / 1024 ** 2
+
+
+def chronometrer(fonction, *args, **kwargs):
+    debut = time.perf_counter()
+    resultat = fonction(*args, **kwargs)
+    return resultat, time.perf_counter() - debut
+
+
+# Mesures pour une taille de catalogue (exécuté dans un processus dédié)
+def mesurer(nb_livres, nb_requetes, ann, n_jobs):
+    from backend.recommender import recommender
+    from benchmarks.corpus import corpus_synthetique
+
+    df = corpus_synthetique(nb_livres)
+    requetes = corpus_synthetique(nb_requetes, graine=1)["description"].tolist()
+    rss_depart = rss_max_mo()
+
+    recommender.stem.cache_clear()
+    recommender.mot_pretraite.cache_clear()
+    _, duree_pretraitement = chronometrer(recommender.preprocess_texts, df["description"], n_jobs=n_jobs)
+
+    recommender.stem.cache_clear()
+    recommender.mot_pretraite.cache_clear()
+    modele, duree_entrainement = chronometrer(recommender.entrainer_modele, df, n_jobs=n_jobs, ann=ann)
+    rss_entrainement = rss_max_mo() - rss_depart
+
+    with tempfile.TemporaryDirectory() as dossier:
+        recommender.MODELE_DIR = dossier
+        modele.sauvegarder()
+        taille_modele = taille_dossier_mo(dossier)
+        del modele
+
+        modele, duree_chargement = chronometrer(recommender.ModeleRecommandation.charger)
+
+        # Même chemin que la route /recommander-par-description, sans le cache de résultats
+        latences = []
+        for texte in requetes:
+            debut = time.perf_counter()
+            vecteur = modele.vectorizer.transform([recommender.preprocess_text_func(texte)])
+            modele.rechercher(vecteur, 5)
+            latences.append((time.perf_counter() - debut) * 1000)
+
+    return {
+        "nb_livres": nb_livres,
+        "nb_termes": len(modele.vectorizer.vocabulary_),
+        "pretraitement_s": round(duree_pretraitement, 3),
+        "entrainement_s": round(duree_entrainement, 3),
+        "rss_max_mo": round(rss_entrainement, 1),
+        "taille_modele_mo": round(taille_modele, 2),
+        "chargement_s": round(duree_chargement, 4),
+        "latence_p50_ms": round(float(np.percentile(latences, 50)), 3),
+        "latence_p99_ms": round(float(np.percentile(latences, 99)), 3),
+    }
+
+
+def commit_courant():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+# Ecart relatif de chaque mesure par rapport à une exécution de référence
+def comparer(resultats, reference):
+    references = {r["nb_livres"]: r for r in reference["resultats"]}
+    print(f"\nComparaison avec {reference['commit']} ({reference['date']}) :")
+    for resultat in resultats["resultats"]:
+        base = references.get(resultat["nb_livres"])
+        if base is None:
+            continue
+        ecarts = [
+            f"{mesure}={(resultat[mesure] - base[mesure]) / base[mesure] * 100:+.0f}%"
+            for mesure in MESURES if base.get(mesure)
+        ]
+        print(f"  {resultat['nb_livres']:>9} livres : " + "  ".join(ecarts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tailles", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--nb-requetes", type=int, default=500)
+    parser.add_argument("--ann", action="store_true", help="construire et interroger l'index approché")
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--sortie", help="fichier JSON (défaut : benchmarks/resultats/recommandation-<commit>.json)")
+    parser.add_argument("--comparer", help="fichier JSON d'une exécution de référence")
+    args = parser.parse_args()
+
+    commit = commit_courant()
+    resultats = {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "processeur": platform.processor(), "cpu": os.cpu_count()},
+        "parametres": {"nb_requetes": args.nb_requetes, "ann": args.ann, "n_jobs": args.n_jobs},
+        "resultats": [],
+    }
+
+    contexte = multiprocessing.get_context("spawn")
+    for nb_livres in args.tailles:
+        with contexte.Pool(1) as pool:
+            resultat = pool.apply(mesurer, (nb_livres, args.nb_requetes, args.ann, args.n_jobs))
+        resultats["resultats"].append(resultat)
+        print(
+            f"{nb_livres:>9} livres : prétraitement {resultat['pretraitement_s']:8.2f}s  "
+            f"entraînement {resultat['entrainement_s']:8.2f}s  RSS max +{resultat['rss_max_mo']:.0f} Mo  "
+            f"modèle {resultat['taille_modele_mo']:.1f} Mo  chargement {resultat['chargement_s'] * 1000:.1f}ms  "
+            f"p50 {resultat['latence_p50_ms']:.2f}ms  p99 {resultat['latence_p99_ms']:.2f}ms"
+        )
+
+    sortie = args.sortie or os.path.join("benchmarks", "resultats", f"recommandation-{commit}.json")
+    os.makedirs(os.path.dirname(sortie) or ".", exist_ok=True)
+    with open(sortie, "w") as f:
+        json.dump(resultats, f, indent=2)
+    print(f"Résultats écrits dans {sortie}")
+
+    if args.comparer:
+        with open(args.comparer) as f:
+            comparer(resultats, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
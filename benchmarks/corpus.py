@@ -0,0 +1,21 @@
+"""Corpus synthétique pour les benchmarks du moteur de recommandation.
+
+Les descriptions sont tirées de data/livres_nettoyes.csv puis perturbées (mots
+retirés, mélange avec une autre description) pour obtenir des documents distincts
+au vocabulaire réaliste, quelle que soit la taille demandée.
+"""
+import numpy as np
+import pandas as pd
+
+
+def corpus_synthetique(nb_livres, csv="data/livres_nettoyes.csv", graine=0, taux_retrait=0.3):
+    rng = np.random.default_rng(graine)
+    mots = [str(d).split() for d in pd.read_csv(csv)["description"].dropna()]
+
+    descriptions = []
+    for source, autre in zip(rng.integers(len(mots), size=nb_livres), rng.integers(len(mots), size=nb_livres)):
+        base = [m for m in mots[source] if rng.random() >= taux_retrait]
+        melange = mots[autre][:max(1, len(mots[autre]) // 4)]
+        descriptions.append(" ".join(base + melange))
+
+    return pd.DataFrame({"id": np.arange(1, nb_livres + 1), "description": descriptions})
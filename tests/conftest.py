@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+# Racine du dépôt importable (package backend) quel que soit le dossier d'où pytest est lancé
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+# Base SQLite et registre de modèles temporaires, configurés avant l'import de l'application
+DOSSIER_TESTS = tempfile.mkdtemp(prefix="booksmart-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(DOSSIER_TESTS, 'tests.db')}")
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("MODELE_DIR", os.path.join(DOSSIER_TESTS, "modeles"))
+
+# Catalogue de test : les livres nettoyés du dépôt (l'application ne lance pas le scraping si la table est remplie)
+CSV_LIVRES = os.path.join(RACINE, "data", "livres_nettoyes.csv")
+
+# Nombres de lignes comparés par la vérification N+1
+NB_LIGNES_PETIT = 3
+NB_LIGNES_GRAND = 30
+
+
+@pytest.fixture(scope="session")
+def app():
+    import pandas as pd
+    import backend.models  # noqa: F401 (tables déclarées sur Base.metadata avant create_all)
+    from backend.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as connexion:
+        vide = connexion.exec_driver_sql("SELECT count(*) FROM livres").scalar() == 0
+    if vide:
+        pd.read_csv(CSV_LIVRES).to_sql("livres", con=engine, if_exists="append", index=False)
+
+    from backend.main import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+    return TestClient(app)
+
+
+@pytest.fixture
+def db(app):
+    from backend import database
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+# Connecte le client avec un compte (admin ou adhérent) créé au besoin
+@pytest.fixture
+def connecter(client, db):
+    from backend import crud, schemas
+
+    def connecter(email="admin@example.com", mot_de_passe="secret123", admin=True):
+        adherent = crud.get_adherent_by_email(db, email)
+        if adherent is None:
+            if admin:
+                adherent = crud.create_admin(db, "Admin", email, mot_de_passe)
+            else:
+                adherent = crud.create_adherent(db, schemas.AdherentCreate(nom="Adherent", email=email, password=mot_de_passe))
+        client.post("/api/login", data={"email": email, "password": mot_de_passe}, follow_redirects=False)
+        return adherent
+
+    return connecter
+
+
+# Instructions SQL exécutées dans un bloc : `with compteur_sql() as compteur: ...` puis `compteur.nb`.
+# L'écouteur est posé sur l'engine (et non sur le contexte de la requête) : le TestClient exécute
+# l'application dans un autre thread.
+@pytest.fixture
+def compteur_sql(app):
+    from sqlalchemy import event
+    from backend.compteur_sql import CompteurRequetes
+    from backend.database import engine
+
+    @contextmanager
+    def compter():
+        compteur = CompteurRequetes()
+        ecouteur = lambda connexion, curseur, instruction, *args: compteur.ajouter(instruction)
+        event.listen(engine, "before_cursor_execute", ecouteur)
+        try:
+            yield compteur
+        finally:
+            event.remove(engine, "before_cursor_execute", ecouteur)
+
+    return compter
+
+
+# Échoue si le nombre de requêtes SQL d'une route augmente avec le nombre de lignes affichées (N+1) :
+# `requetes_constantes("/api/profil", ajouter_lignes)` où ajouter_lignes(n) insère n lignes de plus
+@pytest.fixture
+def requetes_constantes(client, compteur_sql):
+    def verifier(url, ajouter_lignes, methode="GET", **options):
+        mesures = []
+        deja_ajoutees = 0
+        for nb_lignes in (NB_LIGNES_PETIT, NB_LIGNES_GRAND):
+            ajouter_lignes(nb_lignes - deja_ajoutees)
+            deja_ajoutees = nb_lignes
+            with compteur_sql() as compteur:
+                reponse = client.request(methode, url, **options)
+            assert reponse.status_code < 400, f"{methode} {url} : statut {reponse.status_code}"
+            mesures.append(compteur)
+        petit, grand = mesures
+        assert grand.nb == petit.nb, (
+            f"{methode} {url} : {petit.nb} requêtes SQL pour {NB_LIGNES_PETIT} lignes, "
+            f"{grand.nb} pour {NB_LIGNES_GRAND} (chargement paresseux dans une boucle ?)\n"
+            + "\n".join(grand.instructions)
+        )
+        return grand.nb
+
+    return verifier
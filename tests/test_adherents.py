@@ -0,0 +1,32 @@
+from backend import crud, models
+
+
+# Recherche d'adhérents par préfixe du nom ou de l'email, sans casse ; pas de correspondance au milieu
+# du nom ni de joker SQL ; résultats paginés par curseur
+def test_recherche_adherents_par_prefixe(client, connecter, db):
+    connecter()
+    adherents = [
+        models.Adherent(nom=nom, email=email, password="x") for nom, email in [
+            ("Quentestin", "a-recherche@example.com"),
+            ("QUENTESTA", "b-recherche@example.com"),
+            ("Autre", "quentest.mail@example.com"),
+            ("Marquentestin", "c-recherche@example.com"),
+            ("Quen_test", "d-recherche@example.com"),
+        ]
+    ]
+    db.add_all(adherents)
+    db.commit()
+    attendus = [adherent.id for adherent in adherents[:3]]
+
+    assert [a.id for a in crud.get_adherents(db, "quenTEST")] == attendus
+    assert [a.id for a in crud.get_adherents(db, "quen_t")] == [adherents[4].id]
+    assert [a.id for a in crud.get_adherents(db, "quen%")] == []
+
+    premiere = crud.get_adherents(db, "quentest", taille=2)
+    suivante = crud.get_adherents(db, "quentest", premiere.suivant, taille=2)
+    assert [a.id for a in premiere] + [a.id for a in suivante] == attendus
+    assert suivante.suivant is None
+
+    page = client.get("/admin/gestion-adherents", params={"recherche": "quentest"})
+    assert page.status_code == 200
+    assert "Quentestin" in page.text and "Marquentestin" not in page.text
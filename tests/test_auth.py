@@ -0,0 +1,15 @@
+from datetime import date, timedelta
+
+from backend import models
+
+
+def test_profil_requetes_constantes(connecter, db, requetes_constantes):
+    adherent = connecter("profil@example.com", admin=False)
+    livres = iter(range(1, 1000))
+
+    def ajouter_emprunts(nb):
+        for _ in range(nb):
+            db.add(models.Emprunt(id_adherent=adherent.id, id_livre=next(livres), date_retour_prevue=date.today() + timedelta(days=14)))
+        db.commit()
+
+    requetes_constantes("/api/profil", ajouter_emprunts)
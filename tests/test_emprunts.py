@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from backend import models
+
+
+# Emprunts et réservations d'adhérents et de livres tous différents : un chargement paresseux
+# de emprunt.adherent ou emprunt.livre dans le template coûterait une requête par ligne
+def test_page_emprunts_requetes_constantes(connecter, db, requetes_constantes):
+    connecter()
+    livres = iter(range(200, 1000))
+
+    def ajouter_lignes(nb):
+        for i in range(nb):
+            adherent = models.Adherent(nom="Lecteur", email=f"lecteur-page-{next(livres)}@example.com", password="x")
+            db.add(adherent)
+            db.flush()
+            db.add(models.Emprunt(id_adherent=adherent.id, id_livre=next(livres), date_retour_prevue=date.today() - timedelta(days=i % 2)))
+            db.add(models.Reservation(id_adherent=adherent.id, id_livre=next(livres)))
+        db.commit()
+
+    requetes_constantes("/admin/emprunts?statut=tous", ajouter_lignes)
+
+
+# Banque de prêt : un résultat par élément dans l'ordre reçu, jamais plus d'emprunts que d'exemplaires
+def test_emprunts_et_retours_par_lot(client, connecter, db):
+    connecter()
+    adherents = [models.Adherent(nom="Lecteur", email=f"lecteur-lot-{i}@example.com", password="x") for i in range(3)]
+    unique, double = models.Livre(titre="Lot unique", prix=1, stock=1), models.Livre(titre="Lot double", prix=1, stock=2)
+    db.add_all(adherents + [unique, double])
+    db.commit()
+    a, b, c = (adherent.id for adherent in adherents)
+
+    paires = [(a, unique.id), (b, unique.id), (a, double.id), (a, double.id), (999_999, double.id),
+              (b, double.id), (c, double.id)]
+    reponse = client.post("/admin/emprunts/lot", json={"emprunts": [
+        {"id_adherent": id_adherent, "id_livre": id_livre} for id_adherent, id_livre in paires
+    ]})
+    assert reponse.status_code == 200
+    resultats = reponse.json()
+    assert [(r["id_adherent"], r["id_livre"]) for r in resultats] == paires
+    assert [r["statut"] for r in resultats] == [
+        "emprunte", "livre_indisponible", "emprunte", "emprunt_existant", "adherent_introuvable",
+        "emprunte", "livre_indisponible",
+    ]
+    db.expire_all()
+    assert (unique.stock, double.stock) == (0, 0)
+    assert db.query(models.Emprunt).filter(models.Emprunt.id_livre.in_([unique.id, double.id])).count() == 3
+
+    premier, _, deuxieme, *_ = (r["emprunt_id"] for r in resultats)
+    reponse = client.post("/admin/retours/lot", json={"emprunt_ids": [premier, premier, 999_999, deuxieme]})
+    assert [r["statut"] for r in reponse.json()] == ["retourne", "deja_retourne", "emprunt_introuvable", "retourne"]
+    db.expire_all()
+    assert (unique.stock, double.stock) == (1, 1)
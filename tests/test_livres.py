@@ -0,0 +1,219 @@
+import csv
+import io
+
+import pytest
+from sqlalchemy import func
+
+from backend import autocompletion, cache, compteur_sql, crud, models, recherche, statistiques
+from backend.database import engine
+from backend.facettes import BORNES_PRIX, Filtres, compter_facettes
+from backend.pagination import Page, paginer
+from backend.recommender.service import service
+
+
+# L'export est produit en flux après l'envoi des en-têtes : ses instructions sont comptées à la fin du corps
+def test_compteur_sql_inclut_le_corps_en_flux(client, monkeypatch, capsys):
+    monkeypatch.setattr(compteur_sql, "SEUIL_REQUETES_SQL", 0)
+    reponse = client.get("/api/v1/livres/export")
+    assert reponse.status_code == 200
+    avant_corps = int(reponse.headers["X-Requetes-SQL"])
+    signale = [ligne for ligne in capsys.readouterr().out.splitlines() if "/api/v1/livres/export" in ligne]
+    assert signale, "total de fin de corps non signalé"
+    total = int(signale[-1].split(" : ")[1].split()[0])
+    assert total > avant_corps
+
+
+# Facettes sous un filtre combiné (avec ou sans recherche) : le total applique tous les filtres,
+# chaque facette tous sauf le sien ; comparées à des comptages directs
+@pytest.mark.parametrize("search", ["", "love"])
+def test_compter_facettes(db, search):
+    filtres = Filtres(prix_min=20, prix_max=40, note_min=3, en_stock=True)
+    requete = db.query(models.Livre)
+    if search:
+        requete = requete.filter(models.Livre.id.in_([livre.id for livre in recherche.rechercher_livres(db, search)]))
+
+    def compter(filtres, *conditions):
+        return requete.filter(*filtres.conditions(), *conditions).count()
+
+    facettes = compter_facettes(db, filtres, search)
+    assert facettes["total"] == compter(filtres) > 0
+    assert facettes["en_stock"] == compter(filtres)
+    sans_note = Filtres(prix_min=20, prix_max=40, en_stock=True)
+    assert facettes["notes"] == [
+        {"note_min": n, "nb": compter(sans_note, models.Livre.rating >= n)} for n in (5, 4, 3, 2, 1)
+    ]
+    sans_prix = Filtres(note_min=3, en_stock=True)
+    bornes = [0] + BORNES_PRIX + [None]
+    assert [tranche["nb"] for tranche in facettes["prix"]] == [
+        compter(sans_prix, models.Livre.prix >= bas, *([models.Livre.prix < haut] if haut else []))
+        for bas, haut in zip(bornes, bornes[1:])
+    ]
+    # Sans le filtre de stock, la facette en_stock compte toujours les livres disponibles
+    assert compter_facettes(db, Filtres(prix_min=20, prix_max=40, note_min=3), search)["en_stock"] == compter(filtres)
+
+
+# Livres recommandés lus en une requête, dans l'ordre du classement (ids inconnus ignorés) ;
+# relus depuis le cache sans requête, jusqu'à l'invalidation d'un livre
+def test_livres_par_ids_dans_l_ordre(db, compteur_sql):
+    with compteur_sql() as compteur:
+        livres = crud.get_livres_par_ids(db, [7, 3, 999_999, 5, 1])
+    assert [livre.id for livre in livres] == [7, 3, 5, 1]
+    assert compteur.nb == 1
+
+    cache.cache_catalogue.vider()
+    for nb_requetes in (1, 0):
+        with compteur_sql() as compteur:
+            lignes = cache.get_livres_par_ids(db, [7, 3, 5, 1])
+        assert [ligne["id"] for ligne in lignes] == [7, 3, 5, 1]
+        assert compteur.nb == nb_requetes
+
+    db.query(models.Livre).filter(models.Livre.id == 3).update({"prix": 123.45})
+    db.commit()
+    cache.cache_catalogue.invalider_livres(3)
+    with compteur_sql() as compteur:
+        lignes = cache.get_livres_par_ids(db, [7, 3])
+    assert lignes[1]["prix"] == 123.45
+    assert compteur.nb == 1
+
+
+# Après invalidation d'un livre, ni sa ligne ni les pages de listes rangées avant ne sont relues
+# du cache ; les entrées passent par le format JSON du backend partagé
+def test_invalider_livres_masque_les_entrees_perimees():
+    catalogue = cache.CacheCatalogue(cache.BackendLocal())
+    ligne, page = {"id": 1, "titre": "Avant", "prix": 9.5}, Page([{"id": 1, "titre": "Avant"}], 2, 1, 10)
+    assert catalogue.lire(catalogue.cle_livre(1), lambda: ligne, 60) == ligne
+    assert catalogue.lire(catalogue.cle_liste("page", ""), lambda: page, 60) == page
+    assert catalogue.lire(catalogue.cle_livre(1), lambda: None, 60) == ligne
+
+    catalogue.invalider_livres(1)
+    ligne, page = {**ligne, "titre": "Après"}, Page([{"id": 1, "titre": "Après"}], None, 1, 10)
+    assert catalogue.lire(catalogue.cle_livre(1), lambda: ligne, 60) == ligne
+    assert catalogue.lire(catalogue.cle_liste("page", ""), lambda: page, 60) == page
+
+    for valeur in (ligne, page, [page, {"total": 3}]):
+        assert cache.deserialiser(cache.serialiser(valeur)) == valeur
+
+
+# Parcours du catalogue par curseur : chaque livre une seule fois, dans l'ordre des ids ; une dernière
+# page pleine n'annonce pas de page suivante
+def test_pagination_par_curseur(db):
+    ids, apres = [], None
+    while True:
+        page = crud.get_livres(db, apres=apres, taille=7)
+        ids.extend(livre.id for livre in page)
+        if page.suivant is None:
+            break
+        assert page.suivant == ids[-1]
+        apres = page.suivant
+    assert ids == [i for (i,) in db.query(models.Livre.id).order_by(models.Livre.id)]
+    assert page.total == len(ids)
+
+    quatorze = db.query(models.Livre).filter(models.Livre.id <= ids[13])
+    premiere = paginer(quatorze, models.Livre.id, taille=7)
+    derniere = paginer(quatorze, models.Livre.id, premiere.suivant, taille=7)
+    assert (len(premiere), premiere.suivant) == (7, ids[6])
+    assert (len(derniere), derniere.suivant) == (7, None)
+    assert paginer(quatorze, models.Livre.id, ids[13], taille=7).elements == []
+
+
+# Revalidation : 304 sans corps tant que les livres de la page n'ont pas changé, 200 et nouvel ETag ensuite
+def test_api_v1_etag(client, db):
+    for url in ("/api/v1/livres?taille=5", "/api/v1/livres/2"):
+        reponse = client.get(url)
+        assert reponse.status_code == 200
+        valeur_etag = reponse.headers["ETag"]
+        non_modifie = client.get(url, headers={"If-None-Match": valeur_etag})
+        assert (non_modifie.status_code, non_modifie.content) == (304, b"")
+        assert non_modifie.headers["ETag"] == valeur_etag
+
+        livre = db.get(models.Livre, 2)
+        livre.prix = livre.prix + 1
+        db.commit()
+        modifie = client.get(url, headers={"If-None-Match": valeur_etag})
+        assert modifie.status_code == 200
+        assert modifie.headers["ETag"] != valeur_etag
+
+
+# Autocomplétion : début de n'importe quel mot, sans casse ni accents, préfixe plus long que la clé
+# de tri, livres ajoutés, modifiés et retirés depuis la construction
+def test_autocompletion_par_prefixe():
+    long_titre = "Une histoire extraordinairement longue de la bibliothèque municipale"
+    index = autocompletion.IndexPrefixes()
+    index.construire([(1, "Harry Potter"), (2, "Le Petit Prince"), (3, "Pêcheur d'Islande"), (4, long_titre), (5, "Potager")])
+
+    assert index.suggerer("pot") == [(5, "Potager"), (1, "Harry Potter")]
+    assert index.suggerer("PECH") == [(3, "Pêcheur d'Islande")]
+    assert index.suggerer("ince") == []
+    assert index.suggerer("extraordinairement longue de la biblio") == [(4, long_titre)]
+    assert index.suggerer("extraordinairement longue de la bibliobus") == []
+
+    index.ajouter(6, "Potion magique")
+    index.ajouter(5, "Jardin")
+    index.retirer(1)
+    assert index.suggerer("pot") == [(6, "Potion magique")]
+    assert index.suggerer("jard") == [(5, "Jardin")]
+    assert index.statistiques()["nb_livres"] == 5
+
+    tampon = b"harry potter\nle petit prince\npotager\n"
+    assert autocompletion.trier_suffixes(tampon, taille_bloc=2).tolist() == autocompletion.trier_suffixes(tampon).tolist()
+
+
+# Un ajout et un retrait reçus pendant la lecture des titres d'une reconstruction (avant leur commit)
+# restent visibles après la bascule
+def test_autocompletion_modifications_pendant_reconstruction():
+    index = autocompletion.IndexPrefixes()
+    index.construire([(1, "Harry Potter"), (2, "Potager")])
+
+    def titres_lus_avant_commit():
+        yield 1, "Harry Potter"
+        index.ajouter(3, "Potion magique")
+        index.retirer(2)
+        yield 2, "Potager"
+
+    index.construire(titres_lus_avant_commit())
+    assert index.suggerer("pot") == [(3, "Potion magique"), (1, "Harry Potter")]
+
+
+# Import en masse : ligne invalide rejetée, titre en double (la dernière ligne l'emporte), titre existant
+# mis à jour (version incrémentée), agrégats tenus par les triggers, un seul refit pour tout le fichier
+def test_import_en_masse(client, connecter, db, monkeypatch):
+    connecter()
+    existant = db.get(models.Livre, 5)
+    version, titre_existant = existant.version, existant.titre
+    nb_livres = db.query(models.Livre).count()
+    refits = []
+    monkeypatch.setattr(service, "reconstruire", lambda: refits.append(1))
+
+    fichier = io.StringIO()
+    ecrivain = csv.writer(fichier)
+    ecrivain.writerows([
+        ["titre", "prix", "description", "stock", "rating"],
+        [titre_existant, 42, "Description importée", 3, 4],
+        ["Import nouveau A", 5, "Premier", 2, 3],
+        ["", 7, "Sans titre", 1, 2],
+        ["Import nouveau B", 6, "Deuxième", 0, 1],
+        ["Import nouveau A", 9, "Dernier", 1, 5],
+    ])
+    reponse = client.post(
+        "/admin/livres/import",
+        files={"fichier": ("livres.csv", fichier.getvalue().encode(), "text/csv")},
+        data={"taille_lot": "2"},
+    )
+    assert reponse.status_code == 200
+    rapport = reponse.json()
+    assert {cle: rapport[cle] for cle in ("lignes_lues", "lignes_valides", "lignes_rejetees", "livres_inseres", "livres_mis_a_jour")} == {
+        "lignes_lues": 5, "lignes_valides": 4, "lignes_rejetees": 1, "livres_inseres": 2, "livres_mis_a_jour": 1,
+    }
+    assert [erreur["ligne"] for erreur in rapport["erreurs"]] == [3]
+    assert refits == [1]
+
+    db.expire_all()
+    assert (existant.prix, existant.description, existant.version) == (42, "Description importée", version + 1)
+    importes = db.query(models.Livre).filter(models.Livre.titre.in_(["Import nouveau A", "Import nouveau B"])).all()
+    assert sorted((livre.titre, livre.prix) for livre in importes) == [("Import nouveau A", 9), ("Import nouveau B", 6)]
+
+    # Compteurs du catalogue modifiés par les triggers pendant l'INSERT ... SELECT de l'import
+    livres_agreges = db.query(func.sum(models.StatCatalogue.valeur)).filter(models.StatCatalogue.cle == "livres").scalar()
+    assert livres_agreges == nb_livres + 2
+    with engine.connect() as connexion:
+        assert statistiques.verifier(connexion) == []
@@ -0,0 +1,49 @@
+import pytest
+
+from backend import crud, models, recherche
+from backend.facettes import Filtres, compter_facettes
+
+
+# Deux livres avec un mot introuvable ailleurs dans le catalogue : l'un dans le titre, l'autre dans la description
+@pytest.fixture
+def livres_recherche(db):
+    titre = models.Livre(titre="Zorblax chronicles", prix=1, stock=1, description="A plain story")
+    description = models.Livre(titre="Quixblorf tale", prix=1, stock=1, description="It mentions zorblax in passing")
+    for livre in (titre, description):
+        existant = db.query(models.Livre).filter(models.Livre.titre == livre.titre).first()
+        if existant is None:
+            db.add(livre)
+    db.commit()
+    return [db.query(models.Livre).filter(models.Livre.titre == livre.titre).one().id for livre in (titre, description)]
+
+
+# FTS5 : une correspondance dans le titre passe avant une correspondance dans la description
+def test_titre_avant_description(db, livres_recherche):
+    assert [livre.id for livre in recherche.rechercher_livres(db, "zorblax")] == livres_recherche
+
+
+# Saisie en cours : le dernier mot est un préfixe, les précédents sont requis en entier
+def test_prefixe_sur_le_dernier_mot(db, livres_recherche):
+    titre, description = livres_recherche
+    assert [livre.id for livre in recherche.rechercher_livres(db, "zorbl")] == [titre, description]
+    assert [livre.id for livre in recherche.rechercher_livres(db, "quixblorf ta")] == [description]
+    assert [livre.id for livre in recherche.rechercher_livres(db, "zorblax chron")] == [titre]
+    assert recherche.rechercher_livres(db, "zorbl chronicles") == []
+
+
+# Saisie vide ou sans aucun mot : aucun résultat, ni erreur de syntaxe FTS5
+@pytest.mark.parametrize("saisie", ["", "   ", "?!…", '"*'])
+def test_saisie_sans_mot(db, saisie):
+    assert recherche.requete_fts(saisie) == ""
+    assert recherche.rechercher_livres(db, saisie) == []
+    if saisie:
+        assert compter_facettes(db, Filtres(), saisie)["total"] == 0
+        assert crud.get_livres(db, search=saisie).elements == []
+
+
+# Bases sans index plein texte : sous-chaîne du titre ou de la description, titres en premier, paginée
+def test_recherche_par_sous_chaine(db, livres_recherche):
+    titre, description = livres_recherche
+    assert [livre.id for livre in recherche.rechercher_par_sous_chaine(db, "ZORBLAX")] == [titre, description]
+    assert [livre.id for livre in recherche.rechercher_par_sous_chaine(db, "zorblax", limite=1, decalage=1)] == [description]
+    assert recherche.rechercher_par_sous_chaine(db, "zorblax", filtres=Filtres(prix_min=2)) == []
@@ -0,0 +1,291 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import emprunts, models
+from backend.recommender import cache, recommender
+from backend.recommender.collaboratif import ModeleCollaboratif, melanger
+from backend.recommender.recommender import ModeleRecommandation, entrainer_modele
+from backend.recommender.service import ServiceRecommandation, service
+
+# Petit catalogue en trois thèmes : les voisins les plus proches sont ceux du même thème
+MAGIE = [
+    "A young wizard learns magic spells in an old castle",
+    "The wizard and the dragon fight over the enchanted castle",
+    "Magic school students cast spells against a dark wizard",
+    "A dragon guards the treasure of the wizard king",
+]
+ESPACE = [
+    "Astronauts fly a rocket to a distant planet",
+    "The galaxy empire sends a rocket fleet to the planet",
+    "An astronaut alone on a planet waits for a rescue rocket",
+    "Space pilots explore the galaxy beyond the last planet",
+]
+ENQUETE = [
+    "A detective investigates a murder in the city",
+    "The police detective follows the killer through the night",
+    "A murder trial where the detective finds the real killer",
+    "Crime and police corruption in a detective story",
+]
+CATALOGUE = pd.DataFrame({"id": range(1, 13), "description": MAGIE + ESPACE + ENQUETE})
+IDS_MAGIE, IDS_ESPACE = {1, 2, 3, 4}, {5, 6, 7, 8}
+
+
+# Registre de modèles isolé par test
+@pytest.fixture
+def registre(tmp_path, monkeypatch):
+    monkeypatch.setattr(recommender, "MODELE_DIR", str(tmp_path))
+    return tmp_path
+
+
+# Ajout, modification et suppression sans refit : voisins à jour dans les deux sens, journal rejoué
+# au chargement, et même résultat qu'un refit sur le catalogue modifié
+def test_mises_a_jour_incrementales_puis_refit(registre):
+    modele = entrainer_modele(CATALOGUE)
+    modele.sauvegarder()
+
+    modele.ajouter(100, "A wizard and a dragon cast magic spells in the castle")
+    assert modele.voisins_de(100)[0] in IDS_MAGIE
+    assert 100 in modele.voisins_de(modele.voisins_de(100)[0])
+
+    modele.modifier(100, "Astronauts fly a rocket to a distant planet")
+    assert modele.voisins_de(100)[0] == 5
+    assert 100 in modele.voisins_de(5)
+    assert all(100 not in modele.voisins_de(livre_id) for livre_id in IDS_MAGIE)
+
+    modele.supprimer(2)
+    assert modele.ligne(2) is None
+    assert modele.voisins_de(2) == []
+    assert all(2 not in modele.voisins_de(livre_id) for livre_id in IDS_MAGIE - {2})
+
+    modele.sauvegarder_modifications()
+    recharge = ModeleRecommandation.charger()
+    assert recharge.version == modele.version
+    assert recharge.empreinte == modele.empreinte
+    assert recharge.voisins_de(100) == modele.voisins_de(100)
+
+    catalogue = pd.concat([
+        CATALOGUE[CATALOGUE["id"] != 2],
+        pd.DataFrame({"id": [100], "description": ["Astronauts fly a rocket to a distant planet"]}),
+    ], ignore_index=True)
+    refit = entrainer_modele(catalogue)
+    assert refit.empreinte == modele.empreinte
+    assert refit.voisins_de(100)[0] == modele.voisins_de(100)[0]
+
+
+# Une modification reçue pendant un refit (après la lecture du catalogue) est rejouée sur le nouveau
+# modèle avant sa publication ; la durée du refit est conservée avec la version
+def test_modification_pendant_reconstruction(registre):
+    catalogue_lu, reprendre = threading.Event(), threading.Event()
+
+    def charger_catalogue():
+        if service._instantane is not None:
+            catalogue_lu.set()
+            assert reprendre.wait(timeout=30)
+        return CATALOGUE
+
+    service = ServiceRecommandation(charger_catalogue)
+    ancienne_version = service.instantane().version
+    reconstruction = service.reconstruire()
+    assert catalogue_lu.wait(timeout=30)
+    service.appliquer(lambda modele: modele.ajouter(100, "Astronauts fly a rocket to a distant planet"))
+    reprendre.set()
+    modele = reconstruction.result(timeout=60)
+
+    assert service.modele() is modele
+    assert modele.version_base != ancienne_version.split(".")[0]
+    assert modele.voisins_de(100)[0] == 5
+    assert ModeleRecommandation.charger().voisins_de(100) == modele.voisins_de(100)
+    assert service.etat()["duree_construction"] > 0
+
+
+# Les vérifications du registre ne partagent pas le thread des refits : l'opération d'un autre
+# worker est rechargée pendant qu'un refit long est en cours
+def test_rechargement_pendant_reconstruction(registre):
+    catalogue_lu, reprendre = threading.Event(), threading.Event()
+
+    def charger_catalogue():
+        if service._instantane is not None:
+            catalogue_lu.set()
+            assert reprendre.wait(timeout=30)
+        return CATALOGUE
+
+    service = ServiceRecommandation(charger_catalogue, intervalle_verification=0)
+    service.instantane()
+    reconstruction = service.reconstruire()
+    assert catalogue_lu.wait(timeout=30)
+    try:
+        autre_worker = ServiceRecommandation(lambda: CATALOGUE)
+        autre_worker.appliquer(lambda modele: modele.ajouter(100, "Astronauts fly a rocket to a distant planet"))
+        limite = time.monotonic() + 30
+        while service.instantane().modele.ligne(100) is None:
+            assert time.monotonic() < limite
+            time.sleep(0.05)
+        assert not reconstruction.done()
+    finally:
+        reprendre.set()
+    assert reconstruction.result(timeout=60).voisins_de(100)[0] == 5
+
+
+# Co-emprunts : les emprunts enregistrés un à un (deltas), puis fusionnés, donnent les mêmes scores
+# qu'une construction complète sur tout l'historique
+def test_collaboratif_incremental_egal_construction_complete():
+    generateur = np.random.default_rng(0)
+    adherents, livres = generateur.integers(1, 40, 600), generateur.integers(1, 60, 600)
+    complet = ModeleCollaboratif.construire(adherents, livres)
+    modele = ModeleCollaboratif.construire(adherents[:300], livres[:300])
+    for id_adherent, id_livre in zip(adherents[300:], livres[300:]):
+        modele.enregistrer_emprunt(int(id_adherent), int(id_livre))
+
+    for _ in range(2):
+        for id_livre in range(60):
+            attendus = dict(complet.similaires(id_livre, 60))
+            trouves = dict(modele.similaires(id_livre, 60))
+            assert trouves.keys() == attendus.keys()
+            assert np.allclose([trouves[i] for i in attendus], list(attendus.values()))
+        modele.fusionner()
+    assert modele.nb_deltas == 0
+
+
+# Un emprunt fait et rendu dans un autre worker entre deux rafraîchissements est intégré
+def test_collaboratif_rafraichi_depuis_la_base(db):
+    adherent = models.Adherent(nom="Lecteur", email="collaboratif@example.com", password="x")
+    db.add(adherent)
+    db.commit()
+    emprunts.creer_emprunt(db, adherent.id, 11)
+    modele = ModeleCollaboratif.depuis_base(db)
+
+    emprunt, _ = emprunts.creer_emprunt(db, adherent.id, 12)
+    emprunts.enregistrer_retour(db, emprunt.id)
+    assert 11 not in dict(modele.similaires(12))
+    modele.rafraichir(db)
+    assert 11 in dict(modele.similaires(12))
+
+
+# Score hybride : POIDS_CONTENU x contenu + (1 - POIDS_CONTENU) x collaboratif, tronqué à k
+def test_melanger_pondere_les_scores():
+    contenu = [(1, 1.0), (2, 0.5)]
+    collaboratifs = [(2, 1.0), (3, 0.9)]
+    assert melanger(contenu, collaboratifs, 3, poids_contenu=0.7) == [1, 2, 3]   # 0.7, 0.65, 0.27
+    assert melanger(contenu, collaboratifs, 3, poids_contenu=0.2) == [2, 3, 1]   # 0.9, 0.72, 0.2
+    assert melanger(contenu, collaboratifs, 2, poids_contenu=1.0) == [1, 2]
+    assert melanger([], collaboratifs, 1, poids_contenu=0.0) == [2]
+
+
+# Mode ANN : la recherche par lot (une projection, un produit creux par bloc) donne, pour chaque
+# requête, les mêmes lignes que la recherche d'un vecteur seul
+def test_rechercher_ann_par_lot_egal_requetes_seules():
+    modele = entrainer_modele(CATALOGUE, ann=True)
+    vecteurs = modele.vecteurs_lignes(range(modele.nb_lignes))
+    for n_sondes in (1, 2):
+        for i, (lignes, scores) in enumerate(modele.rechercher(vecteurs, 3, n_sondes, memoire_bloc=16 * 12 * 5)):
+            attendues, attendus = modele.rechercher_ann(vecteurs[i], 3, n_sondes)
+            assert lignes.tolist() == attendues.tolist()
+            assert np.allclose(scores, attendus)
+
+
+# API par lot : descriptions puis livres, chacun dans l'ordre de la demande ; un livre inconnu n'a
+# aucune suggestion et un livre de départ n'apparaît pas dans ses propres suggestions
+def test_recommandations_par_lot(client):
+    modele = service.modele()
+    descriptions = ["A young wizard learns magic in a castle", "Detectives investigate a murder"]
+    livres = [int(i) for i in modele.ids[[1, 0]]] + [999_999]
+    reponse = client.post("/api/recommandations", json={"descriptions": descriptions, "livres": livres, "k": 4})
+    assert reponse.status_code == 200
+    resultats = reponse.json()
+
+    assert [r["description"] for r in resultats[:2]] == descriptions
+    assert [r["livre_id"] for r in resultats[2:]] == livres
+    assert resultats[-1]["suggestions"] == []
+    for resultat, livre_id in zip(resultats[2:4], livres[:2]):
+        ids = [livre["id"] for livre in resultat["suggestions"]]
+        assert len(ids) == 4 and livre_id not in ids
+
+    # Mêmes suggestions qu'une recherche par requête seule
+    for resultat, description in zip(resultats, descriptions):
+        vecteur = modele.vectorizer.transform([recommender.preprocess_text_func(description)])
+        lignes, _ = modele.rechercher(vecteur, 4)[0]
+        assert [livre["id"] for livre in resultat["suggestions"]] == modele.ids_lignes(lignes).tolist()
+
+
+# Recherche ANN : rappel@k non nul face à la recherche exacte en ne sondant qu'une partition,
+# rappel total quand toutes les partitions sont sondées
+def test_rappel_ann(registre):
+    exact = entrainer_modele(CATALOGUE)
+    approche = entrainer_modele(CATALOGUE, ann=True)
+    vecteurs = exact.vecteurs_lignes(range(exact.nb_lignes))
+    attendus = [set(lignes.tolist()) for lignes, _ in exact.rechercher(vecteurs, 3)]
+
+    def rappel(n_sondes):
+        trouves = [set(lignes.tolist()) for lignes, _ in approche.rechercher(vecteurs, 3, n_sondes)]
+        return np.mean([len(t & a) / len(a) for t, a in zip(trouves, attendus)])
+
+    assert rappel(1) > 0
+    assert rappel(len(approche.index_ann.centroides)) == 1
+
+
+# Cache de résultats : vidé au changement de version du modèle, entrées expirées après le TTL,
+# la moins récemment lue évincée au-delà de la taille maximale
+def test_cache_resultats(monkeypatch):
+    maintenant = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: maintenant[0])
+    resultats = cache.CacheResultats(taille_max=2, ttl=60)
+
+    resultats.set("magie", "v1", (1, 2))
+    assert resultats.get("magie", "v1") == (1, 2)
+    assert resultats.get("magie", "v2") is None
+    assert resultats.statistiques()["invalidations"] == 1
+
+    resultats.set("magie", "v2", (3,))
+    maintenant[0] += 61
+    assert resultats.get("magie", "v2") is None
+    assert resultats.statistiques()["taille"] == 0
+
+    resultats.set("magie", "v2", (1,))
+    resultats.set("espace", "v2", (5,))
+    assert resultats.get("magie", "v2") == (1,)
+    resultats.set("enquete", "v2", (9,))
+    assert resultats.get("espace", "v2") is None
+    assert resultats.get("magie", "v2") == (1,)
+    assert resultats.get("enquete", "v2") == (9,)
+    assert resultats.statistiques()["evictions"] == 1
+
+
+# Démarrage à chaud : une version du registre dont l'empreinte correspond au catalogue est chargée
+# sans refit ; un catalogue modifié entre-temps déclenche un refit
+def test_demarrage_a_chaud(registre, monkeypatch):
+    refits = []
+
+    def entrainer(catalogue, *args, **kwargs):
+        refits.append(len(catalogue))
+        return entrainer_modele(catalogue, *args, **kwargs)
+
+    monkeypatch.setattr("backend.recommender.service.entrainer_modele", entrainer)
+    premier = ServiceRecommandation(lambda: CATALOGUE).modele()
+    assert refits == [12]
+
+    recharge = ServiceRecommandation(lambda: CATALOGUE).modele()
+    assert refits == [12]
+    assert recharge.version == premier.version
+    assert recharge.voisins_de(1) == premier.voisins_de(1)
+
+    catalogue = CATALOGUE[CATALOGUE["id"] != 12]
+    modifie = ServiceRecommandation(lambda: catalogue).modele()
+    assert refits == [12, 11]
+    assert modifie.ligne(12) is None
+
+
+# Livres similaires : 404 pour un livre inconnu ; sinon les voisins de la table précalculée, dans
+# l'ordre, sans le livre lui-même
+def test_livres_similaires(client):
+    assert client.get("/api/livre/999999/similaires").status_code == 404
+
+    livre_id = int(service.modele().ids[0])
+    reponse = client.get(f"/api/livre/{livre_id}/similaires", params={"k": 5, "poids_contenu": 1})
+    assert reponse.status_code == 200
+    ids = [livre["id"] for livre in reponse.json()]
+    assert livre_id not in ids
+    assert ids == service.modele().voisins_de(livre_id, 5)
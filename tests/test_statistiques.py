@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+from backend import emprunts, models, statistiques
+from backend.database import engine
+
+
+# Les agrégats tenus par les triggers (répartis en fragments) restent égaux à leur recalcul
+# après des emprunts, des retours, un retard, des ruptures de stock, un ajout et une suppression de livre
+def test_agregats_sans_ecart_apres_modifications(db):
+    livres = [models.Livre(titre=f"Statistiques {i}", prix=1, stock=i % 2 + 1) for i in range(2 * statistiques.NB_FRAGMENTS)]
+    adherent = models.Adherent(nom="Lecteur", email="statistiques@example.com", password="x")
+    db.add_all(livres + [adherent])
+    db.commit()
+
+    resultats = emprunts.creer_emprunts_lot(db, [(adherent.id, livre.id) for livre in livres])
+    ids = [r["emprunt_id"] for r in resultats]
+    emprunts.enregistrer_retours_lot(db, ids[::3])
+    db.query(models.Emprunt).filter(models.Emprunt.id == ids[1]).update(
+        {"date_retour_prevue": date.today() - timedelta(days=3)}
+    )
+    supprime = models.Livre(titre="Statistiques supprimé", prix=1, stock=2)
+    db.add(supprime)
+    db.commit()
+    db.delete(supprime)
+    db.commit()
+
+    with engine.connect() as connexion:
+        assert statistiques.verifier(connexion) == []
+
+    en_retard = db.query(models.Emprunt).filter(
+        models.Emprunt.date_retour_effectif.is_(None), models.Emprunt.date_retour_prevue < date.today()
+    ).count()
+    disponibles = db.query(models.Livre).filter(models.Livre.stock > 0).count()
+    stats = statistiques.lire_statistiques(db)
+    assert stats["retards"] == en_retard
+    assert stats["taux_dispo"] == disponibles / db.query(models.Livre).count()